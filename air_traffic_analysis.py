@@ -24,20 +24,32 @@
 #
 # Additional Comments:
 #     - Uses Cartopy for geographical plotting and Matplotlib for data visualization.
-#     - Focuses on data associated with the callsign "AMX690".
+#     - Focuses on data associated with the callsign "AMX690", read with `trajectory_loader.py` so that only
+#       the blocks of the file containing that callsign are parsed.
 #     - Time is processed into seconds since midnight to facilitate temporal plots.
 #     - LaTeX rendering is disabled, but serif fonts are used for publication-ready visuals.
-#     - Gridlines and map features are added for better clarity.
+#     - Gridlines and map features are added for better clarity. The map features come from the basemap
+#       cache (`basemap_cache.py`), so they are only projected and drawn once per extent.
 #     - This code assumes the structure of the input CSV is compatible with the data access 
 #       pattern used (i.e., expected column names are present).
 #     - Ensure all required libraries (pandas, matplotlib, cartopy) are installed.
+#     - Tracks and time series are decimated before plotting (`trajectory_decimation.py`: RDP for the map,
+#       LTTB for the time series) with tolerances expressed in pixels of the saved figures.
+#     - To render the figures of many flights at once (in parallel, without interactive windows and skipping
+#       unchanged flights), use `batch_flight_figures.py`.
+#     - The altitude profile is also plotted coloured by flight phase (climb, level-off, cruise, descent), labelled
+#       by `flight_phases.py`.
 # ===============================================================================================================
 
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import cartopy.crs as ccrs
-import cartopy.feature as cfeature
+
+from basemap_cache import add_basemap
+from flight_phases import label_phases, phases
+from trajectory_decimation import decimate_track, decimate_series
+from trajectory_loader import load_trajectories
 
 # Enable LaTeX font rendering
 plt.rcParams.update({
@@ -49,7 +61,8 @@ plt.rcParams.update({
 # Load the data
 input_file = "C:\\Users\\wesle\\OneDrive\\Documentos\\Master\\traffic\\code1\\data\\2025\\2025_01_01-2025_01_07-LA\\air_traffic_output_data_LA_2025-01-01_flight_id.csv"
 
-df = pd.read_csv(input_file)
+# Read only the rows of the analysed callsign (block index of the file, built on the first run)
+df = load_trajectories(input_file, callsign="AMX690")
 
 # Ensure the timestamp column is in datetime format
 df['timestamp'] = pd.to_datetime(df['timestamp'])
@@ -60,25 +73,20 @@ df['time'] = df['timestamp'].dt.time
 # Extract time from the timestamp and convert to seconds since midnight
 df['seconds_since_midnight'] = df['timestamp'].dt.hour * 3600 + df['timestamp'].dt.minute * 60 + df['timestamp'].dt.second
 
-df=df[df["callsign"]=="AMX690"]
-
 # Group by flight_id
-grouped = df.groupby('flight_id')
+grouped = df.groupby('flight_id', observed=True)
 
 # Set up the map with Cartopy
 plt.figure(figsize=(15, 10))
 ax = plt.axes(projection=ccrs.PlateCarree())
-ax.set_extent([-180, 180, -90, 90], crs=ccrs.PlateCarree())  # Adjust bounds as necessary
 
-# Add map features for better fidelity
-ax.add_feature(cfeature.LAND, color="lightgray")
-ax.add_feature(cfeature.COASTLINE, linewidth=0.5)
-ax.add_feature(cfeature.BORDERS, linestyle=":")
+# Add map features for better fidelity (rasterized once per extent and reused from the basemap cache)
+add_basemap(ax, [-180, 180, -90, 90], style="simple")  # Adjust bounds as necessary
 
 # Group the data by flight_id and plot each flight path
-grouped = df.groupby('flight_id')
+grouped = df.groupby('flight_id', observed=True)
 for flight_id, group in grouped:
-    plt.plot(group['longitude'], group['latitude'], label=f"Flight {flight_id}", 
+    plt.plot(*decimate_track(ax, group['longitude'], group['latitude']), label=f"Flight {flight_id}", 
              transform=ccrs.PlateCarree(), alpha=0.7, linewidth=1)
 
 # Add gridlines using Cartopy's GeoAxes
@@ -101,7 +109,7 @@ for flight_id, group in grouped:
     # Convert `seconds_since_midnight` to a pandas datetime starting from midnight
     group['seconds_since_midnight'] = pd.to_numeric(group['seconds_since_midnight'], errors='coerce') # it works
     group['time'] = pd.to_datetime(group['seconds_since_midnight'], unit='s', origin='1970-01-01')
-    plt.plot(group['time'], group['altitude'], label=f"Flight {flight_id}")
+    plt.plot(*decimate_series(plt.gca(), group['time'], group['altitude']), label=f"Flight {flight_id}")
 
 plt.xlabel(r"Time (Seconds since midnight)")
 plt.ylabel(r"Altitude [ft]")
@@ -119,10 +127,29 @@ plt.savefig("altitude_time.pdf", format="pdf")  # Save as PDF
 plt.savefig("altitude_time.png", format="png", dpi=300)  # Save as PNG with high resolution
 plt.show()
 
+# Label the flight phase of every position (altitude in feet in this file)
+df['phase'] = label_phases(df, time_column='timestamp')[0]
+
+# Plot altitude vs. time coloured by flight phase
+plt.figure(figsize=(10, 6))
+for phase in phases:
+    points = df[df['phase'] == phase]
+    plt.scatter(points['timestamp'], points['altitude'], label=phase.capitalize(), s=2)
+plt.xlabel(r"Time [UTC]")
+plt.ylabel(r"Altitude [ft]")
+plt.title(r"Altitude Over Time by Flight Phase")
+plt.legend(fontsize=8, markerscale=4)
+plt.grid()
+plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
+plt.gcf().autofmt_xdate()
+plt.savefig("altitude_time_phases.pdf", format="pdf")  # Save as PDF
+plt.savefig("altitude_time_phases.png", format="png", dpi=300)  # Save as PNG with high resolution
+plt.show()
+
 # Plot vertical rate vs. time for each flight
 plt.figure(figsize=(10, 6))
 for flight_id, group in grouped:
-    plt.plot(group['seconds_since_midnight'], group['vertical_rate'], label=f"Flight {flight_id}")
+    plt.plot(*decimate_series(plt.gca(), group['seconds_since_midnight'], group['vertical_rate']), label=f"Flight {flight_id}")
 plt.xlabel(r"Time (Seconds since midnight)")
 plt.ylabel(r"Vertical Rate [m/s]")
 plt.title(r"Vertical Rate Over Time")
@@ -135,7 +162,7 @@ plt.show()
 # Plot groundspeed vs. time for each flight
 plt.figure(figsize=(10, 6))
 for flight_id, group in grouped:
-    plt.plot(group['seconds_since_midnight'], group['groundspeed'], label=f"Flight {flight_id}")
+    plt.plot(*decimate_series(plt.gca(), group['seconds_since_midnight'], group['groundspeed']), label=f"Flight {flight_id}")
 plt.xlabel(r"Time (Seconds since midnight)")
 plt.ylabel(r"Groundspeed [m/s]")
 plt.title(r"Groundspeed Over Time")
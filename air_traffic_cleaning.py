@@ -0,0 +1,557 @@
+# ===============================================================================================================
+# Author: Wesley Gonçalves da Silva - IST1105271
+# Purpose:
+#     Collection of the cleaning and validation steps applied by `air_traffic_safety_checks.py` to ADS-B
+#     flight trajectory data, written as standalone functions so that they can be reused by other scripts
+#     and timed individually by `benchmark_pipeline.py`.
+#
+# Inputs:
+#     - pandas DataFrames with the columns produced by `air_traffic_pre_processing.py`:
+#       ['icao24', 'callsign', 'flight_id', 'timestamp', 'latitude', 'longitude', 'altitude',
+#        'vertical_rate', 'groundspeed', 'heading']
+#
+# Outputs:
+#     - Cleaned DataFrames (each function returns the processed DataFrame and, when relevant, the boolean
+#       masks used to build the data quality report).
+#
+# Additional Comments:
+#     - The functions keep the console messages of the original script so that logs remain comparable.
+#     - Peak detection relies on `scipy.signal.find_peaks`; distances are computed with `geopy`.
+#     - The functions do not read or write files; input/output paths remain in the calling scripts.
+# ===============================================================================================================
+
+import warnings
+
+import numpy as np
+import pandas as pd
+from geopy.distance import geodesic
+from scipy.signal import find_peaks
+
+# Distance thresholds used by the peak detection passes for each attribute
+distance_thresholds = {
+    "altitude": 2,              # Adjust based on data behavior
+    "vertical_rate": 1000,      # Adjust based on expected vertical rate peaks
+    "groundspeed": 1000         # Adjust to detect meaningful peaks in speed
+}
+
+# Hampel filter settings for each attribute: (window length in samples, number of scaled MADs, minimum deviation)
+hampel_settings = {
+    "altitude": (7, 3.0, 100.0),            # Minimum deviation in altitude units
+    "vertical_rate": (7, 3.0, 1000.0),      # Minimum deviation in vertical rate units
+    "groundspeed": (7, 3.0, 30.0),          # Minimum deviation in groundspeed units
+}
+
+
+def filter_short_flights(df, min_duration=10):
+    """
+    Keeps only the flights lasting at least `min_duration` minutes.
+
+    Args:
+        df (pd.DataFrame): Dataframe with 'flight_id' and datetime 'timestamp' columns.
+        min_duration (float): Minimum flight duration in minutes.
+
+    Returns:
+        pd.DataFrame: The dataframe restricted to the valid flights, with a fresh index.
+    """
+    # Calculate flight duration (assuming each row corresponds to a flight event)
+    flight_durations = df.groupby("flight_id", observed=True)["timestamp"].agg(["min", "max"])
+    flight_durations["duration"] = (flight_durations["max"] - flight_durations["min"]).dt.total_seconds() / 60  # Convert to minutes
+
+    # Keep flights with a duration >= min_duration minutes
+    valid_flights = flight_durations[flight_durations["duration"] >= min_duration].index
+
+    # Filter the original DataFrame to keep only valid flights
+    return df[df["flight_id"].isin(valid_flights)].reset_index(drop=True)
+
+
+def drop_invalid_timestamps(df):
+    """
+    Reports and removes the rows whose timestamp could not be parsed.
+
+    Args:
+        df (pd.DataFrame): Dataframe with a datetime 'timestamp' column (NaT for invalid values).
+
+    Returns:
+        pd.DataFrame: The dataframe without invalid timestamps, with a fresh index.
+    """
+    # Identify and display rows with invalid timestamps
+    invalid_rows = df[df['timestamp'].isna()]
+    if not invalid_rows.empty:
+        print("Invalid timestamp rows:")
+        print(invalid_rows)
+
+    # Remove rows with invalid timestamps
+    return df.dropna(subset=['timestamp']).reset_index(drop=True)
+
+
+def mask_invalid_positions(df):
+    """
+    Replaces latitudes outside [-90, 90] and longitudes outside [-180, 180] with NaN.
+
+    Args:
+        df (pd.DataFrame): Dataframe with 'latitude' and 'longitude' columns (modified in place).
+
+    Returns:
+        tuple: (df, invalid_lat, invalid_lon) where the last two are the boolean masks of corrected rows.
+    """
+    invalid_lat = (df['latitude'] < -90) | (df['latitude'] > 90)
+    invalid_lon = (df['longitude'] < -180) | (df['longitude'] > 180)
+
+    df.loc[invalid_lat, 'latitude'] = np.nan
+    df.loc[invalid_lon, 'longitude'] = np.nan
+
+    if invalid_lat.any():
+        print(f"Invalid latitude records corrected: {invalid_lat.sum()}")
+    if invalid_lon.any():
+        print(f"Invalid longitude records corrected: {invalid_lon.sum()}")
+
+    return df, invalid_lat, invalid_lon
+
+
+def mask_invalid_altitudes(df, max_altitude=14e+3):
+    """
+    Replaces negative altitudes and altitudes above `max_altitude` with NaN.
+
+    Args:
+        df (pd.DataFrame): Dataframe with an 'altitude' column (modified in place).
+        max_altitude (float): Highest plausible altitude.
+
+    Returns:
+        tuple: (df, invalid_altitude) where the last element is the boolean mask of corrected rows.
+    """
+    invalid_altitude = (df['altitude'] < 0) | (df['altitude'] > max_altitude)
+
+    df.loc[invalid_altitude, 'altitude'] = np.nan
+
+    if invalid_altitude.any():
+        print(f"Invalid altitude records corrected: {invalid_altitude.sum()}")
+
+    return df, invalid_altitude
+
+
+def mask_invalid_groundspeed(df, max_groundspeed=900):
+    """
+    Replaces negative groundspeeds and groundspeeds above `max_groundspeed` with NaN.
+
+    Args:
+        df (pd.DataFrame): Dataframe with a 'groundspeed' column (modified in place).
+        max_groundspeed (float): Highest plausible groundspeed.
+
+    Returns:
+        tuple: (df, invalid_groundspeed) where the last element is the boolean mask of corrected rows.
+    """
+    invalid_groundspeed = (df['groundspeed'] < 0) | (df['groundspeed'] > max_groundspeed)
+
+    df.loc[invalid_groundspeed, 'groundspeed'] = np.nan
+
+    if invalid_groundspeed.any():
+        print(f"Invalid groundspeed records corrected: {invalid_groundspeed.sum()}")
+
+    return df, invalid_groundspeed
+
+
+def find_outlier_peaks(data, distance, prominence=5, widths=(1, 3)):
+    """
+    Detects local maxima and minima of a signal with the three `find_peaks` criteria of the cleaning passes.
+
+    Args:
+        data (np.ndarray): Values of one attribute for a single flight, sorted by time.
+        distance (float): Minimum horizontal distance between peaks (criteria 2).
+        prominence (float): Minimum prominence of the peaks (criteria 1 and 3).
+        widths (tuple): Minimum widths of the peaks for criteria 1 and 3, respectively.
+
+    Returns:
+        np.ndarray: Sorted unique positions of the detected peaks and valleys.
+    """
+    # Criteria 1: prominence with the smaller width
+    peaks_max1, _ = find_peaks(data,    prominence=prominence, width=widths[0])
+    peaks_min1, _ = find_peaks(-data,   prominence=prominence, width=widths[0])
+
+    # Criteria 2: Lower prominence and smaller width to catch subtler peaks
+    peaks_max2, _ = find_peaks(data,    distance = distance)
+    peaks_min2, _ = find_peaks(-data,   distance = distance)
+
+    # Criteria 3: Even lower thresholds (if necessary)
+    peaks_max3, _ = find_peaks(data,    prominence=prominence, width=widths[1])
+    peaks_min3, _ = find_peaks(-data,   prominence=prominence, width=widths[1])
+
+    # Combine all detected indices
+    all_peaks = np.concatenate((peaks_max1, peaks_min1, peaks_max2, peaks_min2, peaks_max3, peaks_min3))
+    return np.unique(all_peaks)  # Remove any duplicates and sort the indices
+
+
+def remove_peak_outliers(df, thresholds=None, prominence=5, widths=(1, 3), distance_factor=1.0):
+    """
+    Replaces the peaks detected in each flight by NaN and interpolates them linearly in time.
+
+    Args:
+        df (pd.DataFrame): Dataframe sorted by 'flight_id' and 'timestamp' (modified in place).
+        thresholds (dict): Attribute -> peak distance threshold; defaults to `distance_thresholds`.
+        prominence (float): Minimum prominence of the peaks.
+        widths (tuple): Minimum widths of the peaks for the prominence criteria.
+        distance_factor (float): Scale applied to the distance thresholds.
+
+    Returns:
+        pd.DataFrame: The dataframe with the outliers replaced by interpolated values.
+    """
+    if thresholds is None:
+        thresholds = distance_thresholds
+
+    columns = [column for column in thresholds if column in df.columns]
+    outliers = {column: [] for column in columns}
+
+    # Iterate through each flight_id
+    for flight_id, group in df.groupby("flight_id", observed=True):
+        # Sort by timestamp
+        group = group.sort_values(by="timestamp")
+
+        for column in columns:
+            data = group[column].to_numpy(dtype=np.float64)
+            all_peaks = find_outlier_peaks(data, distance_factor * thresholds[column], prominence, widths)
+
+            # Collect the outlier rows
+            if len(all_peaks) > 0:
+                outliers[column].append(group.index[all_peaks])
+
+    # Replace outlier values with NaN
+    for column, rows in outliers.items():
+        if rows:
+            df.loc[np.concatenate(rows), column] = np.nan
+
+    # Interpolate missing values of the cleaned columns, for all flights at once
+    return interpolate_by_flight(df, columns, limit_direction='both')
+
+
+def _flight_layout(df, group_column="flight_id", time_column="timestamp"):
+    """
+    Computes the (flight, time) ordering of the rows and the flight limits used by the vectorized kernels.
+
+    Args:
+        df (pd.DataFrame): Dataframe with the group and time columns.
+        group_column (str): Column identifying the flights.
+        time_column (str): Datetime or numeric column ordering the samples of each flight.
+
+    Returns:
+        tuple: (order, time, flight_first, flight_last) where `order` sorts the rows by flight and time, `time` is
+            the sorted time as float (nanoseconds for datetimes) and the last two give, for every sorted position,
+            the first and last sorted position of its flight.
+    """
+    codes = pd.factorize(df[group_column])[0]
+    if pd.api.types.is_datetime64_any_dtype(df[time_column]):
+        time = df[time_column].values.view("int64").astype(np.float64)
+    else:
+        time = df[time_column].to_numpy(dtype=np.float64)
+
+    # Sort positions by flight and time (the data is usually sorted already, lexsort is then cheap)
+    order = np.lexsort((time, codes))
+    codes = codes[order]
+    time = time[order]
+
+    # First and last position of the flight of every row
+    n = len(order)
+    position = np.arange(n)
+    flight_first = np.maximum.accumulate(np.where(np.r_[True, codes[1:] != codes[:-1]], position, 0))
+    flight_last = np.minimum.accumulate(np.where(np.r_[codes[1:] != codes[:-1], True], position, n - 1)[::-1])[::-1]
+
+    return order, time, flight_first, flight_last
+
+
+def hampel_outliers(df, column, window=7, n_sigmas=3.0, min_deviation=0.0, group_column="flight_id",
+                    time_column="timestamp", chunk_size=10**6):
+    """
+    Flags the outliers of a column with a Hampel (moving median / MAD) filter applied to each flight.
+
+    The moving windows of all flights are gathered in one array (in chunks of `chunk_size` rows) and the medians
+    are computed row-wise, so the filter is a single O(n) vectorized pass over the data. Windows never cross flight
+    boundaries: near the first and last samples of a flight the edge value is repeated.
+
+    Args:
+        df (pd.DataFrame): Dataframe with the group, time and filtered columns.
+        column (str): Name of the numeric column to filter.
+        window (int): Odd window length, in samples.
+        n_sigmas (float): Number of scaled median absolute deviations above which a sample is an outlier.
+        min_deviation (float): Minimum absolute deviation from the median to be flagged, which avoids flagging
+            small deviations on perfectly smooth segments where the MAD is zero.
+        group_column (str): Column identifying the flights.
+        time_column (str): Column used to order the samples of each flight.
+        chunk_size (int): Number of rows processed at once, which bounds the memory to chunk_size * window values.
+
+    Returns:
+        np.ndarray: Boolean mask of the outliers, in the row order of `df`.
+    """
+    half_window = window // 2
+    offsets = np.arange(-half_window, half_window + 1)
+
+    order, _, flight_first, flight_last = _flight_layout(df, group_column, time_column)
+    values = df[column].to_numpy(dtype=np.float64)[order]
+
+    n = len(order)
+    outliers = np.zeros(n, dtype=bool)
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+
+        # Window of each row, clipped to its own flight
+        rows = np.arange(start, stop)
+        neighbours = np.clip(rows[:, None] + offsets[None, :], flight_first[rows, None], flight_last[rows, None])
+        samples = values[neighbours]
+
+        median = np.median(samples, axis=1)
+        deviation = np.abs(samples - median[:, None])
+        mad = np.median(deviation, axis=1)
+
+        # Windows containing NaNs (e.g. values masked by the range checks) fall back to nanmedian
+        with_nan = np.isnan(median)
+        if with_nan.any():
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", category=RuntimeWarning)
+                median[with_nan] = np.nanmedian(samples[with_nan], axis=1)
+                mad[with_nan] = np.nanmedian(np.abs(samples[with_nan] - median[with_nan, None]), axis=1)
+
+        threshold = np.maximum(n_sigmas * 1.4826 * mad, min_deviation)
+        outliers[start:stop] = np.abs(values[start:stop] - median) > threshold
+
+    # Scatter back to the original row order
+    result = np.empty(n, dtype=bool)
+    result[order] = outliers
+    return result
+
+
+def remove_hampel_outliers(df, settings=None):
+    """
+    Replaces the outliers flagged by the Hampel filter by NaN and interpolates them linearly in time.
+
+    Single-pass alternative to the `find_peaks` passes of `remove_peak_outliers`.
+
+    Args:
+        df (pd.DataFrame): Dataframe with 'flight_id', 'timestamp' and the filtered columns (modified in place).
+        settings (dict): Attribute -> (window, n_sigmas, min_deviation); defaults to `hampel_settings`.
+
+    Returns:
+        pd.DataFrame: The dataframe with the outliers replaced by interpolated values.
+    """
+    if settings is None:
+        settings = hampel_settings
+
+    columns = [column for column in settings if column in df.columns]
+    for column in columns:
+        window, n_sigmas, min_deviation = settings[column]
+        outliers = hampel_outliers(df, column, window, n_sigmas, min_deviation)
+
+        # Replace outlier values with NaN
+        df.loc[outliers, column] = np.nan
+        print(f"Hampel outliers replaced in {column}: {outliers.sum()}")
+
+    # Interpolate missing values of the cleaned columns, for all flights at once
+    return interpolate_by_flight(df, columns, limit_direction='both')
+
+
+def interpolate_by_flight(df, columns, group_column="flight_id", time_column="timestamp", limit_direction="both"):
+    """
+    Fills the NaNs of the selected columns by linear interpolation in time, separately for each flight.
+
+    All flights are processed in a single vectorized pass: for every missing value the previous and next valid
+    samples of the same flight are located with cumulative max/min scans, and the value is weighted by the actual
+    timestamps (not by the row position). Values are never interpolated across flight boundaries.
+
+    Args:
+        df (pd.DataFrame): Dataframe with the group, time and selected columns (modified in place).
+        columns (list): Names of the numeric columns to interpolate.
+        group_column (str): Column identifying the flights.
+        time_column (str): Datetime or numeric column used as interpolation abscissa.
+        limit_direction (str): 'forward' fills interior and trailing NaNs, 'backward' interior and leading NaNs,
+            'both' fills all of them. Leading/trailing NaNs take the nearest valid value of the flight.
+
+    Returns:
+        pd.DataFrame: The dataframe with the missing values of the selected columns filled.
+    """
+    if limit_direction not in ("forward", "backward", "both"):
+        raise ValueError("limit_direction must be 'forward', 'backward' or 'both'.")
+
+    columns = [column for column in columns if column in df.columns and pd.api.types.is_numeric_dtype(df[column])]
+    if not columns or df.empty:
+        return df
+
+    order, time, flight_first, flight_last = _flight_layout(df, group_column, time_column)
+    n = len(order)
+    position = np.arange(n)
+
+    for column in columns:
+        values = df[column].to_numpy(dtype=np.float64)[order]
+        missing = np.isnan(values)
+        if not missing.any():
+            continue
+
+        # Previous and next valid sample within the same flight (-1 / n when there is none)
+        previous = np.maximum.accumulate(np.where(missing, -1, position))
+        previous[previous < flight_first] = -1
+        following = np.minimum.accumulate(np.where(missing, n, position)[::-1])[::-1]
+        following[following > flight_last] = n
+
+        # Interior gaps: weight by the timestamps
+        interior = missing & (previous >= 0) & (following < n)
+        before = previous[interior]
+        after = following[interior]
+        span = time[after] - time[before]
+        weight = np.divide(time[interior] - time[before], span, out=np.zeros_like(span), where=span > 0)
+        values[interior] = values[before] + weight * (values[after] - values[before])
+
+        # Leading and trailing gaps: nearest valid value of the flight
+        if limit_direction in ("forward", "both"):
+            trailing = missing & (previous >= 0) & (following == n)
+            values[trailing] = values[previous[trailing]]
+        if limit_direction in ("backward", "both"):
+            leading = missing & (previous < 0) & (following < n)
+            values[leading] = values[following[leading]]
+
+        # Scatter back to the original row order
+        result = np.empty(n)
+        result[order] = values
+        df[column] = result
+
+    return df
+
+
+def replace_repeated_lat_lon_with_nan(df):
+    """
+    Identifies rows with repeated latitude and longitude values in consecutive rows
+    and replaces the repeated values with NaN.
+
+    Args:
+        df (pd.DataFrame): The input dataframe with 'latitude' and 'longitude' columns.
+
+    Returns:
+        pd.DataFrame: The dataframe with repeated latitude and longitude values replaced by NaN.
+    """
+    # Check if 'latitude' and 'longitude' columns exist
+    if 'latitude' not in df.columns or 'longitude' not in df.columns:
+        raise ValueError("The dataframe must contain 'latitude' and 'longitude' columns.")
+
+    # Identify rows where latitude or longitude is repeated compared to the previous row
+    repeated_mask = (df['latitude'] == df['latitude'].shift(1)) & (df['longitude'] == df['longitude'].shift(1))
+
+    # Replace repeated values with NaN
+    df.loc[repeated_mask, ['latitude', 'longitude']] = np.nan
+
+    return df
+
+
+def interpolate_selected_fields(df, fields):
+    """
+    Interpolates missing fields for specified numeric columns in a dataframe, flight by flight and weighted by time.
+
+    Args:
+        df (pd.DataFrame): The input dataframe with missing fields.
+        fields (list): List of column names to interpolate.
+
+    Returns:
+        pd.DataFrame: The dataframe with interpolated missing values for the specified fields.
+    """
+    # Ensure the fields provided exist in the dataframe and are numeric
+    fields_to_interpolate = [field for field in fields if field in df.columns and pd.api.types.is_numeric_dtype(df[field])]
+
+    if not fields_to_interpolate:
+        print("No valid numeric fields provided for interpolation.")
+        return df
+
+    # Interpolate the specified numeric fields without crossing flight boundaries
+    df = interpolate_by_flight(df, fields_to_interpolate, limit_direction='forward')
+    for field in fields_to_interpolate:
+        print(f"Interpolated missing values for column: {field}")
+
+    return df
+
+
+def interpolate_large_distances(df):
+    """
+    Add interpolated rows between rows with distances larger than 40 km.
+    Interpolated timestamps increase by 1 second from the previous row.
+
+    Args:
+        df (pd.DataFrame): DataFrame with 'flight_id', 'timestamp', 'latitude', 'longitude', and other attributes.
+
+    Returns:
+        pd.DataFrame: Modified DataFrame with no distances larger than 40 km.
+    """
+    # Sort the DataFrame by flight_id and timestamp
+    df = df.sort_values(by=['timestamp', 'flight_id']).reset_index(drop=True)
+
+    def add_interpolated_rows(group):
+        """
+        Interpolate rows for a single flight_id group.
+        """
+        new_rows = []  # Store new rows to add
+        prev_row = None
+
+        for i, row in group.iterrows():
+            if prev_row is not None:
+                # Compute geodesic distance
+                coord1 = (prev_row['latitude'], prev_row['longitude'])
+                coord2 = (row['latitude'], row['longitude'])
+                distance_km = geodesic(coord1, coord2).kilometers
+
+                # Calculate rates of change for each parameter
+                time_diff = (row['timestamp'] - prev_row['timestamp']).total_seconds()
+                if time_diff == 0:
+                    continue  # Avoid division by zero
+
+                rate_latitude = (row['latitude'] - prev_row['latitude']) / time_diff
+                rate_longitude = (row['longitude'] - prev_row['longitude']) / time_diff
+                rate_altitude = (row['altitude'] - prev_row['altitude']) / time_diff
+                rate_vertical_rate = (row['vertical_rate'] - prev_row['vertical_rate']) / time_diff
+                rate_groundspeed = (row['groundspeed'] - prev_row['groundspeed']) / time_diff
+
+                # Continue adding interpolated points until distance is within 40 km
+                while distance_km > 40:
+                    # Compute new timestamp by adding 1 second to the previous timestamp
+                    interpolated_timestamp = prev_row['timestamp'] + pd.Timedelta(seconds=1)
+
+                    # Ensure the new timestamp is unique
+                    if interpolated_timestamp in group['timestamp'].values:
+                        break
+
+                    # Compute interpolated values using linear interpolation
+                    interpolated_latitude = prev_row['latitude'] + rate_latitude
+                    interpolated_longitude = prev_row['longitude'] + rate_longitude
+                    interpolated_altitude = prev_row['altitude'] + rate_altitude
+                    interpolated_vertical_rate = prev_row['vertical_rate'] + rate_vertical_rate
+                    interpolated_groundspeed = prev_row['groundspeed'] + rate_groundspeed
+
+                    # Create new interpolated row
+                    midpoint = {
+                        'icao24':           prev_row['icao24'],
+                        'callsign':         prev_row['callsign'],
+                        'flight_id':        prev_row['flight_id'],
+                        'timestamp':        interpolated_timestamp,
+                        'latitude':         interpolated_latitude,
+                        'longitude':        interpolated_longitude,
+                        'altitude':         interpolated_altitude,
+                        'vertical_rate':    interpolated_vertical_rate,
+                        'groundspeed':      interpolated_groundspeed,
+                        # Add interpolation for other attributes as needed
+                    }
+
+                    # Add the new midpoint to new_rows
+                    new_rows.append(midpoint)
+
+                    # Update prev_row to the new midpoint and reassess the distance
+                    prev_row = pd.Series(midpoint)
+                    coord1 = (prev_row['latitude'], prev_row['longitude'])
+                    distance_km = geodesic(coord1, coord2).kilometers
+
+            # After processing, update prev_row to the current row
+            prev_row = row
+
+        # Add new rows to the group
+        if new_rows:
+            group = pd.concat([group, pd.DataFrame(new_rows)], ignore_index=True)
+
+        # Sort the group by timestamp to ensure order
+        return group.sort_values(by='timestamp').reset_index(drop=True)
+
+    # Apply the interpolation logic to each flight_id group
+    df = df.groupby('flight_id', group_keys=False, observed=True).apply(add_interpolated_rows)
+
+    # Sort the DataFrame by flight_id and timestamp
+    df = df.sort_values(by=['timestamp', 'flight_id']).reset_index(drop=True)
+
+    return df
@@ -2,47 +2,19 @@ import pandas as pd
 import numpy as np
 from tqdm import tqdm
 
+from sample_reconciliation import reconcile_datasets
+from flight_id_sets import FlightIdSets
+
+# Reconciliation method: "merge" (binary search + byte copy on the sorted files, in parallel) or "concat"
+# (read, concatenate, drop duplicates, sort and rewrite each file)
+reconciliation_mode = "merge"
+
+# Compare the flight IDs of the sample datasets before the reconciliation
+compare_flight_ids = False
+
 # Load your datasets
 # Load the CSV files as the datasets
 df_main = pd.read_csv("C:\\Users\\wesle\\OneDrive\\Documentos\\Master\\traffic\\code1\\2024-01-01_2024-01-01_lon_min_-45_lon_max_45_lat_min_30_lat_max_70_flight_id_sample_one_processed.csv", low_memory=False)  # Replace with the actual file path
-# df1     = pd.read_csv("C:\\Users\\wesle\\OneDrive\\Documentos\\Master\\traffic\\code1\\2024-01-01_2024-01-01_lon_min_-45_lon_max_45_lat_min_30_lat_max_70_flight_id_sample_two_processed.csv", low_memory=False)
-# df2     = pd.read_csv("C:\\Users\\wesle\\OneDrive\\Documentos\\Master\\traffic\\code1\\2024-01-01_2024-01-01_lon_min_-45_lon_max_45_lat_min_30_lat_max_70_flight_id_sample_three_processed.csv", low_memory=False)
-# df3     = pd.read_csv("C:\\Users\\wesle\\OneDrive\\Documentos\\Master\\traffic\\code1\\2024-01-01_2024-01-01_lon_min_-45_lon_max_45_lat_min_30_lat_max_70_flight_id_sample_four_processed.csv", low_memory=False)
-# df4     = pd.read_csv("C:\\Users\\wesle\\OneDrive\\Documentos\\Master\\traffic\\code1\\2024-01-01_2024-01-01_lon_min_-45_lon_max_45_lat_min_30_lat_max_70_flight_id_sample_five_processed.csv", low_memory=False)
-# df5     = pd.read_csv("C:\\Users\\wesle\\OneDrive\\Documentos\\Master\\traffic\\code1\\2024-01-01_2024-01-01_lon_min_-45_lon_max_45_lat_min_30_lat_max_70_flight_id_sample_six_processed.csv", low_memory=False)
-# 
-# # Get unique flight IDs for each dataset
-# flight_ids = {
-#     "Dataset1": set(df1["flight_id"].unique()),
-#     "Dataset2": set(df2["flight_id"].unique()),
-#     "Dataset3": set(df3["flight_id"].unique()),
-#     "Dataset4": set(df4["flight_id"].unique()),
-#     "Dataset5": set(df5["flight_id"].unique()),
-# }
-# 
-# # Find the common flight IDs across all datasets
-# common_flight_ids = set.intersection(*flight_ids.values())
-# 
-# # Print results
-# print(f"Number of common flight IDs across all datasets: {len(common_flight_ids)}")
-# 
-# # Find flights not in common for each dataset
-# not_in_common = {}
-# for dataset_name, ids in flight_ids.items():
-#     # Flights in other datasets but not in the current one
-#     other_ids = set.union(*(flight_ids[name] for name in flight_ids if name != dataset_name))
-#     not_in_common[dataset_name] = other_ids - ids
-# 
-# # Print results for flights not in common
-# print("\nNumber of flights not in common per dataset:")
-# for dataset_name, not_found in not_in_common.items():
-#     print(f"  Not in {dataset_name}: {len(not_found)} flights")
-# 
-# # Optional: Print details of flight IDs not in common
-# # Uncomment if needed
-# for dataset_name, not_found in not_in_common.items():
-#     print(f"\nFlights not in {dataset_name}: {not_found}")
-
 # Loop through each unique flight_id
 # Step 1: Extract rows with global min and max times for each flight_id
 
@@ -69,7 +41,40 @@ dataset_paths = [
     "C:\\Users\\wesle\\OneDrive\\Documentos\\Master\\traffic\\code1\\2024-01-01_2024-01-01_lon_min_-45_lon_max_45_lat_min_30_lat_max_70_flight_id_sample_six_processed.csv",
 ]  # Paths to the datasets
 
-for dataset_path in tqdm(dataset_paths, desc="Processing datasets", unit="dataset"):
+if compare_flight_ids:
+    # Dictionary-encoded bitmaps of the flight IDs (only the flight_id column of each dataset is read)
+    flight_id_sets = FlightIdSets.from_csv({f"Dataset{index + 1}": path for index, path in enumerate(dataset_paths)})
+
+    # Find the common flight IDs across all datasets
+    common_flight_ids = flight_id_sets.intersection()
+    print(f"Number of common flight IDs across all datasets: {len(common_flight_ids)}")
+
+    # Find flights not in common for each dataset (flights in other datasets but not in the current one)
+    not_in_common = flight_id_sets.missing()
+    print("\nNumber of flights not in common per dataset:")
+    for dataset_name, not_found in not_in_common.items():
+        print(f"  Not in {dataset_name}: {len(not_found)} flights")
+
+    # Number of flights shared by each pair of datasets
+    print("\nPairwise overlap of flight IDs:")
+    print(flight_id_sets.overlap_matrix())
+
+if reconciliation_mode == "merge":
+    # Insert only the missing boundary rows; the datasets are already sorted by flight_id and time
+    merge_results = reconcile_datasets(dataset_paths, min_max_df, key_columns=("flight_id", "time"))
+
+    for dataset_path, result in merge_results.items():
+        if result is None:
+            print(f"Columns differ from the main dataset, using concat for: {dataset_path}")
+        else:
+            print(f"Rows inserted: {result[0]}, replaced: {result[1]} in {dataset_path}")
+
+    # Datasets with a different header are processed with the concat method
+    concat_paths = [dataset_path for dataset_path, result in merge_results.items() if result is None]
+else:
+    concat_paths = dataset_paths
+
+for dataset_path in tqdm(concat_paths, desc="Processing datasets", unit="dataset"):
     # Load the dataset
     df = pd.read_csv(dataset_path, low_memory=False)
 
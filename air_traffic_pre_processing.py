@@ -22,22 +22,36 @@
 #       the appropriate sections (notably datetime conversions, ID assignments, and output columns).
 #     - Invalid timestamp rows are filtered out before processing.
 #     - Memory is managed efficiently by clearing intermediate objects.
-#     - tqdm is used to visualize processing progress.
+#     - tqdm is used to visualize processing progress; rows, bytes, time and memory of the stages are recorded by
+#       `pipeline_telemetry.py`.
+#     - The derived columns of the FlightRadar24 export (ISA pressure, ground velocity, wind and true airspeed) are
+#       computed by `atmosphere_wind.py` (FlightRadar24 section), with the wind of the grid `wind_file` (zero wind if
+#       None).
 # ===============================================================================================================
 
+import os
+
 import pandas as pd
 from traffic.core import Traffic  # Assuming you're using the `traffic` library
 from tqdm import tqdm
 
+from pipeline_telemetry import stage
+
 # Inputs and outputs
 input_file = "C:\\Users\\wesle\\OneDrive\\Documentos\\Master\\traffic\\code1\\data\\2025\\2025_01_08-2025_01_14\\air_traffic_output_data_2025-01-14.csv"
 output_files = {
     "5s": "C:\\Users\\wesle\\OneDrive\\Documentos\\Master\\traffic\\code1\\data\\2025\\2025_01_08-2025_01_14\\air_traffic_output_data_2025-01-14_flight_id.csv",
 }
 
+# Wind grid for the FlightRadar24 derived columns (see atmosphere_wind.py, path without extension)
+wind_file = None
+
 # Load the CSV file
 print('Load the CSV file \n') 
-df = pd.read_csv(input_file, low_memory=False)
+with stage("load") as current:
+    df = pd.read_csv(input_file, low_memory=False)
+    current.add("bytes_read", os.path.getsize(input_file))
+    current.add("rows_out", len(df))
 
 # Attempt to convert the timestamp column to datetime, marking invalid rows as NaT - OpenSky
 df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
@@ -63,6 +77,10 @@ df['timestamp'] = pd.to_datetime(df['timestamp'])
 # Optional: Reset the index after dropping rows
 df.reset_index(drop=True, inplace=True)
 
+# # Derived columns (altitude already in meters, see format_flight_radar_24.py) - Flight Radar 24
+# from atmosphere_wind import WindGrid, derive_fr24_columns
+# df = derive_fr24_columns(df, WindGrid(wind_file) if wind_file else None, altitude_ft=False)
+
 # Create a Traffic object
 traffic_data = Traffic(df)
 
@@ -70,18 +88,26 @@ del df  # Clear memory
 
 # Loop through each resampling rule
 for rule, output_file in tqdm(output_files.items(), desc="Processing flights", unit="flight"):
-    # Resample data - OpenSky
-    resampled_traffic_data = traffic_data.resample(rule=rule)
+    with stage("resample") as current:
+        current.add("rows_in", len(traffic_data.data))
+
+        # Resample data - OpenSky
+        resampled_traffic_data = traffic_data.resample(rule=rule)
+
+        # Assign unique IDs to flights - OpenSky
+        resampled_traffic_data = resampled_traffic_data.assign_id().eval()
 
-    # Assign unique IDs to flights - OpenSky
-    resampled_traffic_data = resampled_traffic_data.assign_id().eval()
+        # # Assign unique IDs to flights - Flight Radar 24
+        # resampled_traffic_data = traffic_data.assign_id().eval()    
 
-    # # Assign unique IDs to flights - Flight Radar 24
-    # resampled_traffic_data = traffic_data.assign_id().eval()    
+        current.add("rows_out", len(resampled_traffic_data.data))
 
     # Save to CSV - OpenSky
-    resampled_traffic_data.data[['icao24', 'callsign', 'timestamp', 'latitude', 'longitude', 'altitude',
-                                 'vertical_rate', 'groundspeed', 'flight_id', 'track']].to_csv(output_file, index=False)
+    with stage("save") as current:
+        resampled_traffic_data.data[['icao24', 'callsign', 'timestamp', 'latitude', 'longitude', 'altitude',
+                                     'vertical_rate', 'groundspeed', 'flight_id', 'track']].to_csv(output_file, index=False)
+        current.add("bytes_written", os.path.getsize(output_file))
+        current.add("rows_out", len(resampled_traffic_data.data))
 
     # # Save to CSV - Flight Radar 24
     # resampled_traffic_data.data[['icao24','timestamp','callsign','latitude','longitude',
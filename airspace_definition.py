@@ -5,8 +5,10 @@
 #
 # Inputs:
 #     - A dictionary named `regions`, where each key is a region identifier and 
-#       each value is a list containing geographical boundaries in the format:
-#       [minimum longitude, maximum longitude, maximum latitude, minimum latitude].
+#       each value contains the geographical boundaries in the format:
+#       (minimum longitude, minimum latitude, maximum longitude, maximum latitude).
+#       The regions are defined in `airspace_regions.py`, which also labels the
+#       state vectors with their region.
 #
 # Outputs:
 #     - A map plot displaying each region as a labeled rectangle, including coastlines,
@@ -22,6 +24,8 @@
 #     - Regions are drawn with `matplotlib.patches.Rectangle` and transformed to 
 #       geographic coordinates.
 #     - Gridlines and labels are added for better geospatial readability.
+#     - With `cached_basemap = True` the 10m-scale features are rasterized once and reused from the basemap
+#       cache (`basemap_cache.py`); set it to False for vector features in the PDF.
 #     - Ensure that Cartopy and its dependencies (e.g., GEOS, PROJ, Shapely) are
 #       properly installed before running the script.
 # =============================================================================
@@ -31,28 +35,30 @@ import cartopy.crs as ccrs
 import cartopy.feature as cfeature
 import matplotlib.patches as mpatches
 
-# Define the airspace regions with the correct format [min lon, max lon, max lat, min lat]
-regions = {
-    "Area_1": [-100, -85, 30, 0],
-    "Area_21": [-85, -55, 30, 10],
-    "Area_22": [-55, -30, 15, -5],
-    "Area_3": [-85, -55, -5, -20],
-    "Area_4": [-85, -30, -20, -30],
-    "Area_5": [-85, -55, 10, -5],
-    "Area_6": [-55, -30, -5, -20],
-}
+from basemap_cache import add_basemap
+from airspace_regions import americas_regions
+
+# Draw the background from the basemap cache (raster, reused between runs) instead of the vector features
+cached_basemap = True
+
+# Airspace regions (lon_min, lat_min, lon_max, lat_max), defined in airspace_regions.py
+regions = americas_regions
 
 # Set up the map
 fig = plt.figure(figsize=(12, 10))
 ax = plt.axes(projection=ccrs.PlateCarree())
-ax.set_extent([-100, -30, -30, 40], crs=ccrs.PlateCarree())
 
 # Set water to blue and land to white
-ax.add_feature(cfeature.OCEAN.with_scale("10m"), color="lightblue")
-ax.add_feature(cfeature.LAND.with_scale("10m"), color="white", edgecolor="black")
-ax.add_feature(cfeature.BORDERS.with_scale("10m"), linestyle=":", linewidth=1)
-ax.add_feature(cfeature.COASTLINE.with_scale("10m"), linewidth=1)
-ax.add_feature(cfeature.LAKES.with_scale("10m"), color="lightblue", alpha=1)
+if cached_basemap:
+    # Same resolution as the saved PNG (600 dpi)
+    add_basemap(ax, [-100, -30, -30, 40], style="detailed", scale="10m", dpi=600)
+else:
+    ax.set_extent([-100, -30, -30, 40], crs=ccrs.PlateCarree())
+    ax.add_feature(cfeature.OCEAN.with_scale("10m"), color="lightblue")
+    ax.add_feature(cfeature.LAND.with_scale("10m"), color="white", edgecolor="black")
+    ax.add_feature(cfeature.BORDERS.with_scale("10m"), linestyle=":", linewidth=1)
+    ax.add_feature(cfeature.COASTLINE.with_scale("10m"), linewidth=1)
+    ax.add_feature(cfeature.LAKES.with_scale("10m"), color="lightblue", alpha=1)
 
 # Add gridlines with better precision
 gl = ax.gridlines(draw_labels=True, color="gray", linestyle="--", linewidth=0.5)
@@ -63,7 +69,7 @@ gl.ylabel_style = {"size": 16}
 
 # Plot each region as a red rectangle
 for region, coords in regions.items():
-    lon_min, lon_max, lat_max, lat_min = coords
+    lon_min, lat_min, lon_max, lat_max = coords
     rect = mpatches.Rectangle(
         (lon_min, lat_min), lon_max - lon_min, lat_max - lat_min,
         fill=False, edgecolor="black", linewidth=1
@@ -0,0 +1,233 @@
+# ===============================================================================================================
+# Author: Wesley Gonçalves da Silva - IST1105271
+# Purpose:
+#     This module gathers the airspace regions used in the project and labels state vectors with the region(s)
+#     containing them:
+#         - `americas_regions`: Area_1 ... Area_6 of `airspace_definition.py`.
+#         - `opensky_areas`: AREA_* retrieval boxes of `historical_traffic_data.py`.
+#         - `erc_regions`: ERC01 ... ERC13 listed in `Notes`.
+#     A uniform longitude/latitude grid index is precomputed once: every cell stores the bitmask of the regions
+#     covering it entirely and of the regions crossing it. Labelling is then a vectorized cell lookup, and only
+#     the points of cells crossed by a region boundary are tested against that region.
+#
+# Inputs:
+#     - Regions as (lon_min, lat_min, lon_max, lat_max) boxes in degrees.
+#     - Longitudes and latitudes (arrays or DataFrame columns) of the positions to label.
+#
+# Outputs:
+#     - Bitmask of all the regions containing each position (`RegionIndex.assign_mask`), and the first region
+#       containing each position in the order of definition (`RegionIndex.assign`, -1 outside all regions).
+#     - DataFrame column with the region name (`RegionIndex.label`).
+#
+# Additional Comments:
+#     - All regions are stored as (lon_min, lat_min, lon_max, lat_max), the order of `historical_traffic_data.py`;
+#       the original orders of the other sources are converted below.
+#     - A region contains the points with lon_min <= longitude < lon_max and lat_min <= latitude < lat_max, so that
+#       adjacent regions do not share their common boundary. Overlapping regions (e.g. ERC08 and ERC09) are all
+#       reported in the bitmask; `assign` keeps the first one.
+#     - With boundaries on whole degrees and the default cell size of 1 degree, no cell is crossed by a boundary
+#       and labelling is a pure table lookup.
+#     - At most 64 regions per index (one bit of a uint64 each).
+# ===============================================================================================================
+
+import numpy as np
+import pandas as pd
+
+# Number of positions looked up at once
+lookup_chunk_size = 1 << 15
+
+# airspace_definition.py: [min lon, max lon, max lat, min lat]
+_airspace_definition = {
+    "Area_1": [-100, -85, 30, 0],
+    "Area_21": [-85, -55, 30, 10],
+    "Area_22": [-55, -30, 15, -5],
+    "Area_3": [-85, -55, -5, -20],
+    "Area_4": [-85, -30, -20, -30],
+    "Area_5": [-85, -55, 10, -5],
+    "Area_6": [-55, -30, -5, -20],
+}
+americas_regions = {name: (lon_min, lat_min, lon_max, lat_max)
+                    for name, (lon_min, lon_max, lat_max, lat_min) in _airspace_definition.items()}
+
+# historical_traffic_data.py: (lon_min, lat_min, lon_max, lat_max)
+opensky_areas = {
+    "AREA_1":   (-25, 18, -11, 40,),
+    "AREA_2_1": (-11, 25,  11, 53,),
+    "AREA_2_2": (11, 25,  33, 53,),
+    "AREA_3":   (-25, 40, -11, 75,),
+    "AREA_4":   (-11, 53,  33, 75,),
+    "AREA_5":   ( 33, 30,  51, 48,),
+    "AREA_6":   ( 33, 48,  42, 53,),
+}
+
+# Notes: west, east, north, south
+_erc_notes = {
+    "ERC01":   (-19, -2, 37, 25),
+    "ERC02":   (-16, -3, 46, 34),
+    "ERC03":   (5, 23, 41, 29),
+    "ERC04":   (18, 36, 45, 32),
+    "ERC05":   (29, 48, 48, 36),
+    "ERC06":   (15, 35, 54, 41),
+    "ERC07":   (4, 23, 53, 41),
+    "ERC08":   (-11, 10, 55, 42),
+    "ERC09":   (0, 24, 57, 44),
+    "ERC10":   (-16, 3, 65, 48),
+    "ERC11":   (0, 28, 66, 53),
+    "ERC12_1": (-3, 34, 75, 64),
+    "ERC12_2": (-23, 10, 66, 61),
+    "ERC13":   (-25, 11, 31, 18),
+}
+erc_regions = {name: (west, south, east, north) for name, (west, east, north, south) in _erc_notes.items()}
+
+# Region sets available by name
+region_sets = {
+    "americas": americas_regions,
+    "areas":    opensky_areas,
+    "erc":      erc_regions,
+}
+
+
+def _first_region(masks):
+    """
+    Returns the index of the lowest set bit of every bitmask (-1 for empty masks).
+    """
+    # Isolate the lowest set bit (a power of two, exact in float64) and take its base-2 logarithm
+    lowest = masks & (~masks + np.uint64(1))
+    indices = np.full(len(masks), -1, dtype=np.int16)
+    found = lowest > 0
+    indices[found] = np.log2(lowest[found].astype(np.float64)).astype(np.int16)
+    return indices
+
+
+class RegionIndex:
+    """
+    Uniform grid index of a set of rectangular regions.
+
+    Args:
+        regions (dict or str): Region name -> (lon_min, lat_min, lon_max, lat_max), or a key of `region_sets`.
+        cell_size (float): Size of the grid cells in degrees.
+    """
+
+    def __init__(self, regions, cell_size=1.0):
+        if isinstance(regions, str):
+            regions = region_sets[regions]
+        if len(regions) > 64:
+            raise ValueError("A RegionIndex supports at most 64 regions.")
+
+        self.names = list(regions)
+        self.boxes = np.array([regions[name] for name in self.names], dtype=float).reshape(-1, 4)
+        self.cell_size = float(cell_size)
+
+        # Grid covering all the regions
+        self.lon_origin = np.floor(self.boxes[:, 0].min() / self.cell_size) * self.cell_size
+        self.lat_origin = np.floor(self.boxes[:, 1].min() / self.cell_size) * self.cell_size
+        self.n_lon = int(np.ceil((self.boxes[:, 2].max() - self.lon_origin) / self.cell_size))
+        self.n_lat = int(np.ceil((self.boxes[:, 3].max() - self.lat_origin) / self.cell_size))
+
+        # Cell edges
+        lon_edges = self.lon_origin + self.cell_size * np.arange(self.n_lon + 1)
+        lat_edges = self.lat_origin + self.cell_size * np.arange(self.n_lat + 1)
+
+        # Bitmasks of the regions covering each cell entirely (full) or partially (partial)
+        self.full = np.zeros((self.n_lat, self.n_lon), dtype=np.uint64)
+        self.partial = np.zeros((self.n_lat, self.n_lon), dtype=np.uint64)
+        for bit, (lon_min, lat_min, lon_max, lat_max) in enumerate(self.boxes):
+            flag = np.uint64(1) << np.uint64(bit)
+            lon_inside = (lon_edges[:-1] >= lon_min) & (lon_edges[1:] <= lon_max)
+            lon_overlap = (lon_edges[1:] > lon_min) & (lon_edges[:-1] < lon_max)
+            lat_inside = (lat_edges[:-1] >= lat_min) & (lat_edges[1:] <= lat_max)
+            lat_overlap = (lat_edges[1:] > lat_min) & (lat_edges[:-1] < lat_max)
+
+            inside = lat_inside[:, None] & lon_inside[None, :]
+            overlap = lat_overlap[:, None] & lon_overlap[None, :]
+            self.full[inside] |= flag
+            self.partial[overlap & ~inside] |= flag
+
+        # Flat lookup tables with a last, empty cell for the positions outside the grid
+        self.full = np.append(self.full.ravel(), np.uint64(0))
+        self.partial = np.append(self.partial.ravel(), np.uint64(0))
+        self.has_partial = bool(self.partial.any())
+
+    def _cells(self, longitude, latitude):
+        """
+        Returns the flat cell index of every position (the empty sentinel cell outside the grid).
+        """
+        column = np.floor((longitude - self.lon_origin) / self.cell_size)
+        row = np.floor((latitude - self.lat_origin) / self.cell_size)
+        inside = (column >= 0) & (column < self.n_lon) & (row >= 0) & (row < self.n_lat)  # False for NaN
+        return np.where(inside, row * self.n_lon + column, self.n_lon * self.n_lat).astype(np.int64)
+
+    def assign_mask(self, longitude, latitude):
+        """
+        Returns the bitmask of all the regions containing each position.
+
+        Args:
+            longitude (array-like): Longitudes in degrees.
+            latitude (array-like): Latitudes in degrees.
+
+        Returns:
+            np.ndarray: uint64 bitmask per position (bit i set if the position is in region `names[i]`).
+        """
+        longitude = np.asarray(longitude, dtype=float)
+        latitude = np.asarray(latitude, dtype=float)
+        masks = np.empty(len(longitude), dtype=np.uint64)
+
+        # Chunks small enough for the intermediate arrays to stay in the CPU cache
+        for start in range(0, len(longitude), lookup_chunk_size):
+            stop = start + lookup_chunk_size
+            lon, lat = longitude[start:stop], latitude[start:stop]
+            cells = self._cells(lon, lat)
+            np.take(self.full, cells, out=masks[start:stop])
+
+            # Exact test of the regions crossing the cells, only for the positions in those cells
+            if self.has_partial:
+                candidates = self.partial[cells]
+                present = int(np.bitwise_or.reduce(candidates)) if len(candidates) else 0
+                for bit in range(len(self.names)):
+                    if not present >> bit & 1:
+                        continue
+                    flag = np.uint64(1) << np.uint64(bit)
+                    points = np.flatnonzero(candidates & flag)
+                    lon_min, lat_min, lon_max, lat_max = self.boxes[bit]
+                    contained = ((lon[points] >= lon_min) & (lon[points] < lon_max)
+                                 & (lat[points] >= lat_min) & (lat[points] < lat_max))
+                    masks[start + points[contained]] |= flag
+        return masks
+
+    def assign(self, longitude, latitude):
+        """
+        Returns the index of the first region (order of `names`) containing each position.
+
+        Args:
+            longitude (array-like): Longitudes in degrees.
+            latitude (array-like): Latitudes in degrees.
+
+        Returns:
+            np.ndarray: int16 region index per position, -1 outside all regions.
+        """
+        return _first_region(self.assign_mask(longitude, latitude))
+
+    def decode(self, mask):
+        """
+        Returns the names of the regions of a bitmask.
+        """
+        mask = int(mask)
+        return [name for bit, name in enumerate(self.names) if mask >> bit & 1]
+
+    def label(self, df, column="region", mask_column=None):
+        """
+        Adds the region of every position to a DataFrame.
+
+        Args:
+            df (pd.DataFrame): Positions with 'longitude' and 'latitude'.
+            column (str): Name of the column with the first region (categorical, NaN outside all regions).
+            mask_column (str): Name of an optional column with the bitmask of all regions.
+
+        Returns:
+            pd.DataFrame: The DataFrame with the new column(s).
+        """
+        masks = self.assign_mask(df["longitude"].to_numpy(dtype=float), df["latitude"].to_numpy(dtype=float))
+        df[column] = pd.Categorical.from_codes(_first_region(masks), categories=self.names)
+        if mask_column is not None:
+            df[mask_column] = masks
+        return df
@@ -0,0 +1,259 @@
+# ===============================================================================================================
+# Author: Wesley Gonçalves da Silva - IST1105271
+# Purpose:
+#     This module computes the derived columns of the FlightRadar24 export of `air_traffic_pre_processing.py`
+#     (altitude_m, pressure_hPa, heading_rad, GS_x, GS_y, u_wind, v_wind, true_airspeed) on whole arrays at once:
+#         - ISA pressure from the altitude (troposphere and lower stratosphere).
+#         - Ground velocity components from the groundspeed and the heading.
+#         - Wind interpolated from a local gridded wind file (`WindGrid`), and true airspeed from the wind triangle.
+#
+# Inputs:
+#     - DataFrame with timestamp, latitude, longitude, altitude, groundspeed and heading (FlightRadar24 format).
+#     - Optional wind grid: u and v components (m/s) on time / pressure level / latitude / longitude axes, e.g.
+#       converted from ERA5 pressure level data with `write_wind_grid`.
+#
+# Outputs:
+#     - The DataFrame with the derived columns (`derive_fr24_columns`).
+#     - Wind grid files: "<name>.npy" with the u and v arrays (memory-mapped when read) and "<name>_axes.npz".
+#
+# Additional Comments:
+#     - Units: altitude_m in m, pressure_hPa in hPa, GS_x (east), GS_y (north), u_wind and v_wind in m/s,
+#       true_airspeed in kts (as the groundspeed), heading_rad in radians clockwise from north.
+#     - The FlightRadar24 "heading" is the direction of the ground velocity (track), so GS_x / GS_y are exact and the
+#       true airspeed is the norm of the air velocity (ground velocity minus wind).
+#     - The wind is interpolated linearly in log-pressure, latitude and longitude (trilinear), and linearly in time
+#       between the two surrounding grid times. Positions outside the grid take the values of its border.
+#     - The 16 grid values surrounding each position are read once per grid cell and kept in a lookup cache, so
+#       consecutive samples of the flights (mostly in the same cells) do not read the memory-mapped file again.
+#     - Without a wind grid, the wind is zero and the true airspeed equals the groundspeed.
+# ===============================================================================================================
+
+import numpy as np
+import pandas as pd
+
+# ISA constants
+SEA_LEVEL_PRESSURE = 1013.25                        # hPa
+SEA_LEVEL_TEMPERATURE = 288.15                      # K
+LAPSE_RATE = 0.0065                                 # K/m
+TROPOPAUSE_ALTITUDE = 11000.0                       # m
+GAS_CONSTANT = 287.05287                            # J/(kg K)
+GRAVITY = 9.80665                                   # m/s^2
+
+FT_TO_M = 0.3048
+KTS_TO_MS = 1852.0 / 3600.0
+
+# Largest number of grid cells kept in the lookup cache of a WindGrid
+wind_cache_size = 1 << 16
+
+
+def isa_pressure(altitude):
+    """
+    Returns the ISA pressure at the given altitudes.
+
+    Args:
+        altitude (array-like): Geopotential altitudes in meters.
+
+    Returns:
+        np.ndarray: Pressure in hPa.
+    """
+    altitude = np.asarray(altitude, dtype=float)
+    exponent = GRAVITY / (GAS_CONSTANT * LAPSE_RATE)
+    troposphere = SEA_LEVEL_PRESSURE * (1 - LAPSE_RATE * np.minimum(altitude, TROPOPAUSE_ALTITUDE)
+                                        / SEA_LEVEL_TEMPERATURE) ** exponent
+    # Isothermal layer above the tropopause
+    tropopause_temperature = SEA_LEVEL_TEMPERATURE - LAPSE_RATE * TROPOPAUSE_ALTITUDE
+    return troposphere * np.exp(-GRAVITY * np.maximum(altitude - TROPOPAUSE_ALTITUDE, 0)
+                                / (GAS_CONSTANT * tropopause_temperature))
+
+
+def ground_velocity(groundspeed, heading):
+    """
+    Returns the east and north components of the ground velocity.
+
+    Args:
+        groundspeed (array-like): Groundspeed in kts.
+        heading (array-like): Direction of the ground velocity in degrees clockwise from north.
+
+    Returns:
+        tuple: (GS_x, GS_y) in m/s.
+    """
+    speed = np.asarray(groundspeed, dtype=float) * KTS_TO_MS
+    heading = np.radians(np.asarray(heading, dtype=float))
+    return speed * np.sin(heading), speed * np.cos(heading)
+
+
+def true_airspeed(gs_x, gs_y, u_wind, v_wind):
+    """
+    Returns the true airspeed from the wind triangle (air velocity = ground velocity - wind).
+
+    Args:
+        gs_x, gs_y (array-like): Ground velocity components in m/s.
+        u_wind, v_wind (array-like): Wind components (towards east / north) in m/s.
+
+    Returns:
+        np.ndarray: True airspeed in kts.
+    """
+    return np.hypot(np.asarray(gs_x) - u_wind, np.asarray(gs_y) - v_wind) / KTS_TO_MS
+
+
+def write_wind_grid(name, times, levels, latitudes, longitudes, u, v):
+    """
+    Writes a wind grid in the format read by `WindGrid`.
+
+    Args:
+        name (str): Path of the grid without extension.
+        times (array-like): Grid times (UTC if naive).
+        levels (array-like): Pressure levels in hPa.
+        latitudes (array-like): Latitudes in degrees.
+        longitudes (array-like): Longitudes in degrees.
+        u, v (np.ndarray): Wind components in m/s, shape (time, level, latitude, longitude).
+    """
+    times = pd.to_datetime(np.asarray(times), utc=True).as_unit("ns").asi8
+    axes = [times, np.asarray(levels, dtype=float), np.asarray(latitudes, dtype=float),
+            np.asarray(longitudes, dtype=float)]
+    data = np.stack([np.asarray(u, dtype=np.float32), np.asarray(v, dtype=np.float32)])
+
+    # Increasing axes (ERA5 stores the latitudes and levels in decreasing order)
+    for dimension, axis in enumerate(axes):
+        order = np.argsort(axis, kind="stable")
+        axes[dimension] = axis[order]
+        data = np.take(data, order, axis=dimension + 1)
+
+    np.save(f"{name}.npy", np.ascontiguousarray(data))
+    np.savez(f"{name}_axes.npz", times=axes[0], levels=axes[1], latitudes=axes[2], longitudes=axes[3])
+
+
+def _locate(axis, values):
+    """
+    Returns the lower grid index and the interpolation weight of each value along an increasing axis.
+    """
+    if len(axis) == 1:
+        return np.zeros(len(values), dtype=np.int64), np.zeros(len(values))
+    index = np.clip(np.searchsorted(axis, values, side="right") - 1, 0, len(axis) - 2)
+    with np.errstate(invalid="ignore"):
+        weight = np.clip((values - axis[index]) / (axis[index + 1] - axis[index]), 0.0, 1.0)
+    return index, np.nan_to_num(weight)
+
+
+class WindGrid:
+    """
+    Gridded wind read through a memory map, with vectorized interpolation and a lookup cache of grid cells.
+
+    Args:
+        name (str): Path of the grid without extension (files written by `write_wind_grid`).
+    """
+
+    def __init__(self, name):
+        self.data = np.load(f"{name}.npy", mmap_mode="r")     # (component, time, level, latitude, longitude)
+        with np.load(f"{name}_axes.npz") as axes:
+            self.times = axes["times"]
+            self.log_levels = np.log(axes["levels"])
+            self.latitudes = axes["latitudes"]
+            self.longitudes = axes["longitudes"]
+        self.shape = self.data.shape[1:]
+
+        # Corner offsets of a cell (time, level, latitude, longitude), limited to the axes with two values or more
+        # (upper corner flags; the weight of the upper corners of single-valued axes is zero)
+        self.upper = np.array([(a, b, c, d) for a in (0, 1) for b in (0, 1) for c in (0, 1) for d in (0, 1)])
+        self.corners = self.upper * np.array([int(size > 1) for size in self.shape])
+
+        # Lookup cache: sorted cell keys and their corner values (key, component, corner)
+        self._cache_keys = np.array([], dtype=np.int64)
+        self._cache_values = np.empty((0, 2, 16), dtype=np.float32)
+
+    def _corner_values(self, cells):
+        """
+        Returns the values of the 16 corners of the given cells (lower indices, shape (n, 4)), from the cache or
+        from the file.
+        """
+        keys = np.ravel_multi_index(cells.T, self.shape)
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+
+        position = np.searchsorted(self._cache_keys, unique_keys)
+        cached = position < len(self._cache_keys)
+        cached[cached] = self._cache_keys[position[cached]] == unique_keys[cached]
+
+        values = np.empty((len(unique_keys), 2, 16), dtype=np.float32)
+        values[cached] = self._cache_values[position[cached]]
+
+        missing = np.flatnonzero(~cached)
+        if len(missing):
+            lower = np.array(np.unravel_index(unique_keys[missing], self.shape)).T
+            corners = (lower[:, None, :] + self.corners[None, :, :]).reshape(-1, 4)
+            read = self.data[:, corners[:, 0], corners[:, 1], corners[:, 2], corners[:, 3]]
+            values[missing] = read.reshape(2, len(missing), 16).transpose(1, 0, 2)
+
+            # Add the cells read to the cache (emptied when full)
+            if len(self._cache_keys) + len(missing) > wind_cache_size:
+                self._cache_keys = self._cache_keys[:0]
+                self._cache_values = self._cache_values[:0]
+            keys = np.concatenate((self._cache_keys, unique_keys[missing]))
+            order = np.argsort(keys, kind="stable")
+            self._cache_keys = keys[order]
+            self._cache_values = np.concatenate((self._cache_values, values[missing]))[order]
+
+        return values[inverse]
+
+    def interpolate(self, times, pressure, latitude, longitude):
+        """
+        Interpolates the wind at the given positions.
+
+        Args:
+            times (array-like): Times (UTC if naive).
+            pressure (array-like): Pressure in hPa.
+            latitude (array-like): Latitudes in degrees.
+            longitude (array-like): Longitudes in degrees.
+
+        Returns:
+            tuple: (u_wind, v_wind) in m/s.
+        """
+        times = pd.to_datetime(pd.Series(np.asarray(times)), utc=True).dt.as_unit("ns").astype("int64").to_numpy()
+        located = [_locate(self.times.astype(float), times.astype(float)),
+                   _locate(self.log_levels, np.log(np.asarray(pressure, dtype=float))),
+                   _locate(self.latitudes, np.asarray(latitude, dtype=float)),
+                   _locate(self.longitudes, np.asarray(longitude, dtype=float))]
+        cells = np.stack([index for index, weight in located], axis=1)
+        weights = np.stack([weight for index, weight in located], axis=1)
+
+        # Weight of each corner: product over the axes of w (upper value) or 1 - w (lower value)
+        corner_weights = np.prod(np.where(self.upper[None, :, :] == 1, weights[:, None, :],
+                                          1 - weights[:, None, :]), axis=2)
+
+        values = self._corner_values(cells)
+        u_wind = np.einsum("nc,nc->n", values[:, 0, :], corner_weights)
+        v_wind = np.einsum("nc,nc->n", values[:, 1, :], corner_weights)
+
+        # No wind for the positions with missing coordinates
+        missing = ~np.isfinite(np.stack([times.astype(float), np.asarray(pressure, dtype=float),
+                                         np.asarray(latitude, dtype=float), np.asarray(longitude, dtype=float)])).all(axis=0)
+        missing |= times == np.iinfo(np.int64).min
+        u_wind[missing], v_wind[missing] = np.nan, np.nan
+        return u_wind, v_wind
+
+
+def derive_fr24_columns(df, wind=None, altitude_ft=True):
+    """
+    Adds the derived columns of the FlightRadar24 export.
+
+    Args:
+        df (pd.DataFrame): Samples with timestamp, latitude, longitude, altitude, groundspeed and heading.
+        wind (WindGrid): Wind grid; zero wind if None.
+        altitude_ft (bool): True if the altitude column is in feet (FlightRadar24), False if already in meters.
+
+    Returns:
+        pd.DataFrame: The DataFrame with the derived columns.
+    """
+    df["altitude_m"] = df["altitude"].to_numpy(dtype=float) * (FT_TO_M if altitude_ft else 1.0)
+    df["pressure_hPa"] = isa_pressure(df["altitude_m"].to_numpy())
+    df["heading_rad"] = np.radians(df["heading"].to_numpy(dtype=float))
+    df["GS_x"], df["GS_y"] = ground_velocity(df["groundspeed"].to_numpy(dtype=float), df["heading"].to_numpy(dtype=float))
+
+    if wind is None:
+        df["u_wind"], df["v_wind"] = 0.0, 0.0
+    else:
+        df["u_wind"], df["v_wind"] = wind.interpolate(df["timestamp"].to_numpy(), df["pressure_hPa"].to_numpy(),
+                                                      df["latitude"].to_numpy(dtype=float),
+                                                      df["longitude"].to_numpy(dtype=float))
+    df["true_airspeed"] = true_airspeed(df["GS_x"].to_numpy(), df["GS_y"].to_numpy(), df["u_wind"].to_numpy(),
+                                        df["v_wind"].to_numpy())
+    return df
@@ -0,0 +1,195 @@
+# ===============================================================================================================
+# Author: Wesley Gonçalves da Silva - IST1105271
+# Purpose:
+#     This module caches the background of the Cartopy maps (land, ocean, coastlines, borders, lakes) used by
+#     `air_traffic_analysis.py`, `trajectory_plot.py`, `airspace_definition.py` and `batch_flight_figures.py`.
+#     The projected background is rasterized once per (extent, style, scale, projection, resolution), stored in
+#     memory and on disk, and reused as an image layer of every later figure, so that a trajectory figure only
+#     costs the drawing of the trajectory instead of re-projecting the Natural Earth features (most of the render
+#     time at the 10m scale).
+#
+# Inputs:
+#     - Map extent [lon_min, lon_max, lat_min, lat_max] in degrees (as `ax.set_extent`).
+#     - Style name of `basemap_styles`, Natural Earth scale ("110m", "50m" or "10m") and projection.
+#
+# Outputs:
+#     - The background drawn in the given GeoAxes (`add_basemap`).
+#     - Cached backgrounds (`.npz` files with the RGBA image and its projected extent) in `basemap_cache_dir`.
+#
+# Additional Comments:
+#     - The background is a raster image: in PDF figures it is embedded at `basemap_width` pixels instead of
+#       vector paths. Increase `basemap_width` (or pass the dpi of the saved figure to `add_basemap`) for
+#       print-quality figures (the cost is paid once per extent).
+#     - The background is rendered at the physical size of the target axes, so that the line widths and dash
+#       patterns (in points) look the same as features drawn directly in the figure.
+#     - Areas without any feature are transparent, so the face color of the axes remains visible.
+#     - Gridlines, labels and the trajectories are still drawn as vectors on top of the background.
+#     - Memory / disk cache hits and misses are counted by `pipeline_telemetry.py`.
+#     - Delete `basemap_cache_dir` after changing the styles (the style definitions are part of the cache key).
+# ===============================================================================================================
+
+import hashlib
+import os
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import cartopy.crs as ccrs
+import cartopy.feature as cfeature
+
+from pipeline_telemetry import count
+
+# Folder of the cached backgrounds and default width of the rasterized background in pixels
+basemap_cache_dir = "basemap_cache"
+basemap_width = 4000
+
+# Features of each style: (Natural Earth feature, keyword arguments of ax.add_feature)
+basemap_styles = {
+    # air_traffic_analysis.py and trajectory_plot.py
+    "simple": [
+        (cfeature.LAND,         {"color": "lightgray"}),
+        (cfeature.COASTLINE,    {"linewidth": 0.5}),
+        (cfeature.BORDERS,      {"linestyle": ":"}),
+    ],
+    # airspace_definition.py
+    "detailed": [
+        (cfeature.OCEAN,        {"color": "lightblue"}),
+        (cfeature.LAND,         {"color": "white", "edgecolor": "black"}),
+        (cfeature.BORDERS,      {"linestyle": ":", "linewidth": 1}),
+        (cfeature.COASTLINE,    {"linewidth": 1}),
+        (cfeature.LAKES,        {"color": "lightblue", "alpha": 1}),
+    ],
+}
+
+# Backgrounds already loaded in this process: cache key -> (RGBA image, projected extent)
+_memory_cache = {}
+
+
+def _cache_key(extent, style, scale, projection, width, axes_width=None):
+    """
+    Returns the hash identifying a background.
+    """
+    features = [(feature.name, feature.category, sorted(kwargs.items())) for feature, kwargs in basemap_styles[style]]
+    axes_width = None if axes_width is None else round(float(axes_width), 3)
+    description = repr(([float(value) for value in extent], style, features, scale, projection.proj4_init, width,
+                        axes_width))
+    return hashlib.sha1(description.encode()).hexdigest()
+
+
+def render_basemap(extent, style="simple", scale="110m", projection=None, width=None, axes_width=None):
+    """
+    Rasterizes the background of a map.
+
+    Args:
+        extent (list): [lon_min, lon_max, lat_min, lat_max] in degrees.
+        style (str): Key of `basemap_styles`.
+        scale (str): Natural Earth scale of the features.
+        projection (ccrs.Projection): Map projection; defaults to PlateCarree.
+        width (int): Width of the image in pixels; defaults to `basemap_width`.
+        axes_width (float): Width of the target axes in inches, giving the scale of the line widths (the image
+            is rendered at width / axes_width dpi); 100 dpi if None.
+
+    Returns:
+        tuple: (RGBA image as a uint8 array, projected extent [x_min, x_max, y_min, y_max])
+    """
+    projection = projection or ccrs.PlateCarree()
+    width = width or basemap_width
+    dpi = width / axes_width if axes_width else 100
+
+    # Off-screen figure whose single axes covers the whole canvas
+    fig = Figure(dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_axes([0, 0, 1, 1], projection=projection)
+    ax.set_extent(extent, crs=ccrs.PlateCarree())
+    projected_extent = list(ax.get_extent())
+
+    # Same aspect ratio as the projected extent, so that the image is not distorted
+    x_min, x_max, y_min, y_max = projected_extent
+    height = max(int(round(width * (y_max - y_min) / (x_max - x_min))), 1)
+    fig.set_size_inches(width / dpi, height / dpi)
+
+    for feature, kwargs in basemap_styles[style]:
+        ax.add_feature(feature.with_scale(scale), **kwargs)
+
+    # Transparent where there is no feature
+    ax.set_axis_off()
+    fig.patch.set_alpha(0)
+
+    fig.canvas.draw()
+    image = np.asarray(fig.canvas.buffer_rgba()).copy()
+    return image, projected_extent
+
+
+def get_basemap(extent, style="simple", scale="110m", projection=None, width=None, cache_dir=None, axes_width=None):
+    """
+    Returns a background from the memory cache, the disk cache, or renders and caches it.
+
+    Args:
+        extent (list): [lon_min, lon_max, lat_min, lat_max] in degrees.
+        style (str): Key of `basemap_styles`.
+        scale (str): Natural Earth scale of the features.
+        projection (ccrs.Projection): Map projection; defaults to PlateCarree.
+        width (int): Width of the image in pixels; defaults to `basemap_width`.
+        cache_dir (str): Folder of the cached backgrounds; defaults to `basemap_cache_dir`.
+        axes_width (float): Width of the target axes in inches (see `render_basemap`).
+
+    Returns:
+        tuple: (RGBA image, projected extent)
+    """
+    projection = projection or ccrs.PlateCarree()
+    width = width or basemap_width
+    key = _cache_key(extent, style, scale, projection, width, axes_width)
+
+    if key in _memory_cache:
+        count("basemap_memory_hits")
+        return _memory_cache[key]
+
+    cache_dir = cache_dir or basemap_cache_dir
+    path = os.path.join(cache_dir, f"{style}_{scale}_{key[:16]}.npz")
+    if os.path.exists(path):
+        with np.load(path) as data:
+            basemap = (data["image"], data["extent"].tolist())
+        count("basemap_disk_hits")
+    else:
+        basemap = render_basemap(extent, style, scale, projection, width, axes_width)
+        count("basemap_misses")
+
+        # Write through a temporary file, so that concurrent processes never read a truncated file
+        os.makedirs(cache_dir, exist_ok=True)
+        temporary_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(temporary_path, image=basemap[0], extent=np.array(basemap[1]))
+        os.replace(temporary_path, path)
+
+    _memory_cache[key] = basemap
+    return basemap
+
+
+def add_basemap(ax, extent, style="simple", scale="110m", width=None, cache_dir=None, dpi=None):
+    """
+    Sets the extent of a GeoAxes and draws the cached background below the other layers.
+
+    Args:
+        ax (cartopy.mpl.geoaxes.GeoAxes): Map axes (its projection is used).
+        extent (list): [lon_min, lon_max, lat_min, lat_max] in degrees.
+        style (str): Key of `basemap_styles`.
+        scale (str): Natural Earth scale of the features.
+        width (int): Width of the image in pixels; defaults to `basemap_width`.
+        cache_dir (str): Folder of the cached backgrounds; defaults to `basemap_cache_dir`.
+        dpi (float): Resolution of the saved figure; if given, the width is the width of the axes at this dpi.
+
+    Returns:
+        matplotlib.image.AxesImage: The background layer.
+    """
+    # Width of the axes in the figure (after the aspect ratio of the map is applied)
+    ax.set_extent(extent, crs=ccrs.PlateCarree())
+    ax.apply_aspect()
+    axes_width = ax.get_position().width * ax.figure.get_figwidth()
+    if dpi is not None:
+        width = int(round(axes_width * dpi))
+
+    image, projected_extent = get_basemap(extent, style, scale, ax.projection, width, cache_dir, axes_width)
+    layer = ax.imshow(image, extent=projected_extent, transform=ax.projection, origin="upper",
+                      interpolation="antialiased", zorder=0)
+    # imshow resets the limits to the image; restore the requested extent
+    ax.set_extent(extent, crs=ccrs.PlateCarree())
+    return layer
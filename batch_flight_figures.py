@@ -0,0 +1,275 @@
+# ===============================================================================================================
+# Author: Wesley Gonçalves da Silva - IST1105271
+# Purpose:
+#     This script renders the figures of `air_traffic_analysis.py` (geographic map, altitude, vertical rate and
+#     groundspeed over time) for a list of flights at once, instead of editing the hard-coded callsign and waiting
+#     for each interactive plot. The flights are rendered in parallel by a process pool with the non-interactive
+#     "Agg" backend, and a flight is only re-rendered when its input data (or the figure settings) changed since
+#     the previous run.
+#
+# Inputs:
+#     - A CSV file with columns timestamp, longitude, latitude, altitude, vertical_rate, groundspeed, callsign
+#       and flight_id (`input_file`).
+#     - The callsigns or flight IDs to render (`selection`, matched against `selection_column`).
+#
+# Outputs:
+#     - One folder per flight ID in `output_dir` with the map, altitude, vertical rate and groundspeed figures
+#       in each of the formats of `figure_formats`.
+#     - `figures_manifest.json` in `output_dir`: flight ID -> hash of the data and settings used for its figures.
+#
+# Additional Comments:
+#     - The hash covers only the plotted columns of the flight, so unrelated columns may change without
+#       triggering a new rendering. Deleting a figure (or the manifest) forces the flight to be rendered again.
+#     - The manifest is written after every completed flight, so an interrupted run keeps its progress.
+#     - The `if __name__ == "__main__"` guard is required by the process pool on Windows (spawned workers import
+#       this file); the plotting functions can be imported from other scripts.
+# ===============================================================================================================
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib
+matplotlib.use("Agg")  # Non-interactive backend: figures are only saved to files
+
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+import cartopy.crs as ccrs
+
+from basemap_cache import add_basemap
+from trajectory_loader import load_trajectories
+
+# Enable LaTeX font rendering
+plt.rcParams.update({
+    "text.usetex": False,
+    "font.family": "serif",
+    "font.size": 12
+})
+
+# Load the data
+input_file = "C:\\Users\\wesle\\OneDrive\\Documentos\\Master\\traffic\\code1\\data\\2025\\2025_01_01-2025_01_07-LA\\air_traffic_output_data_LA_2025-01-01_flight_id.csv"
+
+# Flights to render: values of `selection_column` ("callsign" or "flight_id")
+selection_column = "callsign"
+selection = ["AMX690"]
+
+# Figure settings
+output_dir = "flight_figures"
+figure_formats = ["pdf", "png"]
+dpi = 300
+map_margin = 2                                      # degrees added around the trajectory in the map
+max_workers = None                                  # defaults to the number of CPUs
+
+# Columns needed by the figures (the only ones read and hashed)
+plot_columns = ["timestamp", "longitude", "latitude", "altitude", "vertical_rate", "groundspeed"]
+manifest_name = "figures_manifest.json"
+
+
+def plot_map(group):
+    """
+    Plots the flight path on a geographic map around the trajectory.
+    """
+    fig = plt.figure(figsize=(15, 10))
+    ax = plt.axes(projection=ccrs.PlateCarree())
+
+    # Extent rounded outwards to whole degrees, so that flights over the same area share the cached background
+    extent = [max(np.floor(group['longitude'].min() - map_margin), -180), min(np.ceil(group['longitude'].max() + map_margin), 180),
+              max(np.floor(group['latitude'].min() - map_margin), -90), min(np.ceil(group['latitude'].max() + map_margin), 90)]
+
+    # Add map features for better fidelity (cached background)
+    add_basemap(ax, extent, style="simple")
+
+    ax.plot(group['longitude'], group['latitude'], transform=ccrs.PlateCarree(), alpha=0.7, linewidth=1)
+
+    # Add gridlines using Cartopy's GeoAxes
+    gl = ax.gridlines(draw_labels=True, linewidth=0.2, color="gray", alpha=0.5)
+    gl.top_labels = False  # Disable labels on the top
+    gl.right_labels = False  # Disable labels on the right
+
+    ax.set_xlabel(r"Longitude [\degree]")
+    ax.set_ylabel(r"Latitude [\degree]")
+    ax.set_title(r"Flight Path on Geographic Map")
+    return fig
+
+
+def plot_altitude(group):
+    """
+    Plots the altitude over the time of the day (HH:MM).
+    """
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.plot(group['time'], group['altitude'])
+    ax.set_xlabel(r"Time (Seconds since midnight)")
+    ax.set_ylabel(r"Altitude [ft]")
+    ax.set_title(r"Altitude Over Time")
+    ax.grid()
+
+    # Format x-axis to display time in HH:MM
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
+    fig.autofmt_xdate()
+    return fig
+
+
+def plot_vertical_rate(group):
+    """
+    Plots the vertical rate over the seconds since midnight.
+    """
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.plot(group['seconds_since_midnight'], group['vertical_rate'])
+    ax.set_xlabel(r"Time (Seconds since midnight)")
+    ax.set_ylabel(r"Vertical Rate [m/s]")
+    ax.set_title(r"Vertical Rate Over Time")
+    ax.grid()
+    return fig
+
+
+def plot_groundspeed(group):
+    """
+    Plots the groundspeed over the seconds since midnight.
+    """
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.plot(group['seconds_since_midnight'], group['groundspeed'])
+    ax.set_xlabel(r"Time (Seconds since midnight)")
+    ax.set_ylabel(r"Groundspeed [m/s]")
+    ax.set_title(r"Groundspeed Over Time")
+    ax.grid()
+    return fig
+
+
+# Figures rendered for every flight: file name -> plotting function
+figures = {
+    "Flight_path_on_geographic_map":    plot_map,
+    "altitude_time":                    plot_altitude,
+    "vertical_rate_time":               plot_vertical_rate,
+    "groundspeed_time":                 plot_groundspeed,
+}
+
+
+def figure_paths(flight_id, directory=None):
+    """
+    Returns the paths of all figures of a flight.
+    """
+    directory = os.path.join(directory or output_dir, str(flight_id))
+    return [os.path.join(directory, f"{name}.{extension}") for name in figures for extension in figure_formats]
+
+
+def flight_hash(group):
+    """
+    Returns the hash of the plotted data of a flight and of the figure settings.
+
+    Args:
+        group (pd.DataFrame): Rows of one flight.
+
+    Returns:
+        str: Hexadecimal SHA-1 digest.
+    """
+    digest = hashlib.sha1()
+    digest.update(pd.util.hash_pandas_object(group[plot_columns], index=False).to_numpy().tobytes())
+    digest.update(repr((sorted(figures), figure_formats, dpi, map_margin)).encode())
+    return digest.hexdigest()
+
+
+def render_flight(flight_id, group, directory):
+    """
+    Renders and saves all figures of one flight (executed in a worker process).
+
+    Args:
+        flight_id (str): Flight ID, used as folder name.
+        group (pd.DataFrame): Rows of the flight, sorted by timestamp.
+        directory (str): Output folder.
+
+    Returns:
+        str: The flight ID.
+    """
+    flight_dir = os.path.join(directory, str(flight_id))
+    os.makedirs(flight_dir, exist_ok=True)
+
+    group = group.copy()
+    group['timestamp'] = pd.to_datetime(group['timestamp'])
+
+    # Extract time from the timestamp and convert to seconds since midnight
+    group['seconds_since_midnight'] = group['timestamp'].dt.hour * 3600 + group['timestamp'].dt.minute * 60 + group['timestamp'].dt.second
+    group['time'] = pd.to_datetime(group['seconds_since_midnight'], unit='s', origin='1970-01-01')
+
+    for name, plot_function in figures.items():
+        path = os.path.join(flight_dir, name)
+        fig = plot_function(group)
+        for extension in figure_formats:
+            fig.savefig(f"{path}.{extension}", format=extension, dpi=dpi)
+        plt.close(fig)  # Release the figure, workers render many flights
+
+    return flight_id
+
+
+def load_manifest(path):
+    """
+    Reads the manifest of the previous run (empty if missing or unreadable).
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest, path):
+    """
+    Writes the manifest through a temporary file, so an interruption never leaves it truncated.
+    """
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(temporary_path, path)
+
+
+def render_flights(df, directory=None, workers=None):
+    """
+    Renders the figures of every flight of a DataFrame whose data or settings changed since the last run.
+
+    Args:
+        df (pd.DataFrame): Rows of the selected flights, with 'flight_id' and the `plot_columns`.
+        directory (str): Output folder; defaults to `output_dir`.
+        workers (int): Number of worker processes; defaults to `max_workers`.
+
+    Returns:
+        tuple: (list of rendered flight IDs, list of skipped flight IDs)
+    """
+    directory = directory or output_dir
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, manifest_name)
+    manifest = load_manifest(manifest_path)
+
+    # Keep only the flights whose hash changed or whose figures are missing
+    tasks = {}
+    skipped = []
+    for flight_id, group in df.groupby('flight_id', sort=True, observed=True):
+        group = group.sort_values(by='timestamp', kind="stable")
+        digest = flight_hash(group)
+        if manifest.get(str(flight_id)) == digest and all(os.path.exists(path) for path in figure_paths(flight_id, directory)):
+            skipped.append(flight_id)
+        else:
+            tasks[flight_id] = (group, digest)
+
+    rendered = []
+    if tasks:
+        with ProcessPoolExecutor(max_workers=workers or max_workers) as executor:
+            futures = {executor.submit(render_flight, flight_id, group, directory): flight_id
+                       for flight_id, (group, _) in tasks.items()}
+            for future in as_completed(futures):
+                flight_id = future.result()
+                manifest[str(flight_id)] = tasks[flight_id][1]
+                save_manifest(manifest, manifest_path)
+                rendered.append(flight_id)
+                print(f"Rendered {flight_id} ({len(rendered)}/{len(tasks)})")
+
+    return rendered, skipped
+
+
+if __name__ == "__main__":
+    # Read only the plotted columns of the selected flights
+    df = load_trajectories(input_file, columns=plot_columns + ["flight_id"], **{selection_column: selection})
+
+    rendered, skipped = render_flights(df)
+    print(f"{len(rendered)} flights rendered, {len(skipped)} unchanged flights skipped. Figures saved in {output_dir}.")
@@ -0,0 +1,199 @@
+# ===============================================================================================================
+# Author: Wesley Gonçalves da Silva - IST1105271
+# Purpose:
+#     This script benchmarks the stages of the pre-processing and cleaning pipeline on synthetic ADS-B data of
+#     increasing size (10^5 to 10^8 rows), measuring throughput and peak memory of each stage, and appends the
+#     results to a CSV file so that performance can be tracked across commits.
+#
+# Inputs:
+#     - Row counts to benchmark (`row_counts`), sampling period and anomaly fractions of the synthetic data.
+#     - Optional per-stage row limits (`stage_row_limits`) to skip stages that are too slow at large sizes.
+#
+# Outputs:
+#     - `benchmark_results.csv` with one line per (commit, rows, stage) containing the elapsed time, throughput
+#       (rows/s) and peak memory (MB) of the stage.
+#     - Console printout of the same measurements.
+#
+# Additional Comments:
+#     - The synthetic data comes from `synthetic_traffic_data.py`; the cleaning stages from `air_traffic_cleaning.py`.
+#     - The stages are chained as in `air_traffic_safety_checks.py`: the output of each stage is the input of the next.
+#     - Peak memory is measured with `tracemalloc` in a second run of each stage, so that the tracing overhead
+#       does not affect the measured throughput. Set `measure_memory = False` to skip it.
+#     - The resampling/flight ID stage of `air_traffic_pre_processing.py` is only run if the `traffic` library
+#       is installed.
+#     - 10^8 rows need several tens of GB of RAM; remove that size from `row_counts` on smaller machines.
+# ===============================================================================================================
+
+import os
+import subprocess
+import time
+import tracemalloc
+import warnings
+
+import pandas as pd
+
+from synthetic_traffic_data import generate_synthetic_traffic, rows_to_flights
+from air_traffic_cleaning import (
+    filter_short_flights,
+    drop_invalid_timestamps,
+    mask_invalid_positions,
+    mask_invalid_altitudes,
+    mask_invalid_groundspeed,
+    remove_peak_outliers,
+    replace_repeated_lat_lon_with_nan,
+    interpolate_selected_fields,
+    interpolate_large_distances,
+)
+
+try:
+    from traffic.core import Traffic
+except ImportError:
+    Traffic = None
+
+# Suppress FutureWarnings
+warnings.simplefilter(action='ignore', category=FutureWarning)
+
+# Benchmark settings
+row_counts = [10**5, 10**6, 10**7, 10**8]
+sample_rate = 5                                     # seconds between samples
+measure_memory = True
+results_file = "benchmark_results.csv"
+
+# Stages slower than O(n) in pure Python are only run up to the given number of rows
+stage_row_limits = {
+    "pre_processing_resample": 10**7,
+    "remove_peak_outliers": 10**7,
+    "interpolate_large_distances": 10**6,
+}
+
+
+def pre_processing_resample(df):
+    """
+    Resamples the data to 5 s and assigns flight IDs with the `traffic` library (air_traffic_pre_processing.py).
+    """
+    resampled = Traffic(df.drop(columns=["flight_id"])).resample(rule="5s").assign_id().eval()
+    return resampled.data
+
+
+def mask_invalid_ranges(df):
+    """
+    Applies the latitude, longitude, altitude and groundspeed range checks.
+    """
+    df, _, _ = mask_invalid_positions(df)
+    df, _ = mask_invalid_altitudes(df)
+    df, _ = mask_invalid_groundspeed(df)
+    return df
+
+
+def remove_outliers(df):
+    """
+    Applies the two peak detection passes of air_traffic_safety_checks.py.
+    """
+    df = remove_peak_outliers(df, prominence=5, widths=(1, 3))
+    return remove_peak_outliers(df, prominence=2, widths=(2, 3), distance_factor=0.5)
+
+
+def drop_duplicates(df):
+    """
+    Drops the exact duplicate rows.
+    """
+    return df[~df.duplicated()].reset_index(drop=True)
+
+
+def interpolate_positions(df):
+    """
+    Replaces frozen positions by NaN and interpolates the positions, groundspeed and altitude.
+    """
+    df = replace_repeated_lat_lon_with_nan(df)
+    return interpolate_selected_fields(df, ['longitude', 'latitude', 'groundspeed', 'altitude'])
+
+
+# Pipeline stages in execution order: (name, function)
+stages = [
+    ("pre_processing_resample",     pre_processing_resample),
+    ("filter_short_flights",        filter_short_flights),
+    ("drop_invalid_timestamps",     drop_invalid_timestamps),
+    ("mask_invalid_ranges",         mask_invalid_ranges),
+    ("remove_peak_outliers",        remove_outliers),
+    ("drop_duplicates",             drop_duplicates),
+    ("interpolate_positions",       interpolate_positions),
+    ("interpolate_large_distances", interpolate_large_distances),
+]
+
+
+def current_commit():
+    """
+    Returns the short hash of the checked-out commit, or "unknown" outside a git repository.
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_stage(function, df):
+    """
+    Runs a stage on a copy of the input and measures its elapsed time and, optionally, its peak memory.
+
+    Args:
+        function (callable): Stage taking and returning a DataFrame.
+        df (pd.DataFrame): Input of the stage.
+
+    Returns:
+        tuple: (output DataFrame, elapsed seconds, peak memory in MB or NaN)
+    """
+    start = time.perf_counter()
+    output = function(df.copy())
+    elapsed = time.perf_counter() - start
+
+    peak_mb = float("nan")
+    if measure_memory:
+        tracemalloc.start()
+        function(df.copy())
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1024**2
+        tracemalloc.stop()
+
+    return output, elapsed, peak_mb
+
+
+commit = current_commit()
+run_date = pd.Timestamp.now(tz="UTC").isoformat()
+
+for n_rows in row_counts:
+    print(f"Generating {n_rows} synthetic rows \n")
+    df = generate_synthetic_traffic(n_flights=rows_to_flights(n_rows, sample_rate), sample_rate=sample_rate, seed=0)
+
+    results = []
+    for name, function in stages:
+        if name == "pre_processing_resample" and Traffic is None:
+            print(f"Skipping {name}: the traffic library is not installed.")
+            continue
+        if len(df) > stage_row_limits.get(name, float("inf")):
+            print(f"Skipping {name}: {len(df)} rows exceed the limit of {stage_row_limits[name]}.")
+            continue
+
+        rows_in = len(df)
+        df, elapsed, peak_mb = run_stage(function, df)
+
+        results.append({
+            "commit":       commit,
+            "date":         run_date,
+            "rows":         n_rows,
+            "stage":        name,
+            "rows_in":      rows_in,
+            "rows_out":     len(df),
+            "seconds":      elapsed,
+            "rows_per_s":   rows_in / elapsed if elapsed > 0 else float("nan"),
+            "peak_mb":      peak_mb,
+        })
+        print(f"{name:<30} {rows_in:>12} rows {elapsed:>10.3f} s {results[-1]['rows_per_s']:>14.0f} rows/s {peak_mb:>10.1f} MB")
+
+    # Append the results of this size, writing the header only if the file is new
+    write_header = not (os.path.exists(results_file) and os.path.getsize(results_file) > 0)
+    pd.DataFrame(results).to_csv(results_file, mode="a", header=write_header, index=False)
+
+    # Clear memory before the next size
+    del df
+
+print(f"Benchmark results appended to {results_file}.")
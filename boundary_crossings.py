@@ -0,0 +1,171 @@
+# ===============================================================================================================
+# Author: Wesley Gonçalves da Silva - IST1105271
+# Purpose:
+#     This script extracts the exact times at which every flight enters and leaves every region (areas of
+#     `airspace_definition.py` and `historical_traffic_data.py`, see `airspace_regions.py`), with the interpolated
+#     crossing positions. Instead of labelling the samples only, each segment between two consecutive samples of a
+#     flight is intersected with the region boxes, so short incursions between two samples are not missed.
+#         1. The samples are labelled with the bitmask of their regions (`RegionIndex.assign_mask`).
+#         2. For each region, only the candidate segments are kept: those whose end points differ in that region's
+#            bit, and those with both end points outside whose bounding box overlaps the region.
+#         3. The candidate segments are clipped by the region box (vectorized Liang-Barsky), giving the fractions of
+#            the segment where it enters and leaves the box.
+#
+# Inputs:
+#     - CSV file with flight_id, time, longitude, latitude (and optionally altitude) of the checked flights.
+#     - Region set(s) and largest time between two samples of the same track (`max_gap`).
+#
+# Outputs:
+#     - "boundary_crossings.csv": one line per event with flight_id, region, event (entry / exit), time,
+#       longitude, latitude, altitude and `boundary` (False for the first / last sample of a track inside a region).
+#
+# Additional Comments:
+#     - Positions and times are interpolated linearly between the two samples of the segment (longitude / latitude
+#       in degrees; the regions do not cross the antimeridian).
+#     - Segments spanning more than `max_gap` seconds (lost coverage) are not intersected: the track ends with an
+#       exit at its last sample and restarts with an entry at the next one.
+#     - A segment touching only a corner or an edge of a box gives no event.
+# ===============================================================================================================
+
+import numpy as np
+import pandas as pd
+
+from airspace_regions import RegionIndex
+
+input_file = "C:\\Users\\wesle\\OneDrive\\Documentos\\Master\\traffic\\code1\\air_traffic_output_data_2024-01-01_checked.csv"
+output_file = "boundary_crossings.csv"
+
+# Region sets of airspace_regions.py: "americas" (airspace_definition.py) and "areas" (historical_traffic_data.py)
+region_set_names = ["americas", "areas"]
+max_gap = 300                                       # seconds
+
+
+def clip_segments(x0, y0, x1, y1, box):
+    """
+    Clips segments by a box (Liang-Barsky).
+
+    Args:
+        x0, y0, x1, y1 (np.ndarray): Start and end points of the segments.
+        box (tuple): (x_min, y_min, x_max, y_max).
+
+    Returns:
+        tuple: (t_in, t_out) fractions of each segment where it enters and leaves the box; t_in > t_out when the
+            segment does not cross the box.
+    """
+    x_min, y_min, x_max, y_max = box
+    dx, dy = x1 - x0, y1 - y0
+    t_in, t_out = np.zeros(len(x0)), np.ones(len(x0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for p, q in ((-dx, x0 - x_min), (dx, x_max - x0), (-dy, y0 - y_min), (dy, y_max - y0)):
+            ratio = q / p
+            t_in = np.where(p < 0, np.maximum(t_in, ratio), t_in)
+            t_out = np.where(p > 0, np.minimum(t_out, ratio), t_out)
+            # Parallel to this boundary and outside of it
+            t_in = np.where((p == 0) & (q < 0), np.inf, t_in)
+    return t_in, t_out
+
+
+def crossing_events(df, regions, max_gap=300, group_column="flight_id", time_column="time"):
+    """
+    Extracts the region entry and exit events of a set of trajectories.
+
+    Args:
+        df (pd.DataFrame): Samples with the group, time, longitude and latitude columns (altitude optional).
+        regions (dict, str or RegionIndex): Regions (see `RegionIndex`).
+        max_gap (float): Largest time in seconds between two samples of the same track.
+        group_column (str): Column identifying the flights.
+        time_column (str): Time column.
+
+    Returns:
+        pd.DataFrame: Events sorted by flight and time.
+    """
+    index = regions if isinstance(regions, RegionIndex) else RegionIndex(regions)
+
+    times = pd.to_datetime(df[time_column], utc=True).to_numpy(dtype="datetime64[ns]").view(np.int64)
+    flight_codes, flight_ids = pd.factorize(df[group_column])
+    order = np.lexsort((times, flight_codes))
+    times, flight_codes = times[order], flight_codes[order]
+    lon = df["longitude"].to_numpy(dtype=float)[order]
+    lat = df["latitude"].to_numpy(dtype=float)[order]
+    alt = df["altitude"].to_numpy(dtype=float)[order] if "altitude" in df.columns else np.full(len(df), np.nan)
+
+    # Tracks: the samples with a position, split at flight changes and coverage gaps
+    rows = np.flatnonzero(np.isfinite(lon) & np.isfinite(lat))
+    times, flight_codes, lon, lat, alt = times[rows], flight_codes[rows], lon[rows], lat[rows], alt[rows]
+    connected = ((flight_codes[1:] == flight_codes[:-1])
+                 & (np.diff(times) <= pd.Timedelta(seconds=max_gap).value))
+    masks = index.assign_mask(lon, lat)
+
+    starts = np.flatnonzero(connected)              # segment i goes from sample i to sample i + 1
+    track_first = np.flatnonzero(np.concatenate(([True], ~connected)))
+    track_last = np.flatnonzero(np.concatenate((~connected, [True])))
+
+    events = []                                     # (sample, fraction, region, event, boundary)
+    for bit, box in enumerate(index.boxes):
+        flag = np.uint64(1) << np.uint64(bit)
+        inside = (masks & flag) > 0
+        inside_a, inside_b = inside[starts], inside[starts + 1]
+
+        # Candidates: the region bit changes, or both ends are outside and the bounding boxes overlap
+        lon_a, lon_b, lat_a, lat_b = lon[starts], lon[starts + 1], lat[starts], lat[starts + 1]
+        overlap = ((np.minimum(lon_a, lon_b) < box[2]) & (np.maximum(lon_a, lon_b) >= box[0])
+                   & (np.minimum(lat_a, lat_b) < box[3]) & (np.maximum(lat_a, lat_b) >= box[1]))
+        candidates = np.flatnonzero((inside_a != inside_b) | (~inside_a & ~inside_b & overlap))
+
+        segments = starts[candidates]
+        t_in, t_out = clip_segments(lon[segments], lat[segments], lon[segments + 1], lat[segments + 1], box)
+        inside_a, inside_b = inside_a[candidates], inside_b[candidates]
+        crossing = np.where(inside_a | inside_b, t_in <= t_out, t_in < t_out)
+
+        entry = crossing & ~inside_a
+        exit_ = crossing & ~inside_b
+        events.append((segments[entry], t_in[entry], bit, 0, True))
+        events.append((segments[exit_], t_out[exit_], bit, 1, True))
+
+        # Tracks starting or ending inside the region
+        first, last = track_first[inside[track_first]], track_last[inside[track_last]]
+        events.append((first, np.zeros(len(first)), bit, 0, False))
+        events.append((last, np.zeros(len(last)), bit, 1, False))
+
+    sample = np.concatenate([event[0] for event in events]).astype(np.int64)
+    fraction = np.clip(np.concatenate([event[1] for event in events]), 0.0, 1.0)
+    region = np.concatenate([np.full(len(event[0]), event[2], dtype=np.int16) for event in events])
+    kind = np.concatenate([np.full(len(event[0]), event[3], dtype=np.int8) for event in events])
+    boundary = np.concatenate([np.full(len(event[0]), event[4]) for event in events]).astype(bool)
+
+    # Linear interpolation between the sample and the next one (fraction 0 for the track ends)
+    following = np.minimum(sample + 1, len(times) - 1)
+    time = times[sample] + np.round(fraction * (times[following] - times[sample])).astype(np.int64)
+    interpolate = lambda values: values[sample] + fraction * (values[following] - values[sample])
+    with np.errstate(invalid="ignore"):
+        altitude = np.where(fraction > 0, interpolate(alt), alt[sample])
+
+    # Same time: track start, exits before entries (adjacent regions), track end
+    rank = np.where(boundary, 1 - kind, 3 * kind - 1)
+    event_order = np.lexsort((region, rank, time, flight_codes[sample]))
+    return pd.DataFrame({
+        "flight_id":    flight_ids.to_numpy()[flight_codes[sample]],
+        "region":       pd.Categorical.from_codes(region, categories=index.names),
+        "event":        pd.Categorical.from_codes(kind, categories=["entry", "exit"]),
+        "time":         pd.to_datetime(time, utc=True),
+        "longitude":    interpolate(lon),
+        "latitude":     interpolate(lat),
+        "altitude":     altitude,
+        "boundary":     boundary,
+    }).iloc[event_order].reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    df = pd.read_csv(input_file)
+    print(f"Processing file: {input_file} ({len(df)} samples)")
+
+    tables = []
+    for name in region_set_names:
+        events = crossing_events(df, name, max_gap)
+        events.insert(1, "region_set", name)
+        tables.append(events)
+        print(f"{name}: {len(events)} events, {events['flight_id'].nunique()} flights")
+
+    events = pd.concat(tables, ignore_index=True)
+    events.to_csv(output_file, index=False)
+    print(f"Boundary crossings saved to {output_file}.")
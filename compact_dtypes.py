@@ -0,0 +1,182 @@
+# ===============================================================================================================
+# Author: Wesley Gonçalves da Silva - IST1105271
+# Purpose:
+#     This module defines the compact memory mode of the DataFrames used by the scripts (`compact_mode`):
+#         - identifiers (icao24, callsign, flight_id, region...) as categoricals: one integer code per row and each
+#           distinct string stored once, instead of one Python string object per row;
+#         - positions and flight parameters as float32 instead of float64;
+#         - time columns as datetime64[ns, UTC] (int64 nanoseconds since the epoch) instead of strings.
+#     The CSV files are read with these dtypes given explicitly (no type inference), in chunks, so that the text of
+#     the file is never held in memory as a whole. `memory_report` gives the memory of a DataFrame per column and
+#     records it in the telemetry of the stage (`pipeline_telemetry.py`).
+#
+# Inputs:
+#     - CSV files of state vectors or trajectories (`read_csv_compact`), or DataFrames (`compact_frame`).
+#
+# Outputs:
+#     - DataFrames with the compact dtypes, and the memory report of a stage.
+#
+# Additional Comments:
+#     - float32 keeps about 7 significant digits: 1e-5 deg (about 1 m) for the positions and below 1 mm for the
+#       altitudes in meters, finer than the ADS-B resolution. The cleaning and detection functions convert to
+#       float64 where they compute distances or rates; a value exactly at a threshold may still be classified
+#       differently than with float64 input.
+#     - The compact mode is off by default (`compact_mode = False`): the readers then return the default dtypes of
+#       pandas and the outputs of the scripts are unchanged. With it on, the checked files are written from the
+#       float32 values and the loaders return categoricals and datetimes; turn it on for runs limited by memory.
+#     - Group the categorical identifiers with `observed=True` (as in `air_traffic_cleaning.py`): the other
+#       categories of the file would otherwise produce empty groups.
+#     - Columns not listed below keep the dtype inferred by pandas.
+# ===============================================================================================================
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from pipeline_telemetry import count
+
+# Global switch of the readers (read_csv_compact, trajectory_loader.py, pipeline_runner.py...)
+compact_mode = False
+
+# Rows parsed per chunk by read_csv_compact
+chunk_rows = 1_000_000
+
+# Columns of the state vectors and trajectories by compact dtype
+identifier_columns = ("icao24", "callsign", "flight_id", "region", "origin", "destination", "registration",
+                      "typecode", "squawk")
+float_columns = ("latitude", "longitude", "altitude", "geoaltitude", "baroaltitude", "vertical_rate", "groundspeed",
+                 "heading", "track", "lat", "lon", "velocity", "vertrate", "altitude_m", "pressure_hPa", "u_wind",
+                 "v_wind", "heading_rad", "GS_x", "GS_y", "true_airspeed")
+time_columns = ("timestamp", "time", "last_position", "start", "end", "entry", "exit")
+
+
+def column_dtypes(columns):
+    """
+    Returns the explicit dtypes of the known columns (time columns are parsed separately).
+
+    Args:
+        columns (list): Column names.
+
+    Returns:
+        dict: Column -> dtype.
+    """
+    dtypes = {}
+    for column in columns:
+        if column in identifier_columns:
+            dtypes[column] = "category"
+        elif column in float_columns:
+            dtypes[column] = "float32"
+        elif column in time_columns:
+            dtypes[column] = str
+    return dtypes
+
+
+def parse_times(values):
+    """
+    Converts a column of times to datetime64[ns, UTC] (invalid values become NaT).
+    """
+    if isinstance(values.dtype, pd.DatetimeTZDtype):
+        return values.dt.tz_convert("UTC")
+    return pd.to_datetime(values, utc=True, errors="coerce", format="ISO8601")
+
+
+def compact_frame(df):
+    """
+    Converts the known columns of a DataFrame to the compact dtypes.
+
+    Args:
+        df (pd.DataFrame): Data (not modified).
+
+    Returns:
+        pd.DataFrame: Data with the compact dtypes.
+    """
+    conversions = {}
+    for column in df.columns:
+        if column in identifier_columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            # Identifiers parsed as numbers (e.g. an all-digit icao24 column) are converted to text first
+            values = df[column].astype(str) if pd.api.types.is_numeric_dtype(df[column]) else df[column]
+            conversions[column] = values.astype("category")
+        elif column in float_columns and pd.api.types.is_numeric_dtype(df[column]) and df[column].dtype != "float32":
+            conversions[column] = df[column].astype("float32")
+        elif column in time_columns and not pd.api.types.is_numeric_dtype(df[column]):
+            conversions[column] = parse_times(df[column])
+    return df.assign(**conversions) if conversions else df
+
+
+def concat_frames(frames):
+    """
+    Concatenates DataFrames keeping the categorical columns categorical (pd.concat turns categoricals with different
+    categories into object columns).
+
+    Args:
+        frames (list): DataFrames with the same columns.
+
+    Returns:
+        pd.DataFrame: Concatenated data, with a fresh index.
+    """
+    frames = list(frames)
+    if len(frames) > 1:
+        for column in frames[0].columns:
+            if isinstance(frames[0][column].dtype, pd.CategoricalDtype):
+                categories = union_categoricals([frame[column] for frame in frames], ignore_order=True).categories
+                frames = [frame.assign(**{column: frame[column].cat.set_categories(categories)}) for frame in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+def read_csv_compact(path, usecols=None, compact=None):
+    """
+    Reads a CSV file with the compact dtypes (or the default dtypes of pandas if the compact mode is off).
+
+    Args:
+        path (str): CSV file.
+        usecols (list): Columns to read (all by default).
+        compact (bool): Compact dtypes; defaults to `compact_mode`.
+
+    Returns:
+        pd.DataFrame: Data of the file.
+    """
+    if not (compact_mode if compact is None else compact):
+        return pd.read_csv(path, usecols=usecols, low_memory=False)
+
+    columns = pd.read_csv(path, nrows=0).columns
+    dtypes = column_dtypes(columns if usecols is None else [column for column in columns if column in usecols])
+    chunks = []
+    for chunk in pd.read_csv(path, usecols=usecols, dtype=dtypes, chunksize=chunk_rows, low_memory=False):
+        for column in chunk.columns:
+            if column in time_columns:
+                chunk[column] = parse_times(chunk[column])
+        chunks.append(chunk)
+    if not chunks:
+        return pd.read_csv(path, usecols=usecols, dtype=dtypes)
+    return concat_frames(chunks)
+
+
+def expand_identifiers(df):
+    """
+    Converts the categorical columns back to strings, for libraries grouping by them without `observed=True`
+    (e.g. `traffic`).
+    """
+    conversions = {column: df[column].astype(object) for column in df.columns
+                   if isinstance(df[column].dtype, pd.CategoricalDtype)}
+    return df.assign(**conversions) if conversions else df
+
+
+def memory_report(df, stage=None, verbose=True):
+    """
+    Returns the memory of a DataFrame per column and records the total in the telemetry of the stage.
+
+    Args:
+        df (pd.DataFrame): Data.
+        stage (str): Telemetry stage (the active stage by default).
+        verbose (bool): Print the report.
+
+    Returns:
+        pd.Series: Bytes per column (strings and categories included), with the total.
+    """
+    usage = df.memory_usage(deep=True, index=True)
+    usage["total"] = usage.sum()
+    count("frame_bytes", int(usage["total"]), stage=stage)
+    count("frame_rows", len(df), stage=stage)
+    if verbose:
+        print(f"Memory ({stage or 'frame'}): {usage['total'] / 2**20:.1f} MiB for {len(df)} rows "
+              f"({usage['total'] / max(len(df), 1):.0f} bytes per row)")
+    return usage
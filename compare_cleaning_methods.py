@@ -0,0 +1,97 @@
+# ===============================================================================================================
+# Author: Wesley Gonçalves da Silva - IST1105271
+# Purpose:
+#     This script compares the two outlier removal methods available in `air_traffic_safety_checks.py` on
+#     synthetic ADS-B data with known injected spikes:
+#         - "find_peaks": the two passes of `scipy.signal.find_peaks` criteria (`remove_peak_outliers`).
+#         - "hampel": the single-pass moving median / MAD filter (`remove_hampel_outliers`).
+#
+# Inputs:
+#     - Number of synthetic flights, sampling period, spike fraction and random seed.
+#
+# Outputs:
+#     - `cleaning_methods_comparison.csv` with, for each method and attribute:
+#         * seconds: elapsed time of the method (all attributes together)
+#         * spikes_removed: share of injected spikes brought back within `tolerances` of the true value
+#         * rmse_spikes: RMSE with respect to the ground truth on the spiked samples
+#         * rmse_clean: RMSE with respect to the ground truth on the samples without anomaly (signal distortion)
+#     - Console printout of the same table.
+#
+# Additional Comments:
+#     - Only spikes are injected (no freezes, gaps or duplicates) so that every sample can be matched with its
+#       ground truth value.
+#     - The tolerances are expressed in the units of `synthetic_traffic_data.py` (m, ft/min, kts).
+# ===============================================================================================================
+
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from synthetic_traffic_data import generate_synthetic_traffic
+from air_traffic_cleaning import remove_peak_outliers, remove_hampel_outliers
+
+# Suppress FutureWarnings
+warnings.simplefilter(action='ignore', category=FutureWarning)
+
+# Comparison settings
+n_flights = 500
+sample_rate = 5
+spike_fraction = 0.005
+seed = 0
+output_file = "cleaning_methods_comparison.csv"
+
+# Maximum error for a spike to be considered removed
+tolerances = {
+    "altitude": 100.0,
+    "vertical_rate": 500.0,
+    "groundspeed": 20.0,
+}
+
+
+def find_peaks_method(df):
+    """
+    Two find_peaks passes, as in air_traffic_safety_checks.py.
+    """
+    df = remove_peak_outliers(df, prominence=5, widths=(1, 3))
+    return remove_peak_outliers(df, prominence=2, widths=(2, 3), distance_factor=0.5)
+
+
+methods = {
+    "find_peaks": find_peaks_method,
+    "hampel": remove_hampel_outliers,
+}
+
+# Synthetic data with spikes only, so that rows align one to one with the ground truth
+raw_df, truth = generate_synthetic_traffic(n_flights=n_flights, sample_rate=sample_rate, spike_fraction=spike_fraction,
+                                           freeze_fraction=0, duplicate_fraction=0, gap_fraction=0, seed=seed,
+                                           return_truth=True)
+print(f"Synthetic data: {len(raw_df)} rows, {truth['spike'].sum()} spikes \n")
+
+results = []
+for method_name, method in methods.items():
+    start = time.perf_counter()
+    cleaned_df = method(raw_df.copy())
+    elapsed = time.perf_counter() - start
+
+    for column, tolerance in tolerances.items():
+        # Spikes injected in this attribute
+        spiked = truth["spike"].to_numpy() & (raw_df[column].to_numpy() != truth[column].to_numpy())
+        error = cleaned_df[column].to_numpy() - truth[column].to_numpy()
+
+        results.append({
+            "method":           method_name,
+            "attribute":        column,
+            "seconds":          elapsed,
+            "spikes":           int(spiked.sum()),
+            "spikes_removed":   np.mean(np.abs(error[spiked]) <= tolerance) if spiked.any() else np.nan,
+            "rmse_spikes":      np.sqrt(np.nanmean(error[spiked] ** 2)) if spiked.any() else np.nan,
+            "rmse_clean":       np.sqrt(np.nanmean(error[~truth["spike"].to_numpy()] ** 2)),
+        })
+
+report = pd.DataFrame(results)
+print(report.to_string(index=False))
+
+report.to_csv(output_file, index=False)
+print(f"\nComparison saved to {output_file}.")
@@ -0,0 +1,252 @@
+# ===============================================================================================================
+# Author: Wesley Gonçalves da Silva - IST1105271
+# Purpose:
+#     This script detects losses of separation between flights in the checked (resampled) data of
+#     `air_traffic_safety_checks.py`, i.e. pairs of aircraft closer than the separation minima at the same time
+#     (by default 5 NM horizontally and 1000 ft vertically), and groups them into conflict episodes.
+#     Instead of comparing every pair of flights at every time step (O(n^2)), the positions are hashed into
+#     time slices and 3D grid cells sized to the separation minima, and only positions in the same or in
+#     neighbouring cells of the same time slice are compared.
+#
+# Inputs:
+#     - Checked CSV file with flight_id, time, latitude, longitude and altitude (resampled to a constant period).
+#     - Separation minima, time step of the resampled data and altitude unit.
+#
+# Outputs:
+#     - "conflict_episodes.csv" with one line per episode: the two flight IDs, start and end times, duration,
+#       number of time steps in conflict and the closest point of approach (time, horizontal distance and
+#       vertical separation at the minimum horizontal distance, and minimum vertical separation).
+#
+# Additional Comments:
+#     - Cells: the horizontal position is converted to Earth-centred (ECEF) coordinates on a sphere, cut in cubes
+#       of the horizontal minimum, and the altitude in layers of the vertical minimum. Two positions closer than
+#       the minima are always in the same or in adjacent cells (3 x 3 x 3 x 3 neighbourhood); only half of the
+#       neighbourhood is searched so that every pair is found once.
+#     - Candidate pairs are confirmed with the great-circle distance and the altitude difference.
+#     - The time slices are split into contiguous ranges processed in parallel; the episodes are built after
+#       gathering the conflicting pairs of all ranges, so episodes spanning two ranges are not split.
+#     - An episode ends when the pair is not in conflict for more than `episode_gap` seconds.
+#     - The altitudes of the checked files are in feet, as returned by `traffic` (they are not converted by
+#       `air_traffic_safety_checks.py`); set `altitude_in_feet = False` for files in meters.
+#     - The `if __name__ == "__main__"` guard is required by the process pool on Windows.
+# ===============================================================================================================
+
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+input_file = "C:\\Users\\wesle\\OneDrive\\Documentos\\Master\\traffic\\code1\\data\\2025\\2025_01_01-2025_01_14\\2025-01-01_2025-01-14_flight_id_filtered_airframe_checked.csv"
+output_file = "conflict_episodes.csv"
+
+# Separation minima and data settings
+horizontal_minimum_nm = 5
+vertical_minimum_ft = 1000
+time_step = 5                                       # seconds between resampled positions
+altitude_in_feet = True                             # altitude column unit: feet (traffic), False for meters
+episode_gap = 30                                    # seconds without conflict that end an episode
+max_workers = None                                  # defaults to the number of CPUs
+
+EARTH_RADIUS = 6371e3                               # m
+NM_TO_M = 1852.0
+FT_TO_M = 0.3048
+
+# Bits of each field of the cell keys: time slice, x, y, z (ECEF cells) and altitude layer
+_slice_bits, _axis_bits, _layer_bits = 20, 12, 8
+_axis_offset, _layer_offset = 1 << (_axis_bits - 1), 2
+
+
+def _pack(time_slice, x, y, z, layer):
+    """
+    Packs the cell coordinates into a single int64 key (fields shifted to non-negative values).
+    """
+    key = time_slice.astype(np.int64)
+    for value, bits, offset in ((x, _axis_bits, _axis_offset), (y, _axis_bits, _axis_offset),
+                                (z, _axis_bits, _axis_offset), (layer, _layer_bits, _layer_offset)):
+        key = (key << bits) | (value.astype(np.int64) + offset)
+    return key
+
+
+def _half_neighbourhood():
+    """
+    Returns the key differences of the cells to search from each cell (itself and half of its 80 neighbours).
+    """
+    offsets = []
+    for dx, dy, dz, dl in itertools.product((-1, 0, 1), repeat=4):
+        if (dx, dy, dz, dl) > (0, 0, 0, 0) or (dx, dy, dz, dl) == (0, 0, 0, 0):
+            offsets.append(((dx * (1 << _axis_bits) + dy) * (1 << _axis_bits) + dz) * (1 << _layer_bits) + dl)
+    return np.array(offsets, dtype=np.int64)
+
+
+def find_conflict_pairs(time_slice, flight_codes, latitude, longitude, altitude, horizontal_minimum, vertical_minimum):
+    """
+    Finds the pairs of positions closer than the separation minima in the same time slice.
+
+    Args:
+        time_slice (np.ndarray): Time slice index of every position.
+        flight_codes (np.ndarray): Integer flight code of every position.
+        latitude (np.ndarray): Latitudes in degrees.
+        longitude (np.ndarray): Longitudes in degrees.
+        altitude (np.ndarray): Altitudes in meters.
+        horizontal_minimum (float): Horizontal separation minimum in meters.
+        vertical_minimum (float): Vertical separation minimum in meters.
+
+    Returns:
+        tuple: (first, second, horizontal distance, vertical separation) with the position indices of every
+            conflicting pair.
+    """
+    valid = np.flatnonzero(np.isfinite(latitude) & np.isfinite(longitude) & np.isfinite(altitude))
+    lat, lon = np.radians(latitude[valid]), np.radians(longitude[valid])
+
+    # ECEF cells of the horizontal minimum and altitude layers of the vertical minimum
+    x = np.floor(EARTH_RADIUS * np.cos(lat) * np.cos(lon) / horizontal_minimum)
+    y = np.floor(EARTH_RADIUS * np.cos(lat) * np.sin(lon) / horizontal_minimum)
+    z = np.floor(EARTH_RADIUS * np.sin(lat) / horizontal_minimum)
+    layer = np.clip(np.floor(altitude[valid] / vertical_minimum), -1, (1 << _layer_bits) - 4)
+    keys = _pack(time_slice[valid], x, y, z, layer)
+
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+
+    firsts, seconds = [], []
+    for offset in _half_neighbourhood():
+        # Positions of the neighbouring cell: [lower, upper) in the sorted keys
+        lower = np.searchsorted(sorted_keys, sorted_keys + offset, side="left")
+        upper = np.searchsorted(sorted_keys, sorted_keys + offset, side="right")
+        if offset == 0:
+            lower = np.arange(len(sorted_keys)) + 1    # Same cell: only the following positions
+        counts = np.maximum(upper - lower, 0)
+        if not counts.any():
+            continue
+
+        first = np.repeat(np.arange(len(sorted_keys)), counts)
+        second = np.repeat(lower - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        firsts.append(order[first])
+        seconds.append(order[second])
+
+    if not firsts:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, np.array([]), np.array([])
+    first, second = valid[np.concatenate(firsts)], valid[np.concatenate(seconds)]
+
+    # Exact check: other flight, vertical separation and great-circle distance
+    vertical = np.abs(altitude[first] - altitude[second])
+    keep = (flight_codes[first] != flight_codes[second]) & (vertical < vertical_minimum)
+    first, second, vertical = first[keep], second[keep], vertical[keep]
+
+    lat1, lat2 = np.radians(latitude[first]), np.radians(latitude[second])
+    dlon = np.radians(longitude[second] - longitude[first])
+    haversine = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    horizontal = 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(haversine, 1.0)))
+
+    keep = horizontal < horizontal_minimum
+    return first[keep], second[keep], horizontal[keep], vertical[keep]
+
+
+def _conflicts_in_range(arrays, horizontal_minimum, vertical_minimum):
+    """
+    Worker: conflicting pairs of a range of time slices (indices relative to the range).
+    """
+    time_slice, flight_codes, latitude, longitude, altitude = arrays
+    return find_conflict_pairs(time_slice - time_slice.min(), flight_codes, latitude, longitude, altitude,
+                               horizontal_minimum, vertical_minimum)
+
+
+def detect_conflicts(df, horizontal_minimum_nm=5, vertical_minimum_ft=1000, step=5, altitude_ft=True, gap=30,
+                     workers=None):
+    """
+    Detects the losses of separation of a set of resampled trajectories and groups them into episodes.
+
+    Args:
+        df (pd.DataFrame): Positions with flight_id, time, latitude, longitude and altitude.
+        horizontal_minimum_nm (float): Horizontal separation minimum in nautical miles.
+        vertical_minimum_ft (float): Vertical separation minimum in feet.
+        step (float): Period of the resampled positions in seconds (size of the time slices).
+        altitude_ft (bool): True if the altitude column is in feet (as in the checked files), False for meters.
+        gap (float): Seconds without conflict that end an episode.
+        workers (int): Number of processes; 1 runs in the calling process.
+
+    Returns:
+        pd.DataFrame: One line per conflict episode.
+    """
+    horizontal_minimum = horizontal_minimum_nm * NM_TO_M
+    vertical_minimum = vertical_minimum_ft * FT_TO_M
+
+    times = pd.to_datetime(df["time"], utc=True)
+    origin = times.min().floor(f"{step}s")
+    time_slice = ((times - origin).dt.total_seconds().to_numpy() // step).astype(np.int64)
+    flight_codes, flight_ids = pd.factorize(df["flight_id"])
+    latitude = df["latitude"].to_numpy(dtype=float)
+    longitude = df["longitude"].to_numpy(dtype=float)
+    altitude = df["altitude"].to_numpy(dtype=float) * (FT_TO_M if altitude_ft else 1.0)
+
+    # Contiguous ranges of time slices, one task per range
+    order = np.argsort(time_slice, kind="stable")
+    n_tasks = 1 if workers == 1 else (workers or os.cpu_count()) * 4
+    bounds = np.searchsorted(time_slice[order], np.linspace(time_slice.min(), time_slice.max() + 1, n_tasks + 1))
+    ranges = [order[start:stop] for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+    tasks = [(time_slice[rows], flight_codes[rows], latitude[rows], longitude[rows], altitude[rows]) for rows in ranges]
+
+    if workers == 1:
+        results = [_conflicts_in_range(task, horizontal_minimum, vertical_minimum) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_conflicts_in_range, tasks, itertools.repeat(horizontal_minimum),
+                                        itertools.repeat(vertical_minimum)))
+
+    # Conflicting pairs with global row indices, flights ordered within each pair
+    first = np.concatenate([rows[result[0]] for rows, result in zip(ranges, results)] or [np.array([], dtype=np.int64)])
+    second = np.concatenate([rows[result[1]] for rows, result in zip(ranges, results)] or [np.array([], dtype=np.int64)])
+    horizontal = np.concatenate([result[2] for result in results] or [np.array([])])
+    vertical = np.concatenate([result[3] for result in results] or [np.array([])])
+    swap = flight_codes[first] > flight_codes[second]
+    first, second = np.where(swap, second, first), np.where(swap, first, second)
+
+    pairs = pd.DataFrame({
+        "flight_a":     flight_codes[first],
+        "flight_b":     flight_codes[second],
+        "slice":        time_slice[first],
+        "horizontal":   horizontal,
+        "vertical":     vertical,
+    }).sort_values(by=["flight_a", "flight_b", "slice"], kind="stable")
+
+    # Duplicated positions of a flight in the same slice give the same pair twice: keep the closest
+    pairs = pairs.sort_values(by=["flight_a", "flight_b", "slice", "horizontal"]).drop_duplicates(
+        subset=["flight_a", "flight_b", "slice"]).reset_index(drop=True)
+
+    # Episodes: consecutive slices of the same pair separated by at most `gap` seconds
+    new_episode = np.ones(len(pairs), dtype=bool)
+    new_episode[1:] = ((pairs["flight_a"].to_numpy()[1:] != pairs["flight_a"].to_numpy()[:-1])
+                       | (pairs["flight_b"].to_numpy()[1:] != pairs["flight_b"].to_numpy()[:-1])
+                       | (np.diff(pairs["slice"].to_numpy()) * step > gap))
+    pairs["episode"] = np.cumsum(new_episode) - 1
+
+    grouped = pairs.groupby("episode", sort=True)
+    closest = pairs.loc[grouped["horizontal"].idxmin()].set_index("episode")
+    episodes = pd.DataFrame({
+        "flight_id_a":          flight_ids.to_numpy()[grouped["flight_a"].first().to_numpy()],
+        "flight_id_b":          flight_ids.to_numpy()[grouped["flight_b"].first().to_numpy()],
+        "start":                origin + pd.to_timedelta(grouped["slice"].min().to_numpy() * step, unit="s"),
+        "end":                  origin + pd.to_timedelta(grouped["slice"].max().to_numpy() * step, unit="s"),
+        "steps":                grouped.size().to_numpy(),
+        "cpa_time":             origin + pd.to_timedelta(closest["slice"].to_numpy() * step, unit="s"),
+        "cpa_horizontal_nm":    closest["horizontal"].to_numpy() / NM_TO_M,
+        "cpa_vertical_ft":      closest["vertical"].to_numpy() / FT_TO_M,
+        "min_vertical_ft":      grouped["vertical"].min().to_numpy() / FT_TO_M,
+    })
+    episodes["duration_s"] = (episodes["end"] - episodes["start"]).dt.total_seconds() + step
+    return episodes
+
+
+if __name__ == "__main__":
+    df = pd.read_csv(input_file, usecols=["flight_id", "time", "latitude", "longitude", "altitude"])
+    print(f"Processing file: {input_file} ({len(df)} positions)")
+
+    episodes = detect_conflicts(df, horizontal_minimum_nm, vertical_minimum_ft, time_step, altitude_in_feet,
+                                episode_gap, max_workers)
+    episodes.to_csv(output_file, index=False)
+
+    print(f"{len(episodes)} loss of separation episodes between {len(set(episodes['flight_id_a']) | set(episodes['flight_id_b']))} flights")
+    print(f"Conflict episodes saved to {output_file}.")
@@ -0,0 +1,342 @@
+# ===============================================================================================================
+# Author: Wesley Gonçalves da Silva - IST1105271
+# Purpose:
+#     This script processes a multi-day dataset (e.g. the two-week file 2025_01_01-2025_01_14 of
+#     `air_traffic_safety_checks.py`) as one shard per day instead of one monolithic file:
+#         1. Every shard reads its day plus an overlap on both sides (`overlap`), through the block index of
+#            `trajectory_loader.py`, so flights crossing midnight are complete.
+#         2. A shard owns the flights whose first sample falls in its day (or, with ownership "time", the output
+#            rows of its day), so every flight is processed and kept exactly once.
+#         3. The shards are tasks of a file-based work queue in a shared directory. Any number of worker processes,
+#            on this machine or on other machines mounting the same directory, take tasks by creating a lease file;
+#            a lease not renewed within `lease_timeout` seconds (crashed worker) is taken over by another worker.
+#         4. The shard outputs are merged in a deterministic order (by flight and time), independent of the order
+#            in which the shards finished.
+#
+# Inputs:
+#     - Input CSV file with 'flight_id' and 'timestamp', first and last days, overlap.
+#     - Shard function ("module:function" taking the DataFrame of a shard and its parameters), by default the
+#       cleaning steps of `air_traffic_safety_checks.py` (`pipeline_runner.shard_safety_checks`).
+#     - `mode`: "local" (queue and local workers), "submit" (queue only), "worker" (process the queue of a shared
+#       directory) or "merge" (merge the finished shards). The mode can also be given on the command line.
+#
+# Outputs:
+#     - Queue directory: "tasks/<task>.json", "leases/<task>.lease", "done/<task>.parquet", where <task> is the
+#       day and a hash of everything its output depends on (see `task_name`).
+#     - Merged output file (`output_file`).
+#
+# Additional Comments:
+#     - The overlap must be longer than the longest flight for the "flight" ownership (a flight longer than the
+#       overlap that crosses midnight is cut at the start of the read window of the next shard).
+#     - Submitting replaces the tasks of the queue: the tasks and outputs of a previous submission are removed,
+#       except the outputs of the tasks that did not change (same input file version, function, parameters,
+#       ownership and windows), which are reused.
+#     - No external service is used: the queue relies on atomic file creation and renaming, which shared file
+#       systems (SMB, NFS) provide.
+#     - The `if __name__ == "__main__"` guard is required by the process pool on Windows.
+# ===============================================================================================================
+
+import hashlib
+import importlib
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from trajectory_loader import TrajectoryLoader, load_trajectories
+
+input_file = "C:\\Users\\wesle\\OneDrive\\Documentos\\Master\\traffic\\code1\\data\\2025\\2025_01_01-2025_01_14\\2025-01-01_2025-01-14_flight_id_filtered_airframe.csv"
+output_file = "C:\\Users\\wesle\\OneDrive\\Documentos\\Master\\traffic\\code1\\data\\2025\\2025_01_01-2025_01_14\\2025-01-01_2025-01-14_flight_id_filtered_airframe_checked.csv"
+queue_dir = "C:\\Users\\wesle\\OneDrive\\Documentos\\Master\\traffic\\code1\\data\\2025\\2025_01_01-2025_01_14\\shards"
+
+# Shards
+first_day = "2025-01-01"
+last_day = "2025-01-14"
+overlap = "12h"                                     # read margin on each side of a day
+ownership = "flight"                                # "flight" (first sample in the day) or "time" (output rows)
+shard_function = "pipeline_runner:shard_safety_checks"
+shard_params = {"cleaning_mode": "find_peaks"}
+
+# Execution
+mode = sys.argv[1] if len(sys.argv) > 1 else "local"
+max_workers = None                                  # local worker processes (defaults to the number of CPUs)
+lease_timeout = 600                                 # seconds without renewal after which a lease is taken over
+poll_interval = 5                                   # seconds between two scans of the queue by an idle worker
+
+
+def make_shards(first, last, overlap="12h"):
+    """
+    Returns the shards of a period: one per day, with the read window extended by the overlap.
+
+    Args:
+        first (str): First day (YYYY-MM-DD).
+        last (str): Last day (included).
+        overlap (str): Margin read before and after each day (pandas timedelta).
+
+    Returns:
+        list: Dicts with the shard name and its core and read windows (ISO timestamps, UTC).
+    """
+    margin = pd.Timedelta(overlap)
+    shards = []
+    for day in pd.date_range(pd.Timestamp(first, tz="UTC"), pd.Timestamp(last, tz="UTC"), freq="D"):
+        shards.append({
+            "shard":        day.strftime("%Y-%m-%d"),
+            "core_start":   day.isoformat(),
+            "core_stop":    (day + pd.Timedelta(days=1)).isoformat(),
+            "read_start":   (day - margin).isoformat(),
+            "read_stop":    (day + pd.Timedelta(days=1) + margin).isoformat(),
+        })
+    return shards
+
+
+def task_name(task, signature):
+    """
+    Returns the name of a task: its day and a hash of its input file version, function, parameters, ownership and
+    windows, so that an output is never reused for a different task.
+
+    Args:
+        task (dict): Task (see `submit`).
+        signature (tuple): (size, modification time in ns) of the input file.
+    """
+    key = [task["input"], list(signature), task["function"], task["params"], task["ownership"],
+           task["output_time_column"], task["core_start"], task["core_stop"], task["read_start"], task["read_stop"]]
+    digest = hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:12]
+    return f"{task['shard']}-{digest}"
+
+
+def _paths(directory, name):
+    """
+    Returns the task, lease and output files of a task.
+    """
+    return (os.path.join(directory, "tasks", f"{name}.json"),
+            os.path.join(directory, "leases", f"{name}.lease"),
+            os.path.join(directory, "done", f"{name}.parquet"))
+
+
+def submit(directory, path, shards, function, params=None, ownership="flight", output_time_column="time"):
+    """
+    Writes the tasks of the shards to a queue directory, replacing the tasks of a previous submission.
+
+    Args:
+        directory (str): Queue directory (shared by the workers).
+        path (str): Input CSV file (readable by all workers under the same path).
+        shards (list): Shards from `make_shards`.
+        function (str): Shard function as "module:function".
+        params (dict): Parameters of the shard function.
+        ownership (str): "flight" or "time".
+        output_time_column (str): Time column of the output (ownership "time").
+    """
+    for name in ("tasks", "leases", "done"):
+        os.makedirs(os.path.join(directory, name), exist_ok=True)
+
+    # Build the block index once, so that the workers only read it
+    if not path.endswith(".parquet"):
+        TrajectoryLoader(path).load_index()
+
+    status = os.stat(path)
+    names = set()
+    for shard in shards:
+        task = dict(shard, input=path, function=function, params=params or {}, ownership=ownership,
+                    output_time_column=output_time_column)
+        name = task_name(task, (status.st_size, status.st_mtime_ns))
+        names.add(name)
+        task_path = _paths(directory, name)[0]
+        with open(f"{task_path}.tmp", "w", encoding="utf-8") as file:
+            json.dump(task, file, indent=1)
+        os.replace(f"{task_path}.tmp", task_path)
+
+    # Tasks and outputs of previous submissions (other days, input version, function or parameters)
+    for folder, extension in (("tasks", ".json"), ("done", ".parquet")):
+        for file in os.listdir(os.path.join(directory, folder)):
+            if file.endswith(extension) and file[:-len(extension)] not in names:
+                try:
+                    os.remove(os.path.join(directory, folder, file))
+                except OSError:
+                    pass
+
+
+def _acquire(lease_path, timeout):
+    """
+    Creates the lease file of a shard; takes over a lease not renewed within the timeout. Returns True if acquired.
+    """
+    try:
+        if time.time() - os.path.getmtime(lease_path) > timeout:
+            # Only one worker can rename the expired lease
+            stale = f"{lease_path}.{socket.gethostname()}.{os.getpid()}.stale"
+            os.rename(lease_path, stale)
+            os.remove(stale)
+    except OSError:
+        pass
+    try:
+        descriptor = os.open(lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(descriptor, "w") as file:
+        file.write(json.dumps({"host": socket.gethostname(), "pid": os.getpid(), "time": time.time()}))
+    return True
+
+
+def _renew(lease_path, stop, interval):
+    """
+    Heartbeat: updates the modification time of the lease until stopped.
+    """
+    while not stop.wait(interval):
+        try:
+            os.utime(lease_path)
+        except OSError:
+            return
+
+
+def run_shard(task):
+    """
+    Reads the data of a shard, applies the shard function and keeps the owned rows.
+
+    Args:
+        task (dict): Task written by `submit`.
+
+    Returns:
+        pd.DataFrame: Output rows owned by the shard (the input rows, unprocessed, if it owns none; see `merge`).
+    """
+    core_start, core_stop = pd.Timestamp(task["core_start"]), pd.Timestamp(task["core_stop"])
+    df = load_trajectories(task["input"], start=task["read_start"], stop=task["read_stop"])
+    df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True, errors="coerce")
+
+    if task["ownership"] == "flight":
+        # Flights whose first sample in the read window is in the day
+        first = df.groupby("flight_id", observed=True)["timestamp"].transform("min")
+        df = df[(first >= core_start) & (first < core_stop)].reset_index(drop=True)
+
+    if df.empty:
+        return df                                   # no flight starts in this day
+
+    module, name = task["function"].split(":")
+    result = getattr(importlib.import_module(module), name)(df, **task["params"])
+
+    if task["ownership"] == "time":
+        times = pd.to_datetime(result[task["output_time_column"]], utc=True)
+        result = result[(times >= core_start) & (times < core_stop)]
+    return result.reset_index(drop=True)
+
+
+def run_worker(directory, timeout=None, interval=None, wait=False):
+    """
+    Processes the tasks of a queue until none is left.
+
+    Args:
+        directory (str): Queue directory.
+        timeout (float): Lease timeout in seconds; defaults to `lease_timeout`.
+        interval (float): Seconds between scans while other workers hold the remaining tasks; defaults to
+            `poll_interval`.
+        wait (bool): Keep waiting for the tasks leased by other workers (to take them over if they expire).
+
+    Returns:
+        int: Number of shards processed by this worker.
+    """
+    timeout = timeout or lease_timeout
+    interval = interval or poll_interval
+    processed = 0
+    while True:
+        remaining = 0
+        for file in sorted(os.listdir(os.path.join(directory, "tasks"))):
+            if not file.endswith(".json"):
+                continue
+            task_path, lease_path, output = _paths(directory, file[:-len(".json")])
+            if os.path.exists(output):
+                continue
+            remaining += 1
+            if not _acquire(lease_path, timeout):
+                continue
+
+            stop = threading.Event()
+            heartbeat = threading.Thread(target=_renew, args=(lease_path, stop, timeout / 3), daemon=True)
+            heartbeat.start()
+            try:
+                if os.path.exists(output):                 # finished by another worker meanwhile
+                    continue
+                try:
+                    with open(task_path, encoding="utf-8") as handle:
+                        task = json.load(handle)
+                except FileNotFoundError:                   # replaced by a new submission
+                    remaining -= 1
+                    continue
+                result = run_shard(task)
+                temporary = f"{output}.{socket.gethostname()}.{os.getpid()}.tmp"
+                result.to_parquet(temporary, index=False)
+                os.replace(temporary, output)
+                processed += 1
+                remaining -= 1
+                print(f"Shard {task['shard']} done ({len(result)} rows)")
+            finally:
+                stop.set()
+                heartbeat.join()
+                try:
+                    os.remove(lease_path)
+                except OSError:
+                    pass
+
+        if remaining == 0 or not wait:
+            return processed
+        time.sleep(interval)
+
+
+def merge(directory, sort_columns=("flight_id", "time")):
+    """
+    Merges the outputs of all shards in a deterministic order (the shards without any owned flight are skipped).
+
+    Args:
+        directory (str): Queue directory.
+        sort_columns (tuple): Columns defining the order of the merged rows.
+
+    Returns:
+        pd.DataFrame: Merged output.
+    """
+    tasks = sorted(file[:-len(".json")] for file in os.listdir(os.path.join(directory, "tasks")) if file.endswith(".json"))
+    missing = [shard for shard in tasks if not os.path.exists(_paths(directory, shard)[2])]
+    if missing:
+        raise RuntimeError(f"Shards not finished: {', '.join(missing)}")
+
+    parts = [pd.read_parquet(_paths(directory, shard)[2]) for shard in tasks]
+    parts = [part for part in parts if not part.empty]
+    if not parts:
+        return pd.DataFrame()
+    df = pd.concat(parts, ignore_index=True)
+    sort_columns = [column for column in sort_columns if column in df.columns]
+    return df.sort_values(by=sort_columns, kind="stable").reset_index(drop=True) if sort_columns else df
+
+
+def run_local(directory, path, shards, function, params=None, ownership="flight", workers=None):
+    """
+    Submits the shards and processes them with local worker processes.
+
+    Returns:
+        pd.DataFrame: Merged output.
+    """
+    submit(directory, path, shards, function, params, ownership)
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(run_worker, [directory] * workers))
+    return merge(directory)
+
+
+if __name__ == "__main__":
+    shards = make_shards(first_day, last_day, overlap)
+    if mode == "local":
+        df = run_local(queue_dir, input_file, shards, shard_function, shard_params, ownership, max_workers)
+    elif mode == "submit":
+        submit(queue_dir, input_file, shards, shard_function, shard_params, ownership)
+        print(f"{len(shards)} shards submitted to {queue_dir}")
+        df = None
+    elif mode == "worker":
+        print(f"{run_worker(queue_dir, wait=True)} shards processed")
+        df = None
+    else:
+        df = merge(queue_dir)
+
+    if df is not None:
+        df.to_csv(output_file, index=False)
+        print(f"Merged output ({len(df)} rows) saved to {output_file}.")
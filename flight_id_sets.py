@@ -0,0 +1,187 @@
+# ===============================================================================================================
+# Author: Wesley Gonçalves da Silva - IST1105271
+# Purpose:
+#     This module compares the flights (flight_id) contained in many sample datasets, e.g. the samples of
+#     `air_traffic_pos_processing.py` over several days. The flight IDs are dictionary-encoded once into integer
+#     codes and every dataset is stored as a packed bitmap (one bit per known flight), so that intersections,
+#     per-dataset missing flights and pairwise overlaps are computed with vectorized bitwise operations instead of
+#     repeated Python set unions.
+#
+# Inputs:
+#     - CSV files (only the 'flight_id' column is read) or iterables of flight IDs, one per dataset.
+#
+# Outputs:
+#     - Flight IDs common to all datasets.
+#     - For each dataset, the flight IDs present in any other dataset but missing from it.
+#     - Pairwise overlap matrix (number of shared flights) as a pandas DataFrame.
+#
+# Additional Comments:
+#     - Bitmaps are NumPy `uint8` arrays packed with `np.packbits` (8 flights per byte).
+#     - The "missing" query uses prefix/suffix unions, so k datasets cost O(k) bitmap operations instead of the
+#       O(k^2) unions of the original set-based code.
+#     - The encoder and the bitmaps can be saved to / loaded from a `.npz` file to avoid re-reading the CSV files.
+# ===============================================================================================================
+
+import numpy as np
+import pandas as pd
+
+# Number of set bits of every byte value
+POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def read_flight_ids(path, column="flight_id", chunksize=10**6):
+    """
+    Reads the unique flight IDs of a CSV file, loading only the flight ID column.
+
+    Args:
+        path (str): CSV file.
+        column (str): Name of the flight ID column.
+        chunksize (int): Number of rows read at once.
+
+    Returns:
+        np.ndarray: Unique flight IDs (strings).
+    """
+    unique_ids = [chunk[column].dropna().unique() for chunk in pd.read_csv(path, usecols=[column], dtype=str, chunksize=chunksize)]
+    if not unique_ids:
+        return np.array([], dtype=object)
+    return pd.unique(np.concatenate(unique_ids))
+
+
+class FlightIdSets:
+    """
+    Dictionary-encoded bitmaps of the flight IDs of several datasets.
+    """
+
+    def __init__(self):
+        self.dictionary = pd.Index([], dtype=object)     # code -> flight ID
+        self.names = []                                   # dataset names
+        self.bitmaps = []                                 # packed bitmaps, one per dataset
+
+    @classmethod
+    def from_csv(cls, paths, column="flight_id"):
+        """
+        Builds the bitmaps of several CSV files.
+
+        Args:
+            paths (dict): Dataset name -> CSV path.
+            column (str): Name of the flight ID column.
+
+        Returns:
+            FlightIdSets: The encoded datasets.
+        """
+        sets = cls()
+        for name, path in paths.items():
+            sets.add(name, read_flight_ids(path, column))
+        return sets
+
+    def add(self, name, flight_ids):
+        """
+        Encodes the flight IDs of a dataset and stores its bitmap. New IDs are appended to the dictionary, so the
+        codes of the datasets already stored remain valid.
+
+        Args:
+            name (str): Dataset name.
+            flight_ids (iterable): Flight IDs of the dataset.
+        """
+        if isinstance(flight_ids, (set, frozenset)):
+            flight_ids = list(flight_ids)
+        flight_ids = pd.unique(np.asarray(flight_ids, dtype=object))
+        codes = self.dictionary.get_indexer(flight_ids)
+
+        # Extend the dictionary with the unknown IDs
+        unknown = codes < 0
+        if unknown.any():
+            codes[unknown] = len(self.dictionary) + np.arange(unknown.sum())
+            self.dictionary = self.dictionary.append(pd.Index(flight_ids[unknown], dtype=object))
+
+        bits = np.zeros(len(self.dictionary), dtype=bool)
+        bits[codes] = True
+        self.names.append(name)
+        self.bitmaps.append(np.packbits(bits))
+
+    def matrix(self):
+        """
+        Returns the bitmaps of all datasets as a (datasets, bytes) array padded to the current dictionary size.
+        """
+        n_bytes = (len(self.dictionary) + 7) // 8
+        matrix = np.zeros((len(self.bitmaps), n_bytes), dtype=np.uint8)
+        for row, bitmap in enumerate(self.bitmaps):
+            matrix[row, :len(bitmap)] = bitmap
+        return matrix
+
+    def decode(self, bitmap):
+        """
+        Returns the flight IDs set in a packed bitmap.
+        """
+        codes = np.flatnonzero(np.unpackbits(bitmap, count=len(self.dictionary)))
+        return self.dictionary[codes].to_numpy()
+
+    def counts(self):
+        """
+        Returns the number of flights of every dataset as a pandas Series.
+        """
+        return pd.Series(POPCOUNT[self.matrix()].sum(axis=1, dtype=np.int64), index=self.names)
+
+    def intersection(self):
+        """
+        Returns the flight IDs present in every dataset.
+        """
+        return self.decode(np.bitwise_and.reduce(self.matrix(), axis=0))
+
+    def union(self):
+        """
+        Returns the flight IDs present in at least one dataset.
+        """
+        return self.decode(np.bitwise_or.reduce(self.matrix(), axis=0))
+
+    def missing(self):
+        """
+        Returns, for each dataset, the flight IDs present in any other dataset but not in it.
+
+        Returns:
+            dict: Dataset name -> array of flight IDs.
+        """
+        matrix = self.matrix()
+
+        # Union of the datasets before and after each one
+        prefix = np.zeros_like(matrix)
+        suffix = np.zeros_like(matrix)
+        if len(matrix) > 1:
+            prefix[1:] = np.bitwise_or.accumulate(matrix[:-1], axis=0)
+            suffix[:-1] = np.bitwise_or.accumulate(matrix[::-1], axis=0)[::-1][1:]
+        others = prefix | suffix
+
+        return {name: self.decode(others[row] & ~matrix[row]) for row, name in enumerate(self.names)}
+
+    def overlap_matrix(self):
+        """
+        Returns the number of flights shared by every pair of datasets.
+
+        Returns:
+            pd.DataFrame: Symmetric matrix indexed by the dataset names (the diagonal holds the dataset sizes).
+        """
+        matrix = self.matrix()
+        overlap = np.zeros((len(matrix), len(matrix)), dtype=np.int64)
+        for row in range(len(matrix)):
+            overlap[row, row:] = POPCOUNT[matrix[row] & matrix[row:]].sum(axis=1, dtype=np.int64)
+            overlap[row:, row] = overlap[row, row:]
+        return pd.DataFrame(overlap, index=self.names, columns=self.names)
+
+    def save(self, path):
+        """
+        Saves the dictionary and the bitmaps to a `.npz` file.
+        """
+        np.savez_compressed(path, dictionary=self.dictionary.to_numpy(dtype=str), names=np.array(self.names, dtype=str),
+                            matrix=self.matrix())
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads the dictionary and the bitmaps saved by `save`.
+        """
+        data = np.load(path)
+        sets = cls()
+        sets.dictionary = pd.Index(data["dictionary"].astype(object), dtype=object)
+        sets.names = data["names"].tolist()
+        sets.bitmaps = list(data["matrix"])
+        return sets
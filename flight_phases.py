@@ -0,0 +1,242 @@
+# ===============================================================================================================
+# Author: Wesley Gonçalves da Silva - IST1105271
+# Purpose:
+#     This script labels the flight phase of every position (climb, cruise, level-off, descent) of all the flights
+#     of a file at once, and summarizes them as a table of phase segments per flight, for fleet-wide statistics:
+#         1. The vertical rate is smoothed with a centred moving average over `smoothing_window` seconds, computed
+#            for all flights together from cumulative sums (the window never crosses two flights). Missing vertical
+#            rates are replaced by the altitude change over the same window.
+#         2. Every position is labelled from the smoothed rate (climb above `climb_rate`, descent below
+#            `descent_rate`, level otherwise) and, for level flight, from its altitude band: cruise within
+#            `cruise_band_ft` of the highest altitude of the flight, level-off below.
+#         3. Hysteresis: a change of phase lasting less than `min_phase_duration` seconds is ignored (its positions
+#            keep the previous phase of the flight), so that short oscillations of the rate do not split the
+#            segments.
+#
+# Inputs:
+#     - Checked CSV file with flight_id, time, altitude and vertical_rate (`air_traffic_safety_checks.py`).
+#     - Thresholds below and altitude unit.
+#
+# Outputs:
+#     - "flight_phases.csv" with one line per phase segment: flight ID, segment number, phase, start and end times,
+#       duration, number of positions, altitudes at the start and end, and mean smoothed vertical rate.
+#     - Optionally (`labels_file`), the input rows with their 'phase' column.
+#     - Console printout of the time spent in each phase over all flights.
+#
+# Additional Comments:
+#     - Vertical rate in ft/min and altitude in feet, as returned by `traffic` (the checked files are not
+#       converted); set `altitude_in_feet = False` for files in meters, as in `conflict_detection.py`.
+#     - All the steps are array operations on the rows sorted by flight and time; there is no loop over flights.
+#     - Flights with no phase lasting `min_phase_duration` keep their unfiltered labels.
+#     - The first and last positions of a flight at the edges of the data may belong to a longer phase than the
+#       segment shows (only the recorded part of the flight is labelled).
+# ===============================================================================================================
+
+import numpy as np
+import pandas as pd
+
+input_file = "C:\\Users\\wesle\\OneDrive\\Documentos\\Master\\traffic\\code1\\data\\2025\\2025_01_01-2025_01_14\\2025-01-01_2025-01-14_flight_id_filtered_airframe_checked.csv"
+output_file = "flight_phases.csv"
+labels_file = None                                  # CSV with the input rows and their phase (None to skip)
+
+# Segmentation settings
+smoothing_window = 60                               # s, centred moving average of the vertical rate
+climb_rate = 500                                    # ft/min
+descent_rate = -500                                 # ft/min
+cruise_band_ft = 2000                               # level flight within this band below the flight maximum
+min_phase_duration = 120                            # s, shorter changes of phase are ignored
+altitude_in_feet = True                             # altitude column unit: feet (traffic), False for meters
+
+phases = ["climb", "level", "cruise", "descent"]
+FT_TO_M = 0.3048
+
+
+def _sorted_keys(df, group_column, time_column):
+    """
+    Returns the order of the rows by flight and time, the flight codes and the times (ms) in that order.
+    """
+    codes = pd.factorize(df[group_column], sort=True)[0].astype(np.int64)
+    times = pd.to_datetime(df[time_column], utc=True, format="ISO8601").to_numpy(dtype="datetime64[ms]").astype(np.int64)
+    order = np.lexsort((times, codes))
+    return order, codes[order], times[order]
+
+
+def _window_bounds(codes, times, window_ms):
+    """
+    Returns the first and last (exclusive) rows of the centred time window of every row, within its flight.
+    """
+    # Flight code in the high bits, time since the first position in the low bits: one sorted key for all flights
+    key = (codes << 40) + (times - (times.min() if len(times) else 0))
+    lower = np.searchsorted(key, key - window_ms // 2, side="left")
+    upper = np.searchsorted(key, key + window_ms // 2, side="right")
+    return lower, upper
+
+
+def smooth_vertical_rate(codes, times, altitude_ft, vertical_rate, window=None):
+    """
+    Centred moving average of the vertical rate of rows sorted by flight and time.
+
+    Args:
+        codes (np.ndarray): Flight codes (sorted).
+        times (np.ndarray): Times in ms (sorted within each flight).
+        altitude_ft (np.ndarray): Altitudes in feet.
+        vertical_rate (np.ndarray): Vertical rates in ft/min (NaN if missing).
+        window (float): Window length in seconds; defaults to `smoothing_window`.
+
+    Returns:
+        np.ndarray: Smoothed vertical rate in ft/min (altitude change over the window where the rate is missing).
+    """
+    window = smoothing_window if window is None else window
+    lower, upper = _window_bounds(codes, times, int(window * 1000))
+
+    valid = ~np.isnan(vertical_rate)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(valid, vertical_rate, 0.0))))
+    counts = np.concatenate(([0], np.cumsum(valid)))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rate = (sums[upper] - sums[lower]) / (counts[upper] - counts[lower])
+
+        # Altitude change between the first and last positions of the window
+        last = upper - 1
+        derived = (altitude_ft[last] - altitude_ft[lower]) / ((times[last] - times[lower]) / 60000.0)
+    return np.where(np.isnan(rate), derived, rate)
+
+
+def _runs(codes, labels):
+    """
+    Returns the first row of every run of equal labels within a flight.
+    """
+    change = np.ones(len(labels), dtype=bool)
+    change[1:] = (labels[1:] != labels[:-1]) | (codes[1:] != codes[:-1])
+    return np.flatnonzero(change)
+
+
+def _run_durations(codes, times, starts):
+    """
+    Returns the duration of every run in seconds (up to the start of the next run of the same flight, or to the last
+    position of the flight).
+    """
+    ends = np.append(starts[1:], len(times))
+    same_flight = np.append(codes[starts[1:]] == codes[starts[:-1]], False)
+    stop_times = np.where(same_flight, times[np.minimum(ends, len(times) - 1)], times[ends - 1])
+    return (stop_times - times[starts]) / 1000.0
+
+
+def label_phases(df, group_column="flight_id", time_column="time", altitude_ft=None, min_duration=None):
+    """
+    Labels the flight phase of every row.
+
+    Args:
+        df (pd.DataFrame): Positions with the group, time, 'altitude' and (optionally) 'vertical_rate' columns.
+        group_column (str): Flight identifier column.
+        time_column (str): Time column.
+        altitude_ft (bool): Altitude in feet; defaults to `altitude_in_feet`.
+        min_duration (float): Shortest change of phase in seconds; defaults to `min_phase_duration`.
+
+    Returns:
+        tuple: (pd.Series of phases aligned with df, dict of arrays in flight and time order: 'order', 'codes',
+        'times', 'rate', 'labels', 'altitude' (ft))
+    """
+    altitude_ft = altitude_in_feet if altitude_ft is None else altitude_ft
+    min_duration = min_phase_duration if min_duration is None else min_duration
+
+    order, codes, times = _sorted_keys(df, group_column, time_column)
+    altitude = df["altitude"].to_numpy(dtype=np.float64)[order]
+    altitude = altitude if altitude_ft else altitude / FT_TO_M
+    if "vertical_rate" in df.columns:
+        vertical_rate = df["vertical_rate"].to_numpy(dtype=np.float64)[order]
+    else:
+        vertical_rate = np.full(len(df), np.nan)
+    rate = smooth_vertical_rate(codes, times, altitude, vertical_rate)
+
+    # Highest altitude of every flight, broadcast to its rows
+    flight_starts = _runs(codes, np.zeros(len(codes), dtype=np.int8))
+    flight_sizes = np.diff(np.append(flight_starts, len(codes)))
+    ceiling = np.repeat(np.fmax.reduceat(altitude, flight_starts), flight_sizes) if len(codes) else altitude
+
+    # Phase codes (index in `phases`)
+    labels = np.where(altitude >= ceiling - cruise_band_ft, 2, 1).astype(np.int8)
+    labels[rate >= climb_rate] = 0
+    labels[rate <= descent_rate] = 3
+
+    # Hysteresis: runs shorter than the minimum duration take the phase of the previous accepted run
+    if len(labels) and min_duration > 0:
+        starts = _runs(codes, labels)
+        accepted = _run_durations(codes, times, starts) >= min_duration
+        grouped = pd.Series(np.where(accepted, labels[starts], np.nan)).groupby(codes[starts])
+        run_labels = grouped.ffill().fillna(grouped.bfill())
+
+        # Flights without any accepted run keep their labels
+        run_labels = run_labels.fillna(pd.Series(labels[starts]))
+        labels = np.repeat(run_labels.to_numpy().astype(np.int8), np.diff(np.append(starts, len(labels))))
+
+    result = np.empty(len(labels), dtype=np.int8)
+    result[order] = labels
+    series = pd.Series(pd.Categorical.from_codes(result, categories=phases), index=df.index, name="phase")
+    return series, {"order": order, "codes": codes, "times": times, "rate": rate, "labels": labels,
+                    "altitude": altitude}
+
+
+def phase_segments(df, group_column="flight_id", time_column="time", altitude_ft=None, min_duration=None):
+    """
+    Labels the phases and returns the table of phase segments of every flight.
+
+    Args:
+        df (pd.DataFrame): Positions (see `label_phases`).
+        group_column (str): Flight identifier column.
+        time_column (str): Time column.
+        altitude_ft (bool): Altitude in feet; defaults to `altitude_in_feet`.
+        min_duration (float): Shortest change of phase in seconds; defaults to `min_phase_duration`.
+
+    Returns:
+        tuple: (pd.Series of phases aligned with df, pd.DataFrame of segments sorted by flight and start time;
+        altitudes in the unit of the input)
+    """
+    altitude_ft = altitude_in_feet if altitude_ft is None else altitude_ft
+    phase, arrays = label_phases(df, group_column, time_column, altitude_ft, min_duration)
+    codes, times, labels = arrays["codes"], arrays["times"], arrays["labels"]
+
+    starts = _runs(codes, labels)
+    ends = np.append(starts[1:], len(labels)) - 1                  # last row of every segment
+    sizes = ends - starts + 1
+    altitude = arrays["altitude"] if altitude_ft else arrays["altitude"] * FT_TO_M
+    valid = ~np.isnan(arrays["rate"])
+    rate_sums = np.add.reduceat(np.where(valid, arrays["rate"], 0.0), starts) if len(starts) else np.zeros(0)
+    rate_counts = np.add.reduceat(valid.astype(np.int64), starts) if len(starts) else np.zeros(0)
+
+    segments = pd.DataFrame({
+        "flight_id":            df[group_column].to_numpy()[arrays["order"][starts]],
+        "segment":              pd.Series(codes[starts]).groupby(codes[starts]).cumcount().to_numpy() + 1,
+        "phase":                pd.Categorical.from_codes(labels[starts], categories=phases),
+        "start":                pd.to_datetime(times[starts], unit="ms", utc=True),
+        "end":                  pd.to_datetime(times[ends], unit="ms", utc=True),
+        "duration_s":           (times[ends] - times[starts]) / 1000.0,
+        "samples":              sizes,
+        "start_altitude":       altitude[starts],
+        "end_altitude":         altitude[ends],
+        "mean_vertical_rate":   rate_sums / np.maximum(rate_counts, 1),
+    })
+    return phase, segments
+
+
+def phase_statistics(segments):
+    """
+    Returns the fleet-wide statistics of the phase segments (number, total and mean duration, share of the time).
+    """
+    statistics = segments.groupby("phase", observed=False)["duration_s"].agg(["count", "sum", "mean"])
+    statistics.columns = ["segments", "total_s", "mean_s"]
+    statistics["share"] = statistics["total_s"] / statistics["total_s"].sum()
+    return statistics
+
+
+if __name__ == "__main__":
+    df = pd.read_csv(input_file, low_memory=False)
+    print(f"Processing file: {input_file} ({len(df)} positions)")
+
+    phase, segments = phase_segments(df)
+    segments.to_csv(output_file, index=False)
+    print(f"{len(segments)} phase segments of {segments['flight_id'].nunique()} flights saved to {output_file}.")
+    print(phase_statistics(segments))
+
+    if labels_file:
+        df.assign(phase=phase).to_csv(labels_file, index=False)
+        print(f"Labelled positions saved to {labels_file}.")
@@ -33,6 +33,10 @@
 #       bars in future enhancements.
 #     - The final plt.show() is called but no matplotlib plots are defined; this can
 #       be removed or replaced with actual visualization code.
+#     - When `online_checks` is enabled, each retrieved interval is also validated on the fly by
+#       `StreamingSafetyChecker` (streaming_safety_checks.py) and the cleaned state vectors are
+#       appended to `checked_filename` as they arrive.
+#     - API calls, errors, time and rows fetched / kept are recorded by `pipeline_telemetry.py`.
 # ========================================================================================================================
 
 import os
@@ -40,6 +44,11 @@ import pandas as pd
 from tqdm import tqdm
 from traffic.data import opensky
 
+from pipeline_telemetry import stage
+
+from streaming_safety_checks import StreamingSafetyChecker
+from airspace_regions import opensky_areas
+
 # Define the geographical areas bounds | (lon_min, lat_min, lon_max, lat_max) Necessariamente nessa ordem
 
 # areas = {
@@ -52,15 +61,8 @@ from traffic.data import opensky
 # }
 
 # Order to retrieve the proper geographfical domain - (lon_min, lat_min, lon_max, lat_max)
-areas = {
-    "AREA_1":   (-25, 18, -11, 40,),
-    "AREA_2_1": (-11, 25,  11, 53,),
-    "AREA_2_2": (11, 25,  33, 53,),
-    "AREA_3":   (-25, 40, -11, 75,),
-    "AREA_4":   (-11, 53,  33, 75,),
-    "AREA_5":   ( 33, 30,  51, 48,),
-    "AREA_6":   ( 33, 48,  42, 53,),    
-}
+# (defined in airspace_regions.py, which also labels the state vectors with these areas)
+areas = dict(opensky_areas)
 
 ## Define the airspace regions with the correct format [min lon, max lon, max lat, min lat]
 #areas = {
@@ -79,6 +81,21 @@ time_interval = pd.Timedelta(minutes=10)
 # Define the output filename
 output_filename = "air_traffic_output_data_2025-01-14.csv"
 
+# Online safety checks of the retrieved state vectors
+online_checks = True
+checked_filename = "air_traffic_output_data_2025-01-14_checked.csv"
+checker = StreamingSafetyChecker(window=5, max_altitude=14e+3 / 0.3048, max_groundspeed=900)  # 14 km in ft
+
+
+def append_checked(rows):
+    """
+    Appends cleaned state vectors to the checked output file, writing the header only for a new file.
+    """
+    if len(rows) == 0:
+        return
+    write_header = not (os.path.exists(checked_filename) and os.path.getsize(checked_filename) > 0)
+    pd.DataFrame(rows).to_csv(checked_filename, mode="a", header=write_header, index=False)
+
 # Check if the file exists and get the last registered time
 if os.path.exists(output_filename) and os.path.getsize(output_filename) > 0:
     # Read the last row from the file
@@ -109,6 +126,9 @@ first_iteration = True
 while current_start < end_time:
     current_stop = current_start + time_interval
 
+    # State vectors of all areas in this interval (validated together, in time order)
+    interval_frames = []
+
     # Iterate over each area
     for area_name, bounds in areas.items():
         lon_min, lat_min, lon_max, lat_max = bounds
@@ -117,23 +137,27 @@ while current_start < end_time:
 
         # Fetch history for the current area and time interval
         try:
-            traffic_data = opensky.history(
-                start=current_start.isoformat(),
-                stop=current_stop.isoformat(),
-                bounds=(lon_min, lat_min, lon_max, lat_max),  # Use area-specific bounds
-                selected_columns=[
-                    "icao24", "callsign", "time", "lat", "lon",
-                    "baroaltitude", "geoaltitude", "vertrate",
-                    "velocity", "heading"
-                ]
-            )
+            with stage("fetch") as current:
+                current.add("api_calls")
+                traffic_data = opensky.history(
+                    start=current_start.isoformat(),
+                    stop=current_stop.isoformat(),
+                    bounds=(lon_min, lat_min, lon_max, lat_max),  # Use area-specific bounds
+                    selected_columns=[
+                        "icao24", "callsign", "time", "lat", "lon",
+                        "baroaltitude", "geoaltitude", "vertrate",
+                        "velocity", "heading"
+                    ]
+                )
 
             # Convert Traffic object to pandas DataFrame
             if traffic_data is not None and traffic_data.data is not None:
                 history_df = traffic_data.data
+                current.add("rows_in", len(history_df))
 
                 # Filter flights with aircraft altitude above 5000ft
                 history_df = history_df[history_df["altitude"] > 5000]  # or "geoaltitude" if preferred           
+                current.add("rows_out", len(history_df))
 
                 # Append results to the common output file if DataFrame is not empty
                 if not history_df.empty:
@@ -144,6 +168,10 @@ while current_start < end_time:
                         index=False
                     )
                     first_iteration = False                                   
+
+                    # Keep the new state vectors for the validation of the interval
+                    if online_checks:
+                        interval_frames.append(history_df)
                 
                 # else:
                 #     print(f"No data available for {area_name} in the interval {current_start} to {current_stop}.")
@@ -153,10 +181,26 @@ while current_start < end_time:
         except Exception as e:
             print(f"An error occurred while fetching data for {area_name}: {e}")
 
+    # Validate the state vectors of all areas at once: an aircraft crossing from one area into another within the
+    # interval would otherwise have its samples of the area fetched later dropped as out of order
+    if online_checks:
+        if interval_frames:
+            interval_df = pd.concat(interval_frames, ignore_index=True)
+            interval_df = interval_df.drop_duplicates(subset=["icao24", "timestamp"])
+            append_checked(checker.process_frame(interval_df.sort_values(by="timestamp", kind="stable")))
+
+        # Emit the pending state vectors of aircraft that stopped reporting
+        append_checked(checker.flush_idle(current_stop))
+
     # Move to the next time interval
     current_start = current_stop
 
     # Wait before the next request
     # time.sleep(0.1)
 
+# Emit the state vectors still pending in the ring buffers
+if online_checks:
+    append_checked(checker.flush())
+    print(f"Online safety checks: {checker.stats}")
+
 print("Data retrieval complete.")
\ No newline at end of file
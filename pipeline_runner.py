@@ -0,0 +1,362 @@
+# ===============================================================================================================
+# Author: Wesley Gonçalves da Silva - IST1105271
+# Purpose:
+#     This script runs the processing chain of the project as a DAG of stages, per day:
+#         raw (historical_traffic_data.py output) -> pre_processing (air_traffic_pre_processing.py)
+#         -> selection (00_*_selection.py) -> safety_checks (air_traffic_safety_checks.py)
+#         -> conflicts (conflict_detection.py) and crossings (boundary_crossings.py)
+#     Every (stage, day) output is stored as a Parquet artifact keyed by a hash of its inputs and parameters: the
+#     key of a stage combines its parameters, the code of its function and modules, and the keys of its inputs
+#     (the size and modification time of the raw file for the first stage). A stage is only run when no artifact
+#     with its key exists, so changing a parameter or a day reruns only the stages downstream of the change.
+#     Independent stages and days run in parallel.
+#
+# Inputs:
+#     - Raw daily CSV files (`raw_files`, day -> path).
+#     - Stage parameters in `pipeline` (selection, cleaning mode, separation minima, region sets...).
+#
+# Outputs:
+#     - Artifacts: "<artifact_dir>/<stage>/<day>/<key>.parquet" (older versions of the same stage and day are
+#       removed).
+#     - Console printout of the stages run and reused.
+#     - Telemetry (`pipeline_telemetry.py`): time, rows, bytes and peak memory of every stage run, artifacts reused
+#       and computed.
+#
+# Additional Comments:
+#     - The pre_processing stage requires the `traffic` library; the artifacts require `pyarrow`.
+#     - A stage function receives a dict of its input DataFrames (by stage name) and its parameters, and returns a
+#       DataFrame. New stages are added to `pipeline` with the names of their inputs.
+#     - Only the keys are compared: an artifact edited by hand is not detected; delete it to rerun the stage.
+#     - The raw files are read with the compact dtypes of `compact_dtypes.py` (kept in the Parquet artifacts).
+#     - The `if __name__ == "__main__"` guard is required by the process pool on Windows.
+# ===============================================================================================================
+
+import hashlib
+import inspect
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import pandas as pd
+
+from air_traffic_cleaning import (
+    filter_short_flights,
+    drop_invalid_timestamps,
+    mask_invalid_positions,
+    mask_invalid_altitudes,
+    mask_invalid_groundspeed,
+    remove_peak_outliers,
+    remove_hampel_outliers,
+    replace_repeated_lat_lon_with_nan,
+    interpolate_selected_fields,
+    interpolate_large_distances,
+    distance_thresholds,
+)
+import compact_dtypes
+from boundary_crossings import crossing_events
+from compact_dtypes import compact_frame, expand_identifiers, read_csv_compact
+from conflict_detection import detect_conflicts
+from pipeline_telemetry import get_telemetry, memory_usage
+
+# Raw daily files: day -> path
+raw_files = {
+    "2025-01-01": "C:\\Users\\wesle\\OneDrive\\Documentos\\Master\\traffic\\code1\\data\\2025\\2025_01_01-2025_01_14\\air_traffic_output_data_2025-01-01.csv",
+    "2025-01-02": "C:\\Users\\wesle\\OneDrive\\Documentos\\Master\\traffic\\code1\\data\\2025\\2025_01_01-2025_01_14\\air_traffic_output_data_2025-01-02.csv",
+}
+artifact_dir = "pipeline_artifacts"
+max_workers = None                                  # defaults to the number of CPUs
+
+
+def read_raw(inputs, path):
+    """
+    Reads a raw daily file.
+    """
+    df = read_csv_compact(path)
+    df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce", utc=True)
+    return df.dropna(subset=["timestamp"]).reset_index(drop=True)
+
+
+def pre_process(inputs, rule="5s"):
+    """
+    Resamples the data and assigns flight IDs with the `traffic` library (air_traffic_pre_processing.py).
+    """
+    from traffic.core import Traffic
+
+    # traffic groups by the identifiers without observed=True: pass them as strings
+    resampled = Traffic(expand_identifiers(inputs["raw"])).resample(rule=rule).assign_id().eval()
+    df = resampled.data[['icao24', 'callsign', 'timestamp', 'latitude', 'longitude', 'altitude',
+                         'vertical_rate', 'groundspeed', 'flight_id', 'track']]
+    return compact_frame(df) if compact_dtypes.compact_mode else df
+
+
+def select_flights(inputs, column="icao24", values=None):
+    """
+    Keeps the rows of the given airframes or callsigns (00_airframe_selection.py / 00_flight_selection.py).
+    """
+    df = inputs["pre_processing"]
+    return df if values is None else df[df[column].isin(values)].reset_index(drop=True)
+
+
+def safety_checks(inputs, cleaning_mode="find_peaks", min_duration=10, max_altitude=14e+3, max_groundspeed=900):
+    """
+    Cleans the selected flights as air_traffic_safety_checks.py.
+    """
+    df = inputs["selection"].copy()
+    df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
+    df = filter_short_flights(df, min_duration=min_duration)
+    df = drop_invalid_timestamps(df)
+    df = df.sort_values(by=["flight_id", "timestamp"]).reset_index(drop=True)
+
+    df, _, _ = mask_invalid_positions(df)
+    df, _ = mask_invalid_altitudes(df, max_altitude=max_altitude)
+    if cleaning_mode == "hampel":
+        df = remove_hampel_outliers(df)
+    else:
+        df = remove_peak_outliers(df, distance_thresholds, prominence=5, widths=(1, 3))
+        df = remove_peak_outliers(df, distance_thresholds, prominence=2, widths=(2, 3), distance_factor=0.5)
+    df, _ = mask_invalid_groundspeed(df, max_groundspeed=max_groundspeed)
+
+    df = df[~df.duplicated()].reset_index(drop=True)
+    df = replace_repeated_lat_lon_with_nan(df)
+    df = interpolate_selected_fields(df, ['longitude', 'latitude', 'groundspeed', 'altitude'])
+    df = interpolate_large_distances(df)
+    if compact_dtypes.compact_mode:
+        df = compact_frame(df)          # the inserted rows turn the columns back to object / float64
+
+    df = df.rename(columns={"timestamp": "time"})
+    df = df[~df.duplicated(subset=["flight_id", "time"], keep=False)].reset_index(drop=True)
+    if "heading" in df.columns:
+        df["heading"] = pd.to_numeric(df["heading"], errors="coerce")
+        df = df.dropna(subset=["heading"])
+    return df.reset_index(drop=True)
+
+
+def shard_safety_checks(df, **params):
+    """
+    Cleans the flights of a date shard (date_sharding.py) as the safety_checks stage.
+    """
+    return safety_checks({"selection": df}, **params)
+
+
+def find_conflicts(inputs, horizontal_minimum_nm=5, vertical_minimum_ft=1000, step=5):
+    """
+    Loss of separation episodes of the checked flights (conflict_detection.py).
+    """
+    # Single process: the stages already run in parallel
+    return detect_conflicts(inputs["safety_checks"], horizontal_minimum_nm, vertical_minimum_ft, step, workers=1)
+
+
+def find_crossings(inputs, region_sets=("americas", "areas"), max_gap=300):
+    """
+    Region entry and exit events of the checked flights (boundary_crossings.py).
+    """
+    tables = []
+    for name in region_sets:
+        events = crossing_events(inputs["safety_checks"], name, max_gap)
+        events.insert(1, "region_set", name)
+        events["region"] = events["region"].astype(str)
+        tables.append(events)
+    return pd.concat(tables, ignore_index=True)
+
+
+# Stages: name -> function, input stages, parameters and modules whose code is part of the key
+pipeline = {
+    "raw": {
+        "function": read_raw, "inputs": [], "params": {}, "sources": raw_files, "modules": ["compact_dtypes.py"],
+    },
+    "pre_processing": {
+        "function": pre_process, "inputs": ["raw"], "params": {"rule": "5s"}, "modules": ["compact_dtypes.py"],
+    },
+    "selection": {
+        "function": select_flights, "inputs": ["pre_processing"], "params": {"column": "icao24", "values": None},
+        "modules": [],
+    },
+    "safety_checks": {
+        "function": safety_checks, "inputs": ["selection"], "params": {"cleaning_mode": "find_peaks"},
+        "modules": ["air_traffic_cleaning.py", "compact_dtypes.py"],
+    },
+    "conflicts": {
+        "function": find_conflicts, "inputs": ["safety_checks"], "params": {}, "modules": ["conflict_detection.py"],
+    },
+    "crossings": {
+        "function": find_crossings, "inputs": ["safety_checks"], "params": {},
+        "modules": ["boundary_crossings.py", "airspace_regions.py"],
+    },
+}
+
+
+def _topological_order(stages):
+    """
+    Returns the stage names with every stage after its inputs.
+    """
+    order, visiting = [], set()
+
+    def visit(name):
+        if name in order:
+            return
+        if name in visiting:
+            raise ValueError(f"Cycle in the pipeline at stage '{name}'.")
+        visiting.add(name)
+        for dependency in stages[name]["inputs"]:
+            visit(dependency)
+        visiting.discard(name)
+        order.append(name)
+
+    for name in stages:
+        visit(name)
+    return order
+
+
+def _code_hash(stage):
+    """
+    Returns the hash of the code of a stage (function and listed modules).
+    """
+    digest = hashlib.sha1(inspect.getsource(stage["function"]).encode("utf-8"))
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for module in stage.get("modules", []):
+        with open(os.path.join(directory, module), "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def artifact_keys(stages, days):
+    """
+    Computes the key of every (stage, day) from its parameters, code and input keys.
+
+    Args:
+        stages (dict): Pipeline stages.
+        days (list): Days to process.
+
+    Returns:
+        dict: (stage, day) -> key.
+    """
+    keys = {}
+    code = {name: _code_hash(stage) for name, stage in stages.items()}
+    for name in _topological_order(stages):
+        stage = stages[name]
+        for day in days:
+            description = {"stage": name, "code": code[name], "params": stage["params"],
+                           "inputs": [keys[(dependency, day)] for dependency in stage["inputs"]]}
+            if "sources" in stage:
+                status = os.stat(stage["sources"][day])
+                description["source"] = [stage["sources"][day], status.st_size, status.st_mtime_ns]
+            text = json.dumps(description, sort_keys=True, default=str)
+            keys[(name, day)] = hashlib.sha1(text.encode("utf-8")).hexdigest()[:20]
+    return keys
+
+
+def artifact_path(name, day, key, directory=None):
+    """
+    Returns the file of the artifact of a stage and day.
+    """
+    return os.path.join(directory or artifact_dir, name, day, f"{key}.parquet")
+
+
+def run_task(name, day, function, input_paths, params, output):
+    """
+    Worker: runs a stage for a day and stores its artifact. Returns the stage, day and telemetry of the run.
+    """
+    start = time.perf_counter()
+    inputs = {dependency: pd.read_parquet(path) for dependency, path in input_paths.items()}
+    result = function(inputs, **params)
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    temporary = f"{output}.tmp"
+    result.to_parquet(temporary, index=False)
+    os.replace(temporary, output)
+
+    # Remove the previous versions of this stage and day
+    for file in os.listdir(os.path.dirname(output)):
+        path = os.path.join(os.path.dirname(output), file)
+        if path != output and file.endswith(".parquet"):
+            os.remove(path)
+
+    measures = {"seconds": time.perf_counter() - start, "peak_rss_bytes": memory_usage()[1],
+                "rows_in": sum(len(df) for df in inputs.values()), "rows_out": len(result),
+                "bytes_read": sum(os.path.getsize(path) for path in input_paths.values()),
+                "bytes_written": os.path.getsize(output)}
+    return name, day, measures
+
+
+def _record_task(name, day, measures):
+    """
+    Adds the telemetry of a task to the telemetry of the process and prints it.
+    """
+    get_telemetry().add_stage(name, **measures)
+    print(f"Done: {name} {day} ({measures['rows_out']} rows, {measures['seconds']:.1f} s)")
+
+
+def run_pipeline(stages=None, days=None, targets=None, directory=None, workers=None):
+    """
+    Runs the stale stages of the pipeline.
+
+    Args:
+        stages (dict): Pipeline stages; defaults to `pipeline`.
+        days (list): Days to process; defaults to the days of the source stage.
+        targets (list): Stages to bring up to date (with their inputs); all stages by default.
+        directory (str): Artifact directory; defaults to `artifact_dir`.
+        workers (int): Number of processes; 1 runs in the calling process.
+
+    Returns:
+        dict: (stage, day) -> artifact file.
+    """
+    stages = stages or pipeline
+    days = days or sorted(next(stage["sources"] for stage in stages.values() if "sources" in stage))
+    keys = artifact_keys(stages, days)
+
+    # Stages needed by the targets
+    needed, pending = set(), list(targets or stages)
+    while pending:
+        name = pending.pop()
+        if name not in needed:
+            needed.add(name)
+            pending.extend(stages[name]["inputs"])
+
+    paths = {(name, day): artifact_path(name, day, keys[(name, day)], directory)
+             for name in needed for day in days}
+    stale = {task for task, path in paths.items() if not os.path.exists(path)}
+    print(f"{len(paths) - len(stale)} artifacts up to date, {len(stale)} to compute")
+    get_telemetry().count("artifacts_reused", len(paths) - len(stale), stage="pipeline")
+    get_telemetry().count("artifacts_computed", len(stale), stage="pipeline")
+
+    def arguments(task):
+        name, day = task
+        stage = stages[name]
+        params = dict(stage["params"])
+        if "sources" in stage:
+            params["path"] = stage["sources"][day]
+        input_paths = {dependency: paths[(dependency, day)] for dependency in stage["inputs"]}
+        return name, day, stage["function"], input_paths, params, paths[task]
+
+    def ready(task):
+        name, day = task
+        return all((dependency, day) not in stale for dependency in stages[name]["inputs"])
+
+    if workers == 1:
+        for name in _topological_order(stages):
+            for day in days:
+                if (name, day) in stale:
+                    _record_task(*run_task(*arguments((name, day))))
+                    stale.discard((name, day))
+        return paths
+
+    # Submit every stale task as soon as its inputs are available
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        running = {}
+        while stale or running:
+            for task in sorted(stale - set(running.values())):
+                if ready(task):
+                    running[executor.submit(run_task, *arguments(task))] = task
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                _record_task(*future.result())
+                stale.discard(task)
+    return paths
+
+
+if __name__ == "__main__":
+    artifacts = run_pipeline(workers=max_workers)
+    for (name, day), path in sorted(artifacts.items()):
+        print(f"{name:15s} {day}: {path}")
@@ -0,0 +1,259 @@
+# ===============================================================================================================
+# Author: Wesley Gonçalves da Silva - IST1105271
+# Purpose:
+#     This module records per-stage telemetry of the scripts (time, rows in / out, bytes read / written, memory,
+#     API calls, cache hits...) and writes it, when the script ends, to:
+#         - a structured JSON log (one JSON line per stage and run), to follow the throughput across runs;
+#         - a Prometheus textfile (node_exporter textfile collector), so that the dashboards show regressions
+#           without any service running next to the scripts.
+#
+# Inputs:
+#     - Calls from the scripts and modules:
+#         with stage("load") as current:          # times the block and measures the memory
+#             ...
+#             current.add("rows_out", len(df))
+#         count("cache_hits")                      # counter of the current stage (or of the whole script)
+#
+# Outputs:
+#     - "<telemetry_dir>/telemetry.jsonl": lines with run id, script, stage, timestamps and counters.
+#     - "<telemetry_dir>/<script>.prom": metrics air_traffic_<counter>_total, air_traffic_stage_duration_seconds,
+#       air_traffic_stage_peak_rss_bytes... labelled by script and stage (values of the last run).
+#
+# Additional Comments:
+#     - One Telemetry object per process (`get_telemetry`), written at exit; worker processes of a process pool
+#       exit without running the exit handlers, so their measures are returned to the main process, which adds them
+#       with `Telemetry.add_stage` (see `pipeline_runner.py`).
+#     - Memory: resident set size at the end of the stage and its high-water mark since the start of the process
+#       (Windows: PeakWorkingSetSize; Linux: VmHWM), without extra dependencies.
+#     - Set `telemetry_enabled = False` to disable the output files (the counters are still kept in memory).
+# ===============================================================================================================
+
+import atexit
+import ctypes
+import json
+import os
+import sys
+import time
+import uuid
+
+telemetry_enabled = True
+telemetry_dir = "telemetry"
+log_name = "telemetry.jsonl"
+metric_prefix = "air_traffic"
+
+# Process-wide telemetry (see get_telemetry)
+_telemetry = None
+
+
+def memory_usage():
+    """
+    Returns (current, peak) resident memory of the process in bytes (None if unavailable).
+    """
+    if sys.platform == "win32":
+        class Counters(ctypes.Structure):
+            _fields_ = [("cb", ctypes.c_ulong), ("PageFaultCount", ctypes.c_ulong),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+        counters = Counters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize, counters.PeakWorkingSetSize
+        return None, None
+    try:
+        values = {}
+        with open("/proc/self/status", encoding="ascii") as file:
+            for line in file:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    key, value = line.split(":")
+                    values[key] = int(value.split()[0]) * 1024
+        return values.get("VmRSS"), values.get("VmHWM")
+    except OSError:
+        import resource
+        # macOS: ru_maxrss in bytes
+        return None, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Stage:
+    """
+    Timer and counters of a stage, used as a context manager (see `Telemetry.stage`).
+    """
+
+    def __init__(self, telemetry, name):
+        self.telemetry = telemetry
+        self.name = name
+        self.start = None
+
+    def add(self, counter, value=1):
+        """
+        Adds a value to a counter of the stage.
+        """
+        self.telemetry.count(counter, value, stage=self.name)
+
+    def __enter__(self):
+        self.telemetry._active.append(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        record = self.telemetry._record(self.name)
+        record["seconds"] += time.perf_counter() - self.start
+        record["calls"] += 1
+        if exc_type is not None:
+            record["counters"]["errors"] = record["counters"].get("errors", 0) + 1
+        record["rss_bytes"], peak = memory_usage()
+        record["peak_rss_bytes"] = max(record["peak_rss_bytes"] or 0, peak or 0) or None
+        self.telemetry._active.pop()
+        return False
+
+
+class Telemetry:
+    """
+    Per-stage counters and timers of a script run.
+
+    Args:
+        script (str): Script name (label of the metrics).
+        directory (str): Output directory; defaults to `telemetry_dir`.
+    """
+
+    def __init__(self, script, directory=None):
+        self.script = script
+        self.directory = directory or telemetry_dir
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started = time.time()
+        self.records = {}           # stage -> {"seconds", "calls", "rss_bytes", "peak_rss_bytes", "counters"}
+        self._active = []           # names of the stages being timed (innermost last)
+
+    def _record(self, name):
+        """
+        Returns the record of a stage, creating it if needed.
+        """
+        if name not in self.records:
+            self.records[name] = {"seconds": 0.0, "calls": 0, "rss_bytes": None, "peak_rss_bytes": None,
+                                  "counters": {}}
+        return self.records[name]
+
+    def stage(self, name):
+        """
+        Returns a context manager timing a stage (repeated stages accumulate their time and counters).
+        """
+        return Stage(self, name)
+
+    def count(self, counter, value=1, stage=None):
+        """
+        Adds a value to a counter of a stage (the innermost active stage, or "script" outside of any stage).
+        """
+        name = stage or (self._active[-1] if self._active else "script")
+        counters = self._record(name)["counters"]
+        counters[counter] = counters.get(counter, 0) + value
+
+    def add_stage(self, name, seconds, peak_rss_bytes=None, **counters):
+        """
+        Adds an execution of a stage measured elsewhere (e.g. in a worker process, whose telemetry is not written).
+
+        Args:
+            name (str): Stage name.
+            seconds (float): Duration of the execution.
+            peak_rss_bytes (int): Peak resident memory of the process that ran it.
+            **counters: Values added to the counters of the stage.
+        """
+        record = self._record(name)
+        record["seconds"] += seconds
+        record["calls"] += 1
+        record["peak_rss_bytes"] = max(record["peak_rss_bytes"] or 0, peak_rss_bytes or 0) or None
+        for counter, value in counters.items():
+            self.count(counter, value, stage=name)
+
+    def write_log(self, path=None):
+        """
+        Appends one JSON line per stage to the structured log.
+        """
+        path = path or os.path.join(self.directory, log_name)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        finished = time.time()
+        with open(path, "a", encoding="utf-8") as file:
+            for name, record in self.records.items():
+                line = {"run_id": self.run_id, "script": self.script, "stage": name, "started": self.started,
+                        "finished": finished, "seconds": round(record["seconds"], 6), "calls": record["calls"],
+                        "rss_bytes": record["rss_bytes"], "peak_rss_bytes": record["peak_rss_bytes"]}
+                line.update(record["counters"])
+                if record["seconds"] > 0:
+                    for counter in ("rows_in", "rows_out", "bytes_read", "bytes_written"):
+                        if counter in record["counters"]:
+                            line[f"{counter}_per_second"] = record["counters"][counter] / record["seconds"]
+                file.write(json.dumps(line) + "\n")
+
+    def write_prometheus(self, path=None):
+        """
+        Writes the metrics of the run to a Prometheus textfile (replaced atomically).
+        """
+        path = path or os.path.join(self.directory, f"{self.script}.prom")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        metrics = {}            # metric -> (type, help, [(labels, value)])
+
+        def add(metric, kind, description, labels, value):
+            if value is not None:
+                metrics.setdefault(f"{metric_prefix}_{metric}", (kind, description, []))[2].append((labels, value))
+
+        for name, record in sorted(self.records.items()):
+            labels = f'script="{self.script}",stage="{name}"'
+            if record["calls"]:         # counters-only stages ("script") have no duration
+                add("stage_duration_seconds", "gauge", "Time spent in the stage during the last run.", labels,
+                    record["seconds"])
+                add("stage_calls", "gauge", "Number of executions of the stage during the last run.", labels,
+                    record["calls"])
+            add("stage_rss_bytes", "gauge", "Resident memory at the end of the stage.", labels, record["rss_bytes"])
+            add("stage_peak_rss_bytes", "gauge", "Peak resident memory of the process at the end of the stage.",
+                labels, record["peak_rss_bytes"])
+            for counter, value in sorted(record["counters"].items()):
+                add(f"{counter}_total", "counter", f"Stage counter {counter} during the last run.", labels, value)
+        add("last_run_timestamp_seconds", "gauge", "End time of the last run.", f'script="{self.script}"', time.time())
+
+        lines = []
+        for metric, (kind, description, samples) in sorted(metrics.items()):
+            lines.append(f"# HELP {metric} {description}")
+            lines.append(f"# TYPE {metric} {kind}")
+            lines.extend(f"{metric}{{{labels}}} {value}" for labels, value in samples)
+        with open(f"{path}.tmp", "w", encoding="utf-8", newline="\n") as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(f"{path}.tmp", path)
+
+    def flush(self):
+        """
+        Writes the JSON log and the Prometheus textfile.
+        """
+        if telemetry_enabled and self.records:
+            self.write_log()
+            self.write_prometheus()
+
+
+def get_telemetry(script=None):
+    """
+    Returns the telemetry of the process, created on first use and written when the process exits.
+
+    Args:
+        script (str): Script name; defaults to the name of the main script.
+    """
+    global _telemetry
+    if _telemetry is None:
+        script = script or os.path.splitext(os.path.basename(sys.argv[0] or "interactive"))[0] or "interactive"
+        _telemetry = Telemetry(script)
+        atexit.register(_telemetry.flush)
+    return _telemetry
+
+
+def stage(name):
+    """
+    Times a stage of the process telemetry (context manager).
+    """
+    return get_telemetry().stage(name)
+
+
+def count(counter, value=1, stage=None):
+    """
+    Adds a value to a counter of the process telemetry.
+    """
+    get_telemetry().count(counter, value, stage)
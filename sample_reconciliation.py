@@ -0,0 +1,175 @@
+# ===============================================================================================================
+# Author: Wesley Gonçalves da Silva - IST1105271
+# Purpose:
+#     This module adds the boundary rows of the main sample (e.g. the last state vector of every flight) into the
+#     other sample files of `air_traffic_pos_processing.py` without loading, concatenating and re-sorting each file.
+#     Because the sample files are already sorted by (flight_id, time), the position of every boundary row is found
+#     by binary search on the file bytes, and the file is rewritten by copying the untouched byte ranges around the
+#     inserted rows. Parsing and comparisons therefore scale with the number of boundary rows, not with the file size.
+#
+# Inputs:
+#     - The boundary rows (pandas DataFrame with the same columns as the sample files).
+#     - Paths of the CSV sample files, sorted by ('flight_id', 'time') as strings.
+#
+# Outputs:
+#     - The sample files updated in place (through a temporary file and an atomic replace), only when a row had to
+#       be inserted or replaced.
+#     - Per file, the number of inserted and replaced rows.
+#
+# Additional Comments:
+#     - The result is the same as `pd.concat([rows, df]).drop_duplicates(subset=keys).sort_values(keys)`:
+#       a boundary row whose key already exists replaces the existing line (the first occurrence is kept).
+#     - Keys are compared as strings, exactly like `sort_values` on the columns read by `pd.read_csv` without
+#       date parsing. Files whose header differs from the boundary rows are left to the concat method.
+#     - The files are processed concurrently in a thread pool; the work is I/O bound (seek, read and byte copies).
+# ===============================================================================================================
+
+import csv
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Size of the blocks copied between the original and the updated file
+copy_block_size = 16 * 1024 * 1024
+
+
+def _parse_key(line, key_positions):
+    """
+    Returns the (flight_id, time) key of a raw CSV line.
+    """
+    fields = next(csv.reader([line.decode("utf-8")]))
+    return tuple(fields[position] for position in key_positions)
+
+
+def _line_at(file, offset, data_start):
+    """
+    Returns (start, line) of the first line starting at or after `offset` (an empty line at the end of the file).
+    """
+    if offset <= data_start:
+        file.seek(data_start)
+    else:
+        # Skip the rest of the line containing offset - 1
+        file.seek(offset - 1)
+        file.readline()
+    start = file.tell()
+    return start, file.readline()
+
+
+def _lower_bound(file, key, key_positions, low, high, data_start):
+    """
+    Binary search of the first line whose key is not smaller than `key`, between the byte offsets low and high.
+    """
+    while low < high:
+        middle = (low + high) // 2
+        _, line = _line_at(file, middle, data_start)
+        if line.strip() and _parse_key(line, key_positions) < key:
+            low = middle + 1
+        else:
+            high = middle
+    return _line_at(file, low, data_start)
+
+
+def _copy_range(source, destination, start, stop):
+    """
+    Copies the bytes [start, stop) of the source file to the destination file.
+    """
+    source.seek(start)
+    remaining = stop - start
+    while remaining > 0:
+        block = source.read(min(copy_block_size, remaining))
+        if not block:
+            break
+        destination.write(block)
+        remaining -= len(block)
+
+
+def reconcile_sorted_csv(path, rows, key_columns=("flight_id", "time")):
+    """
+    Inserts the given rows into a CSV file sorted by the key columns, replacing the lines with the same key.
+
+    Args:
+        path (str): CSV file sorted by `key_columns` (compared as strings).
+        rows (pd.DataFrame): Rows to insert, with the same columns as the file.
+        key_columns (tuple): Columns defining the sort order and the uniqueness of the rows.
+
+    Returns:
+        tuple: (inserted, replaced) numbers of rows, or None if the header of the file differs from the rows
+            (the file is then left untouched).
+    """
+    with open(path, "rb") as file:
+        header = file.readline()
+        data_start = file.tell()
+        size = os.path.getsize(path)
+        terminator = "\r\n" if header.endswith(b"\r\n") else "\n"
+
+        columns = next(csv.reader([header.decode("utf-8-sig")]))
+        if set(columns) != set(rows.columns):
+            return None
+        key_positions = [columns.index(column) for column in key_columns]
+
+        # Format the rows exactly as lines of this file and sort them by key
+        text = rows[columns].to_csv(header=False, index=False, lineterminator=terminator)
+        new_lines = [line.encode("utf-8") for line in text.splitlines(keepends=True)]
+        new_lines.sort(key=lambda line: _parse_key(line, key_positions))
+
+        # Locate every row; keys are sorted, so each search starts where the previous one ended
+        operations = []  # (offset, new line, number of bytes replaced)
+        low = data_start
+        previous_key = None
+        for line in new_lines:
+            key = _parse_key(line, key_positions)
+            if key == previous_key:
+                continue  # Keep the first of duplicated boundary rows
+            previous_key = key
+
+            start, existing = _lower_bound(file, key, key_positions, low, size, data_start)
+            if existing.strip() and _parse_key(existing, key_positions) == key:
+                if existing.rstrip(b"\r\n") != line.rstrip(b"\r\n"):
+                    operations.append((start, line, len(existing)))
+                low = start + len(existing)
+            else:
+                operations.append((start, line, 0))
+                low = start
+
+        if not operations:
+            return 0, 0
+
+        # Rewrite the file: untouched byte ranges are copied, boundary rows are inserted in between
+        file.seek(size - 1)
+        missing_terminator = file.read(1) != b"\n"
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "wb") as output:
+            position = 0
+            for offset, line, replaced_length in operations:
+                _copy_range(file, output, position, offset)
+                if offset == size and missing_terminator:
+                    # Appending after a last line without line terminator
+                    output.write(terminator.encode())
+                    missing_terminator = False
+                output.write(line)
+                position = offset + replaced_length
+            _copy_range(file, output, position, size)
+
+    os.replace(temporary_path, path)
+
+    replaced = sum(1 for operation in operations if operation[2] > 0)
+    return len(operations) - replaced, replaced
+
+
+def reconcile_datasets(paths, rows, key_columns=("flight_id", "time"), max_workers=None):
+    """
+    Inserts the boundary rows into several sorted sample files concurrently.
+
+    Args:
+        paths (list): CSV files sorted by `key_columns`.
+        rows (pd.DataFrame): Rows to insert, with the same columns as the files.
+        key_columns (tuple): Columns defining the sort order and the uniqueness of the rows.
+        max_workers (int): Number of threads; defaults to one per file.
+
+    Returns:
+        dict: Path -> (inserted, replaced), or None for the files left untouched because of a different header.
+    """
+    if not paths:
+        return {}
+    with ThreadPoolExecutor(max_workers=max_workers or len(paths)) as executor:
+        results = executor.map(lambda path: reconcile_sorted_csv(path, rows, key_columns), paths)
+        return dict(zip(paths, results))
@@ -0,0 +1,213 @@
+# ===============================================================================================================
+# Author: Wesley Gonçalves da Silva - IST1105271
+# Purpose:
+#     This module computes per-region traffic time series (occupancy and entries) from region-labelled
+#     trajectories (`airspace_regions.py`), for weeks of data and without per-flight loops:
+#         1. The samples of each flight are split into continuous stays in a region (vectorized run detection
+#            on the data sorted by flight and time); every stay gives an entry and an exit event.
+#         2. The stays of several chunks (files, days) are merged by joining the stay ending at the last sample of a
+#            flight in one chunk with the stay of the same flight and region starting at its first sample in
+#            another chunk (at most `max_gap` later), so chunked inputs give the same result as a single input.
+#         3. Occupancy and flows are obtained by sweeping the sorted entry and exit times of each region with
+#            binary searches over the bin edges.
+#
+# Inputs:
+#     - DataFrames with 'flight_id', 'time' and a region column (region name, e.g. from `RegionIndex.label`),
+#       or a bitmask column of all the regions of each position for overlapping regions.
+#
+# Outputs:
+#     - Stays per flight and region: flight_id, region, entry and exit times (`SectorOccupancy.stays`).
+#     - Occupancy: number of flights present in each region during each time bin (`SectorOccupancy.occupancy`).
+#     - Flows: number of entries (or exits) in each region per time bin (`SectorOccupancy.entries`/`exits`).
+#
+# Additional Comments:
+#     - The entry time is the first sample in the region and the exit time the last one; a flight whose samples
+#       in the region are separated by more than `max_gap` (lost coverage) counts as two stays.
+#     - Times are handled as UTC; naive times are taken as UTC.
+#     - A flight present in a region at the start of the data counts as an entry at its first sample.
+#     - The chunks must cover consecutive periods of each flight (e.g. row chunks of a file sorted by flight and
+#       time, or consecutive days); chunks interleaving the samples of the same flight are not joined.
+# ===============================================================================================================
+
+import numpy as np
+import pandas as pd
+
+
+class SectorOccupancy:
+    """
+    Accumulator of the region stays of flights, with occupancy and flow time series.
+
+    Args:
+        max_gap (float): Largest time in seconds between two consecutive samples of the same stay.
+    """
+
+    def __init__(self, max_gap=300):
+        self.max_gap = pd.Timedelta(seconds=max_gap).value
+        self._parts = []        # Stays of every added chunk (dicts of arrays)
+        self._chunks = 0        # Number of chunks added
+        self._stays = None      # Merged stays (cache)
+
+    def add(self, df, region_column="region", mask_column=None, names=None, group_column="flight_id",
+            time_column="time"):
+        """
+        Extracts the region stays of a chunk of labelled trajectories.
+
+        Args:
+            df (pd.DataFrame): Samples with the group, time and region (or mask) columns.
+            region_column (str): Column with the region name of each sample (NaN outside all regions).
+            mask_column (str): Column with the bitmask of all the regions of each sample; used instead of
+                `region_column` when given (overlapping regions).
+            names (list): Region names of the mask bits (`RegionIndex.names`); required with `mask_column`.
+            group_column (str): Column identifying the flights.
+            time_column (str): Time column.
+        """
+        if len(df) == 0:
+            return
+        times = pd.to_datetime(df[time_column], utc=True).to_numpy(dtype="datetime64[ns]").view(np.int64)
+        flight_codes, flight_ids = pd.factorize(df[group_column])
+        order = np.lexsort((times, flight_codes))
+        times, flight_codes = times[order], flight_codes[order]
+
+        # Breaks between consecutive samples: new flight or coverage gap
+        breaks = np.ones(len(times) + 1, dtype=bool)
+        breaks[1:-1] = (flight_codes[1:] != flight_codes[:-1]) | (np.diff(times) > self.max_gap)
+
+        # First and last sample of each flight in this chunk, to join stays across chunks
+        new_flight = np.ones(len(times), dtype=bool)
+        new_flight[1:] = flight_codes[1:] != flight_codes[:-1]
+        positions = np.arange(len(times))
+        first_time = times[np.maximum.accumulate(np.where(new_flight, positions, 0))]
+        last_flight = np.ones(len(times), dtype=bool)
+        last_flight[:-1] = new_flight[1:]
+        last_time = times[np.minimum.accumulate(np.where(last_flight, positions, len(times) - 1)[::-1])[::-1]]
+
+        if mask_column is not None:
+            masks = df[mask_column].to_numpy(dtype=np.uint64)[order]
+            memberships = [(name, ((masks >> np.uint64(bit)) & np.uint64(1)) == 1) for bit, name in enumerate(names)]
+        else:
+            region_codes, region_names = pd.factorize(df[region_column])
+            region_codes = region_codes[order]
+            memberships = [(name, region_codes == code) for code, name in enumerate(region_names)]
+
+        for name, member in memberships:
+            if not member.any():
+                continue
+            # A stay starts at a member sample after a break or a non-member sample, and ends symmetrically
+            previous = np.concatenate(([False], member[:-1])) & ~breaks[:-1]
+            following = np.concatenate((member[1:], [False])) & ~breaks[1:]
+            starts = np.flatnonzero(member & ~previous)
+            stops = np.flatnonzero(member & ~following)
+
+            self._parts.append({
+                "flight_id":    flight_ids.to_numpy()[flight_codes[starts]],
+                "region":       np.full(len(starts), name, dtype=object),
+                "entry":        times[starts],
+                "exit":         times[stops],
+                "chunk":        np.full(len(starts), self._chunks, dtype=np.int64),
+                "at_start":     times[starts] == first_time[starts],
+                "at_end":       times[stops] == last_time[stops],
+            })
+        self._chunks += 1
+        self._stays = None
+
+    def merge(self, other):
+        """
+        Adds the stays of another accumulator (e.g. another day or file).
+
+        Returns:
+            SectorOccupancy: self.
+        """
+        for part in other._parts:
+            self._parts.append(dict(part, chunk=part["chunk"] + self._chunks))
+        self._chunks += other._chunks
+        self._stays = None
+        return self
+
+    def stays(self):
+        """
+        Returns the stays of all chunks, joining the stays split by the chunk boundaries.
+
+        Returns:
+            pd.DataFrame: Columns flight_id, region, entry and exit (UTC), sorted by flight, region and entry.
+        """
+        if self._stays is not None:
+            return self._stays
+        if not self._parts:
+            return pd.DataFrame(columns=["flight_id", "region", "entry", "exit"])
+
+        stays = pd.DataFrame({column: np.concatenate([part[column] for part in self._parts]) for column in self._parts[0]})
+        stays = stays.sort_values(by=["flight_id", "region", "entry"], kind="stable").reset_index(drop=True)
+
+        # Join a stay to the previous one if it continues it in the next chunk
+        same = ((stays["flight_id"].to_numpy()[1:] == stays["flight_id"].to_numpy()[:-1])
+                & (stays["region"].to_numpy()[1:] == stays["region"].to_numpy()[:-1])
+                & (stays["chunk"].to_numpy()[1:] != stays["chunk"].to_numpy()[:-1])
+                & stays["at_end"].to_numpy()[:-1] & stays["at_start"].to_numpy()[1:]
+                & (stays["entry"].to_numpy()[1:] - stays["exit"].to_numpy()[:-1] <= self.max_gap))
+        first = np.flatnonzero(np.concatenate(([True], ~same)))
+
+        entries = np.minimum.reduceat(stays["entry"].to_numpy(), first)
+        exits = np.maximum.reduceat(stays["exit"].to_numpy(), first)
+        self._stays = pd.DataFrame({
+            "flight_id":    stays["flight_id"].to_numpy()[first],
+            "region":       stays["region"].to_numpy()[first],
+            "entry":        pd.to_datetime(entries, utc=True),
+            "exit":         pd.to_datetime(exits, utc=True),
+        })
+        return self._stays
+
+    def _bins(self, freq, start, end):
+        """
+        Returns the bin edges (int64 ns) covering the stays or the requested period.
+        """
+        stays = self.stays()
+        start = pd.Timestamp(start) if start is not None else stays["entry"].min().floor(freq)
+        end = pd.Timestamp(end) if end is not None else stays["exit"].max().floor(freq) + pd.Timedelta(freq)
+        start = start.tz_localize("UTC") if start.tz is None else start
+        end = end.tz_localize("UTC") if end.tz is None else end
+        return pd.date_range(start, end, freq=freq)
+
+    def _per_region(self, freq, start, end, function):
+        """
+        Applies function(sorted entries, sorted exits, edges) to each region and gathers the series.
+        """
+        stays = self.stays()
+        edges = self._bins(freq, start, end)
+        edge_values = edges.as_unit("ns").asi8
+        series = {}
+        for region, group in stays.groupby("region", sort=True):
+            entries = np.sort(group["entry"].dt.as_unit("ns").astype("int64").to_numpy())
+            exits = np.sort(group["exit"].dt.as_unit("ns").astype("int64").to_numpy())
+            series[region] = function(entries, exits, edge_values)
+        return pd.DataFrame(series, index=edges[:-1])
+
+    def occupancy(self, freq="5min", start=None, end=None):
+        """
+        Number of flights present in each region during each time bin.
+
+        Args:
+            freq (str): Bin size (pandas frequency, e.g. "1min", "5min", "1h").
+            start (str or pd.Timestamp): Beginning of the series; defaults to the first entry.
+            end (str or pd.Timestamp): End of the series; defaults to the last exit.
+
+        Returns:
+            pd.DataFrame: One column per region, indexed by the start of each bin.
+        """
+        # Stays overlapping [t0, t1): entered before t1 minus exited before t0
+        return self._per_region(freq, start, end, lambda entries, exits, edges:
+                                np.searchsorted(entries, edges[1:], side="left")
+                                - np.searchsorted(exits, edges[:-1], side="left"))
+
+    def entries(self, freq="1h", start=None, end=None):
+        """
+        Number of entries in each region per time bin (flow; entries per hour with freq="1h").
+        """
+        return self._per_region(freq, start, end, lambda entries, exits, edges:
+                                np.diff(np.searchsorted(entries, edges, side="left")))
+
+    def exits(self, freq="1h", start=None, end=None):
+        """
+        Number of exits from each region per time bin.
+        """
+        return self._per_region(freq, start, end, lambda entries, exits, edges:
+                                np.diff(np.searchsorted(exits, edges, side="left")))
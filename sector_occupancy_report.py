@@ -0,0 +1,83 @@
+# ===============================================================================================================
+# Author: Wesley Gonçalves da Silva - IST1105271
+# Purpose:
+#     This script computes the traffic per airspace region (occupancy and entries per hour) over the checked
+#     data files, labelling the positions with `airspace_regions.py` and building the time series with
+#     `sector_occupancy.py`.
+#
+# Inputs:
+#     - Checked CSV files (output of `air_traffic_safety_checks.py`) with flight_id, time, longitude and
+#       latitude, sorted by flight_id and time.
+#     - Region set ("erc", "areas" or "americas"), occupancy and flow resolutions.
+#
+# Outputs:
+#     - "<region_set>_occupancy.csv": flights present in each region per `occupancy_freq` bin.
+#     - "<region_set>_entries.csv": entries in each region per `flow_freq` bin.
+#     - "<region_set>_stays.csv": entry and exit times of every flight in every region.
+#     - "<region_set>_occupancy.pdf" / ".png": occupancy time series of all regions.
+#
+# Additional Comments:
+#     - The files are read in chunks of `chunksize` rows with only the needed columns; the stays of a flight
+#       split between two chunks or two files are joined by `SectorOccupancy`.
+#     - Overlapping regions (e.g. ERC08 and ERC09) are counted in each region they contain the aircraft.
+# ===============================================================================================================
+
+import pandas as pd
+import matplotlib.pyplot as plt
+
+from airspace_regions import RegionIndex
+from sector_occupancy import SectorOccupancy
+
+# Enable LaTeX font rendering
+plt.rcParams.update({
+    "text.usetex": False,
+    "font.family": "serif",
+    "font.size": 12
+})
+
+input_files = [
+    "C:\\Users\\wesle\\OneDrive\\Documentos\\Master\\traffic\\code1\\data\\2025\\2025_01_01-2025_01_14\\2025-01-01_2025-01-14_flight_id_filtered_airframe_checked.csv",
+]
+
+# Settings
+region_set = "erc"
+occupancy_freq = "5min"
+flow_freq = "1h"
+max_gap = 300                                       # seconds without samples that end a stay
+chunksize = 5 * 10**6
+
+index = RegionIndex(region_set)
+occupancy = SectorOccupancy(max_gap=max_gap)
+
+for input_file in input_files:
+    print(f"Processing file: {input_file}")
+    for chunk in pd.read_csv(input_file, usecols=["flight_id", "time", "longitude", "latitude"], chunksize=chunksize):
+        # Bitmask of all the regions of each position, so that overlapping regions are all counted
+        chunk["region_mask"] = index.assign_mask(chunk["longitude"].to_numpy(), chunk["latitude"].to_numpy())
+        occupancy.add(chunk, mask_column="region_mask", names=index.names)
+
+stays = occupancy.stays()
+occupancy_df = occupancy.occupancy(occupancy_freq)
+entries_df = occupancy.entries(flow_freq)
+
+stays.to_csv(f"{region_set}_stays.csv", index=False)
+occupancy_df.to_csv(f"{region_set}_occupancy.csv", index_label="time")
+entries_df.to_csv(f"{region_set}_entries.csv", index_label="time")
+
+print(f"{len(stays)} region stays")
+print(f"Peak occupancy per region:\n{occupancy_df.max()}")
+print(f"Peak entries per {flow_freq}:\n{entries_df.max()}")
+
+# Plot the occupancy of every region
+plt.figure(figsize=(12, 6))
+for region in occupancy_df.columns:
+    plt.plot(occupancy_df.index, occupancy_df[region], label=region, linewidth=1)
+plt.xlabel(r"Time (UTC)")
+plt.ylabel(r"Aircraft in region")
+plt.title(rf"Region Occupancy ({occupancy_freq} bins)")
+plt.legend(fontsize=8, ncol=2)
+plt.grid()
+plt.gcf().autofmt_xdate()
+plt.savefig(f"{region_set}_occupancy.pdf", format="pdf")  # Save as PDF
+plt.savefig(f"{region_set}_occupancy.png", format="png", dpi=300)  # Save as PNG with high resolution
+plt.show()
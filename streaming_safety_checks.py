@@ -0,0 +1,211 @@
+# ===============================================================================================================
+# Author: Wesley Gonçalves da Silva - IST1105271
+# Purpose:
+#     This module applies the safety checks of `air_traffic_safety_checks.py` online, to state vectors as they
+#     arrive from the retrieval loop (`historical_traffic_data.py`), instead of hours later on the full dataset.
+#     Each aircraft (icao24) keeps a small ring buffer of its latest state vectors, so every message is validated
+#     in constant time and cleaned rows are emitted continuously.
+#
+# Inputs:
+#     - State vectors (one dict per message, or a DataFrame per retrieval interval) with at least the columns
+#       ['icao24', 'timestamp', 'latitude', 'longitude', 'altitude', 'vertical_rate', 'groundspeed'].
+#
+# Outputs:
+#     - Cleaned state vectors with the same columns, emitted with a delay of `window // 2` messages per aircraft.
+#     - Counters of the corrections applied (`StreamingSafetyChecker.stats`).
+#
+# Additional Comments:
+#     - Checks applied to every message:
+#         1. Duplicated or out-of-order messages (timestamp not after the previous one of the aircraft) are dropped.
+#         2. Range checks: latitude [-90, 90], longitude [-180, 180], altitude [0, max_altitude] and groundspeed
+#            [0, max_groundspeed], in the units of `traffic` (ft and kts); invalid values are replaced with NaN.
+#         3. Repeated positions (same latitude and longitude as the previous message) are replaced with NaN.
+#         4. Spikes: Hampel test of the message against the median / MAD of its ring buffer (the same settings as
+#            `hampel_settings` in `air_traffic_cleaning.py`); spikes are replaced with the window median.
+#     - Each message is decided once `window // 2` newer messages of the same aircraft have arrived, so the latency
+#       is bounded by that number of messages; `flush` emits the pending messages at the end of the stream or for
+#       aircraft that stopped reporting.
+# ===============================================================================================================
+
+import math
+from collections import deque
+from statistics import median
+
+import pandas as pd
+
+from air_traffic_cleaning import hampel_settings
+
+
+class StreamingSafetyChecker:
+    """
+    Online validator of ADS-B state vectors with a ring buffer per aircraft.
+
+    Args:
+        window (int): Length of the ring buffer of each aircraft (odd number of messages).
+        max_altitude (float): Highest plausible altitude in ft (unit of the state vectors of `traffic`); 14 km by
+            default.
+        max_groundspeed (float): Highest plausible groundspeed in kts.
+        spike_settings (dict): Attribute -> (window, n_sigmas, min_deviation); only the last two values are used,
+            the window being the ring buffer. Defaults to `hampel_settings`.
+        max_idle (float): Seconds without messages after which an aircraft is flushed by `flush_idle`.
+    """
+
+    def __init__(self, window=5, max_altitude=14e+3 / 0.3048, max_groundspeed=900, spike_settings=None, max_idle=600):
+        self.window = window
+        self.delay = window // 2
+        self.max_altitude = max_altitude
+        self.max_groundspeed = max_groundspeed
+        self.spike_settings = hampel_settings if spike_settings is None else spike_settings
+        self.max_idle = pd.Timedelta(seconds=max_idle)
+
+        # icao24 -> ring buffer of messages, number of messages not emitted yet, last timestamp and raw position
+        self.buffers = {}
+        self.pending = {}
+        self.last_time = {}
+        self.last_position = {}
+
+        self.stats = {
+            "messages": 0,
+            "emitted": 0,
+            "dropped_duplicates": 0,
+            "invalid_position": 0,
+            "invalid_altitude": 0,
+            "invalid_groundspeed": 0,
+            "repeated_position": 0,
+            "spikes": 0,
+        }
+
+    def process(self, message):
+        """
+        Validates one state vector and returns the messages whose check is complete.
+
+        Args:
+            message (dict): State vector of one aircraft.
+
+        Returns:
+            list: Cleaned state vectors (dicts) ready to be written, possibly empty.
+        """
+        self.stats["messages"] += 1
+        icao24 = message["icao24"]
+        message = dict(message)
+        message["timestamp"] = pd.Timestamp(message["timestamp"])
+
+        # Duplicated or out-of-order message
+        last_time = self.last_time.get(icao24)
+        if last_time is not None and message["timestamp"] <= last_time:
+            self.stats["dropped_duplicates"] += 1
+            return []
+        self.last_time[icao24] = message["timestamp"]
+
+        # Repeated position compared to the previous message of the aircraft (raw values, so that a frozen
+        # transponder keeps being detected)
+        position = (message["latitude"], message["longitude"])
+        repeated = self.last_position.get(icao24) == position
+        self.last_position[icao24] = position
+
+        self._check_ranges(message)
+        if repeated:
+            self.stats["repeated_position"] += 1
+            message["latitude"] = math.nan
+            message["longitude"] = math.nan
+
+        buffer = self.buffers.get(icao24)
+        if buffer is None:
+            buffer = self.buffers[icao24] = deque(maxlen=self.window)
+            self.pending[icao24] = 0
+        buffer.append(message)
+        self.pending[icao24] += 1
+
+        # The message in the middle of the window now has `delay` newer messages: decide it
+        if self.pending[icao24] > self.delay:
+            self.pending[icao24] -= 1
+            return [self._emit(buffer, len(buffer) - 1 - self.delay)]
+        return []
+
+    def process_frame(self, df):
+        """
+        Validates the state vectors of a DataFrame in time order and returns the completed ones.
+
+        Args:
+            df (pd.DataFrame): State vectors received in one retrieval interval.
+
+        Returns:
+            pd.DataFrame: Cleaned state vectors ready to be written (same columns as `df`).
+        """
+        emitted = []
+        for message in df.sort_values(by="timestamp", kind="stable").to_dict("records"):
+            emitted.extend(self.process(message))
+        return pd.DataFrame(emitted, columns=df.columns)
+
+    def flush(self, icao24_list=None):
+        """
+        Emits the pending messages of the given aircraft (all of them by default) and clears their buffers.
+
+        Args:
+            icao24_list (list): Aircraft to flush; None flushes every aircraft.
+
+        Returns:
+            list: Cleaned state vectors (dicts).
+        """
+        if icao24_list is None:
+            icao24_list = list(self.buffers)
+
+        emitted = []
+        for icao24 in icao24_list:
+            buffer = self.buffers.pop(icao24)
+            pending = self.pending.pop(icao24)
+            self.last_time.pop(icao24, None)
+            self.last_position.pop(icao24, None)
+            for index in range(len(buffer) - pending, len(buffer)):
+                emitted.append(self._emit(buffer, index))
+        return emitted
+
+    def flush_idle(self, now):
+        """
+        Emits the pending messages of the aircraft without messages for more than `max_idle`.
+
+        Args:
+            now (pd.Timestamp): Current time of the stream (e.g. end of the retrieval interval).
+
+        Returns:
+            list: Cleaned state vectors (dicts).
+        """
+        now = pd.Timestamp(now)
+        idle = [icao24 for icao24, last_time in self.last_time.items() if now - last_time > self.max_idle]
+        return self.flush(idle)
+
+    def _check_ranges(self, message):
+        """
+        Replaces the out-of-range values of a message with NaN (missing values are left untouched).
+        """
+        latitude, longitude = message["latitude"], message["longitude"]
+        if latitude > 90 or latitude < -90 or longitude > 180 or longitude < -180:
+            self.stats["invalid_position"] += 1
+            message["latitude"] = math.nan
+            message["longitude"] = math.nan
+        if message["altitude"] < 0 or message["altitude"] > self.max_altitude:
+            self.stats["invalid_altitude"] += 1
+            message["altitude"] = math.nan
+        if message["groundspeed"] < 0 or message["groundspeed"] > self.max_groundspeed:
+            self.stats["invalid_groundspeed"] += 1
+            message["groundspeed"] = math.nan
+
+    def _emit(self, buffer, index):
+        """
+        Applies the spike test to the message at `index` of the buffer and returns its cleaned copy.
+        """
+        message = dict(buffer[index])
+        for column, (_, n_sigmas, min_deviation) in self.spike_settings.items():
+            value = message.get(column)
+            if value is None or math.isnan(value):
+                continue
+            window = [item[column] for item in buffer if not math.isnan(item[column])]
+            if len(window) < 3:
+                continue
+            center = median(window)
+            mad = median([abs(item - center) for item in window])
+            if abs(value - center) > max(n_sigmas * 1.4826 * mad, min_deviation):
+                self.stats["spikes"] += 1
+                message[column] = center
+        self.stats["emitted"] += 1
+        return message
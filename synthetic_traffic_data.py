@@ -0,0 +1,206 @@
+# ===============================================================================================================
+# Author: Wesley Gonçalves da Silva - IST1105271
+# Purpose:
+#     This module generates deterministic synthetic ADS-B trajectories with the same schema as the OpenSky data
+#     handled by this project, so that the cleaning pipeline can be exercised and benchmarked without access to
+#     the private OpenSky dumps.
+#
+# Inputs:
+#     - Number of flights, sampling period and random seed.
+#     - Fractions of injected anomalies: altitude/vertical rate/groundspeed spikes, position freezes, duplicated
+#       rows and multi-km gaps.
+#
+# Outputs:
+#     - A pandas DataFrame with the columns:
+#       ['icao24', 'callsign', 'flight_id', 'timestamp', 'latitude', 'longitude', 'altitude', 'vertical_rate',
+#        'groundspeed', 'heading']
+#     - Optionally, the anomaly-free ground truth aligned on ('flight_id', 'timestamp') with the labels of the
+#       injected anomalies, used to score the cleaning methods.
+#
+# Additional Comments:
+#     - Units follow the checks in `air_traffic_safety_checks.py`: altitude in meters (0 - 14 km), vertical rate in
+#       ft/min, groundspeed in knots and heading in degrees.
+#     - Each flight follows a climb / cruise / descent profile on a slowly turning constant-speed track.
+#     - The same seed always produces the same DataFrame.
+#     - Everything is built with vectorized NumPy operations, so 10^7 rows are generated in a few seconds.
+# ===============================================================================================================
+
+import numpy as np
+import pandas as pd
+
+# Conversion factors
+KNOTS_TO_MPS = 0.514444
+MPS_TO_FTMIN = 196.850394
+METERS_PER_DEGREE = 111320.0
+
+# Default region of the generated traffic (lon_min, lat_min, lon_max, lat_max)
+default_bounds = (-11, 25, 33, 53)
+
+
+def generate_synthetic_traffic(n_flights=100, sample_rate=5, duration_range=(30, 180), bounds=default_bounds,
+                               start="2025-01-01T00:00:00", spike_fraction=0.002, freeze_fraction=0.002,
+                               duplicate_fraction=0.001, gap_fraction=0.0005, gap_km=60, seed=0,
+                               return_truth=False):
+    """
+    Generates a deterministic set of synthetic flights with injected data quality issues.
+
+    Args:
+        n_flights (int): Number of flights to generate.
+        sample_rate (float): Seconds between two consecutive state vectors of a flight.
+        duration_range (tuple): Minimum and maximum flight duration in minutes.
+        bounds (tuple): Area of the departure positions as (lon_min, lat_min, lon_max, lat_max).
+        start (str): Earliest departure time; departures are spread over the following 24 hours.
+        spike_fraction (float): Fraction of rows with a spike in altitude, vertical_rate or groundspeed.
+        freeze_fraction (float): Fraction of rows starting a frozen (repeated) position of 2 to 5 samples.
+        duplicate_fraction (float): Fraction of rows duplicated verbatim.
+        gap_fraction (float): Fraction of rows starting a gap in the data.
+        gap_km (float): Minimum length of each gap, in kilometers.
+        seed (int): Seed of the random number generator.
+        return_truth (bool): Whether the anomaly-free values should also be returned.
+
+    Returns:
+        pd.DataFrame: The synthetic state vectors sorted by 'flight_id' and 'timestamp'.
+        pd.DataFrame (optional): The ground truth, with the clean values of every generated sample and the boolean
+            columns 'spike' and 'freeze' flagging the injected anomalies. Only returned when `return_truth` is True.
+    """
+    rng = np.random.default_rng(seed)
+    lon_min, lat_min, lon_max, lat_max = bounds
+
+    # Per-flight parameters
+    n_samples = (rng.uniform(*duration_range, n_flights) * 60 / sample_rate).astype(np.int64) + 1
+    departure = pd.Timestamp(start).value + rng.integers(0, 86400, n_flights) * 10**9
+    lat0 = rng.uniform(lat_min, lat_max, n_flights)
+    lon0 = rng.uniform(lon_min, lon_max, n_flights)
+    heading0 = rng.uniform(0, 360, n_flights)
+    turn_rate = rng.normal(0, 0.002, n_flights)                 # deg/s
+    cruise_speed = rng.uniform(380, 490, n_flights)             # kts
+    cruise_altitude = rng.uniform(9000, 12500, n_flights)       # m
+    initial_altitude = rng.uniform(1500, 3000, n_flights)       # m (data above 5000 ft only)
+    climb_rate = rng.uniform(8, 15, n_flights)                  # m/s
+    descent_rate = rng.uniform(6, 12, n_flights)                # m/s
+
+    # Row -> flight mapping and time since the first sample of each flight
+    total = int(n_samples.sum())
+    flight = np.repeat(np.arange(n_flights), n_samples)
+    first_row = np.cumsum(n_samples) - n_samples
+    elapsed = (np.arange(total) - first_row[flight]) * float(sample_rate)
+    duration = (n_samples[flight] - 1) * float(sample_rate)
+
+    # Climb / cruise / descent profile
+    altitude = np.minimum.reduce([
+        initial_altitude[flight] + climb_rate[flight] * elapsed,
+        cruise_altitude[flight],
+        initial_altitude[flight] + descent_rate[flight] * (duration - elapsed),
+    ])
+    vertical_rate = np.gradient(altitude) / sample_rate
+    vertical_rate[first_row] = (altitude[first_row + 1] - altitude[first_row]) / sample_rate
+    last_row = first_row + n_samples - 1
+    vertical_rate[last_row] = (altitude[last_row] - altitude[last_row - 1]) / sample_rate
+    vertical_rate *= MPS_TO_FTMIN
+
+    # Speed reduced during the climb and descent, with a small oscillation around the cruise value
+    cruise_share = np.clip((altitude - initial_altitude[flight]) / (cruise_altitude[flight] - initial_altitude[flight]), 0, 1)
+    groundspeed = cruise_speed[flight] * (0.6 + 0.4 * cruise_share) + 5 * np.sin(elapsed / 600 + flight)
+    heading = (heading0[flight] + turn_rate[flight] * elapsed) % 360
+
+    # Dead reckoning of the positions
+    step = groundspeed * KNOTS_TO_MPS * sample_rate
+    heading_rad = np.radians(heading)
+    dlat = step * np.cos(heading_rad) / METERS_PER_DEGREE
+    dlat[first_row] = 0.0
+    latitude = np.cumsum(dlat)
+    latitude += lat0[flight] - latitude[first_row][flight]
+    latitude = np.clip(latitude, -89.0, 89.0)
+    dlon = step * np.sin(heading_rad) / (METERS_PER_DEGREE * np.cos(np.radians(latitude)))
+    dlon[first_row] = 0.0
+    longitude = np.cumsum(dlon)
+    longitude += lon0[flight] - longitude[first_row][flight]
+    longitude = (longitude + 180) % 360 - 180
+
+    # Identifiers are built once per flight and broadcast with object arrays (cheap pointer copies)
+    icao24 = np.array([f"{value:06x}" for value in rng.integers(0x300000, 0x4fffff, n_flights)], dtype=object)
+    callsign = np.array([f"SYN{value:04d}" for value in range(n_flights)], dtype=object)
+    flight_id = np.array([f"{value}_{index:03d}" for index, value in enumerate(callsign)], dtype=object)
+    timestamp = (departure[flight] + (elapsed * 10**9).astype(np.int64)).astype("datetime64[ns]")
+
+    truth = pd.DataFrame({
+        "icao24":           icao24[flight],
+        "callsign":         callsign[flight],
+        "flight_id":        flight_id[flight],
+        "timestamp":        pd.DatetimeIndex(timestamp).tz_localize("UTC"),
+        "latitude":         latitude,
+        "longitude":        longitude,
+        "altitude":         altitude,
+        "vertical_rate":    vertical_rate,
+        "groundspeed":      groundspeed,
+        "heading":          heading,
+    })
+    df = truth.copy()
+
+    # Spikes: large excursions in one of the kinematic attributes
+    spike = np.zeros(total, dtype=bool)
+    spike_rows = rng.choice(total, int(spike_fraction * total), replace=False)
+    spike[spike_rows] = True
+    spike_columns = rng.integers(0, 3, len(spike_rows))
+    spike_sign = rng.choice([-1.0, 1.0], len(spike_rows))
+    for code, (column, magnitude) in enumerate([("altitude", 3000.0), ("vertical_rate", 6000.0), ("groundspeed", 250.0)]):
+        rows = spike_rows[spike_columns == code]
+        values = df[column].to_numpy(copy=True)
+        values[rows] += spike_sign[spike_columns == code] * magnitude * rng.uniform(0.5, 1.5, len(rows))
+        df[column] = values
+
+    # Position freezes: the transponder keeps reporting the previous position for 2 to 5 samples
+    freeze = np.zeros(total, dtype=bool)
+    freeze_start = rng.choice(total, int(freeze_fraction * total), replace=False)
+    freeze_length = rng.integers(2, 6, len(freeze_start))
+    offsets = np.arange(1, 6)[None, :]
+    freeze_rows = np.minimum(freeze_start[:, None] + offsets, total - 1)
+    # Only the first freeze_length samples after the start, within the same flight
+    valid = (offsets <= freeze_length[:, None]) & (flight[freeze_rows] == flight[freeze_start][:, None])
+    freeze[freeze_rows[valid]] = True
+    # Each frozen row repeats the last non-frozen position before it
+    anchor = np.where(freeze, 0, np.arange(total))
+    anchor = np.maximum.accumulate(anchor)
+    for column in ("latitude", "longitude"):
+        values = df[column].to_numpy(copy=True)
+        values[freeze] = values[anchor[freeze]]
+        df[column] = values
+
+    # Gaps: remove consecutive samples covering at least gap_km
+    keep = np.ones(total, dtype=bool)
+    gap_start = rng.choice(total, int(gap_fraction * total), replace=False)
+    gap_rows_needed = np.ceil(gap_km * 1000 / (groundspeed[gap_start] * KNOTS_TO_MPS * sample_rate)).astype(np.int64)
+    for row, length in zip(gap_start, gap_rows_needed):
+        # Keep the first and last sample of the flight so that the gap is internal
+        stop = min(row + length, last_row[flight[row]])
+        if row > first_row[flight[row]] and stop > row:
+            keep[row:stop] = False
+    df = df[keep]
+
+    # Duplicates: exact copies of existing rows
+    duplicate_rows = rng.choice(len(df), int(duplicate_fraction * len(df)), replace=False)
+    df = pd.concat([df, df.iloc[duplicate_rows]])
+    df = df.sort_values(by=["flight_id", "timestamp"], kind="stable").reset_index(drop=True)
+
+    if return_truth:
+        truth["spike"] = spike
+        truth["freeze"] = freeze
+        return df, truth
+
+    return df
+
+
+def rows_to_flights(n_rows, sample_rate=5, duration_range=(30, 180)):
+    """
+    Estimates the number of flights needed to generate approximately `n_rows` state vectors.
+
+    Args:
+        n_rows (int): Target number of rows.
+        sample_rate (float): Seconds between two consecutive state vectors of a flight.
+        duration_range (tuple): Minimum and maximum flight duration in minutes.
+
+    Returns:
+        int: Number of flights to pass to `generate_synthetic_traffic`.
+    """
+    mean_samples = np.mean(duration_range) * 60 / sample_rate + 1
+    return max(1, int(round(n_rows / mean_samples)))
@@ -0,0 +1,257 @@
+# ===============================================================================================================
+# Author: Wesley Gonçalves da Silva - IST1105271
+# Purpose:
+#     This module aggregates millions of state vectors into traffic density grids, for region-wide views of all
+#     flights at once (e.g. AREA_1 ... AREA_6) where drawing one line per flight_id does not scale. The positions
+#     are binned in one vectorized pass per chunk into a longitude/latitude grid, optionally split in altitude
+#     and hour-of-day layers, and rendered as a heatmap on a Cartopy map.
+#
+# Inputs:
+#     - DataFrames or CSV files with 'longitude' and 'latitude' (and 'altitude' / 'timestamp', or 'time' in the
+#       checked files, when altitude or hour layers are used).
+#     - Grid resolution in degrees and, optionally, the edges of the altitude and hour-of-day layers.
+#
+# Outputs:
+#     - `TrafficDensity` objects holding the partial sums (number of samples per cell) in tiles, which can be
+#       merged across files or days and saved to / loaded from `.npz` files.
+#     - 2D density grids over any extent and heatmaps drawn on GeoAxes (`plot_density`).
+#
+# Additional Comments:
+#     - The grid is aligned to (-180, -90) for every resolution, so grids computed separately (other days, other
+#       areas) have the same cells and are merged by adding the tiles.
+#     - Only the tiles touched by at least one sample are stored (`tile_size` x `tile_size` cells each), so a
+#       fine global grid over a few areas stays small in memory.
+#     - Samples outside [-180, 180) x [-90, 90] or with missing positions are ignored. Samples outside the
+#       altitude or hour edges are ignored when those layers are used.
+#     - The altitude edges are in the unit of the data: ft for the files of `traffic` and the checked files.
+#     - With a constant sampling period (e.g. 5 s after resampling), the counts are proportional to the flight
+#       time spent in each cell.
+# ===============================================================================================================
+
+import numpy as np
+import pandas as pd
+import matplotlib.colors as mcolors
+
+# Cells per side of a tile
+tile_size = 64
+
+# Time columns of the hour layers, by preference (raw state vectors, checked files)
+time_columns = ("timestamp", "time")
+
+
+def _time_column(columns):
+    """
+    Returns the time column among the given columns.
+    """
+    for column in time_columns:
+        if column in columns:
+            return column
+    raise KeyError(f"No time column ({', '.join(time_columns)}) for the hour layers")
+
+
+class TrafficDensity:
+    """
+    Tiled partial sums of the number of samples per grid cell.
+
+    Args:
+        resolution (float): Cell size in degrees.
+        altitude_edges (list): Edges of the altitude layers (None for a single layer).
+        hour_edges (list): Edges of the hour-of-day layers, e.g. [0, 6, 12, 18, 24] (None for a single layer).
+    """
+
+    def __init__(self, resolution=0.25, altitude_edges=None, hour_edges=None):
+        self.resolution = float(resolution)
+        self.altitude_edges = None if altitude_edges is None else np.asarray(altitude_edges, dtype=float)
+        self.hour_edges = None if hour_edges is None else np.asarray(hour_edges, dtype=float)
+        self.tiles = {}   # (tile row, tile column) -> counts with shape (altitude layers, hour layers, tile_size, tile_size)
+
+    @property
+    def layers(self):
+        """
+        Returns the number of (altitude, hour) layers.
+        """
+        n_altitude = 1 if self.altitude_edges is None else len(self.altitude_edges) - 1
+        n_hour = 1 if self.hour_edges is None else len(self.hour_edges) - 1
+        return n_altitude, n_hour
+
+    def _layer_indices(self, df, valid):
+        """
+        Returns the altitude and hour layer of every sample, updating the mask of the valid samples.
+        """
+        altitude_layer = np.zeros(len(df), dtype=np.int64)
+        hour_layer = np.zeros(len(df), dtype=np.int64)
+
+        if self.altitude_edges is not None:
+            altitude_layer = np.searchsorted(self.altitude_edges, df["altitude"].to_numpy(dtype=float), side="right") - 1
+            valid &= (altitude_layer >= 0) & (altitude_layer < len(self.altitude_edges) - 1)
+
+        if self.hour_edges is not None:
+            timestamps = pd.to_datetime(df[_time_column(df.columns)], utc=True, format="ISO8601")
+            hours = (timestamps.dt.hour + timestamps.dt.minute / 60 + timestamps.dt.second / 3600).to_numpy(dtype=float)
+            hour_layer = np.searchsorted(self.hour_edges, hours, side="right") - 1
+            valid &= (hour_layer >= 0) & (hour_layer < len(self.hour_edges) - 1) & ~np.isnan(hours)
+
+        return altitude_layer, hour_layer
+
+    def add(self, df, weights=None):
+        """
+        Adds the samples of a DataFrame to the grid.
+
+        Args:
+            df (pd.DataFrame): Samples with 'longitude' and 'latitude' (and 'altitude' / 'timestamp' or 'time' if
+                needed).
+            weights (array-like): Weight of every sample (e.g. seconds represented); defaults to 1.
+        """
+        longitude = df["longitude"].to_numpy(dtype=float)
+        latitude = df["latitude"].to_numpy(dtype=float)
+        valid = (longitude >= -180) & (longitude < 180) & (latitude >= -90) & (latitude <= 90)
+
+        altitude_layer, hour_layer = self._layer_indices(df, valid)
+        if not valid.any():
+            return
+
+        # Global cell indices, aligned to (-180, -90)
+        column = np.floor((longitude[valid] + 180) / self.resolution).astype(np.int64)
+        row = np.minimum(np.floor((latitude[valid] + 90) / self.resolution).astype(np.int64),
+                         int(np.ceil(180 / self.resolution)) - 1)  # latitude 90 belongs to the last row
+        n_altitude, n_hour = self.layers
+        layer = altitude_layer[valid] * n_hour + hour_layer[valid]
+
+        # One bincount over all (tile, layer, cell) combinations
+        tile_keys = (row // tile_size) * (1 << 32) + column // tile_size
+        unique_keys, tile_index = np.unique(tile_keys, return_inverse=True)
+        cells = tile_size * tile_size
+        flat = ((tile_index * (n_altitude * n_hour) + layer) * cells + (row % tile_size) * tile_size + column % tile_size)
+        counts = np.bincount(flat, weights=None if weights is None else np.asarray(weights, dtype=float)[valid],
+                             minlength=len(unique_keys) * n_altitude * n_hour * cells)
+        counts = counts.reshape(len(unique_keys), n_altitude, n_hour, tile_size, tile_size)
+
+        for key, tile_counts in zip(unique_keys, counts):
+            key = (int(key >> 32), int(key & 0xFFFFFFFF))
+            if key in self.tiles:
+                self.tiles[key] += tile_counts
+            else:
+                self.tiles[key] = tile_counts.astype(float)
+
+    def add_csv(self, path, chunksize=10**6):
+        """
+        Adds the samples of a CSV file, reading only the needed columns in chunks.
+
+        Args:
+            path (str): CSV file.
+            chunksize (int): Number of rows binned at once.
+        """
+        columns = ["longitude", "latitude"]
+        if self.altitude_edges is not None:
+            columns.append("altitude")
+        if self.hour_edges is not None:
+            columns.append(_time_column(pd.read_csv(path, nrows=0).columns))
+        for chunk in pd.read_csv(path, usecols=columns, chunksize=chunksize):
+            self.add(chunk)
+
+    def merge(self, other):
+        """
+        Adds the partial sums of another grid with the same resolution and layers.
+
+        Args:
+            other (TrafficDensity): Grid of other samples (e.g. another day).
+
+        Returns:
+            TrafficDensity: self.
+        """
+        if other.resolution != self.resolution or other.layers != self.layers:
+            raise ValueError("Density grids with different resolutions or layers cannot be merged.")
+        for key, tile_counts in other.tiles.items():
+            if key in self.tiles:
+                self.tiles[key] += tile_counts
+            else:
+                self.tiles[key] = tile_counts.copy()
+        return self
+
+    def to_grid(self, bounds, altitude_layers=None, hour_layers=None):
+        """
+        Assembles the 2D density over an extent, summing the selected layers.
+
+        Args:
+            bounds (tuple): (lon_min, lat_min, lon_max, lat_max) in degrees.
+            altitude_layers (list): Indices of the altitude layers to sum (all by default).
+            hour_layers (list): Indices of the hour layers to sum (all by default).
+
+        Returns:
+            tuple: (grid with shape (rows, columns), south to north; extent [lon_min, lon_max, lat_min, lat_max]
+                of the cells)
+        """
+        lon_min, lat_min, lon_max, lat_max = bounds
+        column_start = int(np.floor((lon_min + 180) / self.resolution))
+        column_stop = int(np.ceil((lon_max + 180) / self.resolution))
+        row_start = int(np.floor((lat_min + 90) / self.resolution))
+        row_stop = int(np.ceil((lat_max + 90) / self.resolution))
+
+        grid = np.zeros((row_stop - row_start, column_stop - column_start))
+        for (tile_row, tile_column), tile_counts in self.tiles.items():
+            # Overlap of the tile with the requested cells
+            top, left = tile_row * tile_size, tile_column * tile_size
+            rows = slice(max(row_start, top), min(row_stop, top + tile_size))
+            columns = slice(max(column_start, left), min(column_stop, left + tile_size))
+            if rows.start >= rows.stop or columns.start >= columns.stop:
+                continue
+
+            counts = tile_counts
+            if altitude_layers is not None:
+                counts = counts[list(altitude_layers)]
+            if hour_layers is not None:
+                counts = counts[:, list(hour_layers)]
+            grid[rows.start - row_start:rows.stop - row_start, columns.start - column_start:columns.stop - column_start] += \
+                counts.sum(axis=(0, 1))[rows.start - top:rows.stop - top, columns.start - left:columns.stop - left]
+
+        extent = [column_start * self.resolution - 180, column_stop * self.resolution - 180,
+                  row_start * self.resolution - 90, row_stop * self.resolution - 90]
+        return grid, extent
+
+    def save(self, path):
+        """
+        Saves the partial sums to a `.npz` file.
+        """
+        keys = np.array(list(self.tiles), dtype=np.int64).reshape(-1, 2)
+        counts = np.stack(list(self.tiles.values())) if self.tiles else np.zeros((0, *self.layers, tile_size, tile_size))
+        np.savez_compressed(path, resolution=self.resolution, keys=keys, counts=counts,
+                            altitude_edges=np.array([]) if self.altitude_edges is None else self.altitude_edges,
+                            hour_edges=np.array([]) if self.hour_edges is None else self.hour_edges)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads the partial sums saved by `save`.
+        """
+        with np.load(path) as data:
+            density = cls(float(data["resolution"]),
+                          data["altitude_edges"] if len(data["altitude_edges"]) else None,
+                          data["hour_edges"] if len(data["hour_edges"]) else None)
+            density.tiles = {(int(row), int(column)): counts for (row, column), counts in zip(data["keys"], data["counts"])}
+        return density
+
+
+def plot_density(ax, grid, extent, log_scale=True, cmap="inferno", alpha=0.9):
+    """
+    Draws a density grid as a heatmap (empty cells are transparent).
+
+    Args:
+        ax (matplotlib.axes.Axes): Map axes (GeoAxes or plain axes in degrees).
+        grid (np.ndarray): Density from `TrafficDensity.to_grid`.
+        extent (list): Extent returned with the grid.
+        log_scale (bool): Logarithmic color scale (traffic densities span several orders of magnitude).
+        cmap (str): Colormap.
+        alpha (float): Opacity of the heatmap.
+
+    Returns:
+        matplotlib.image.AxesImage: The heatmap, e.g. for `plt.colorbar`.
+    """
+    masked = np.ma.masked_less_equal(grid, 0)
+    norm = mcolors.LogNorm(vmin=max(masked.min(), 1), vmax=max(masked.max(), 1)) if log_scale and masked.count() else None
+
+    kwargs = {}
+    if hasattr(ax, "projection"):
+        import cartopy.crs as ccrs
+        kwargs["transform"] = ccrs.PlateCarree()
+    return ax.imshow(masked, extent=extent, origin="lower", cmap=cmap, norm=norm, alpha=alpha,
+                     interpolation="nearest", zorder=1, **kwargs)
@@ -0,0 +1,103 @@
+# ===============================================================================================================
+# Author: Wesley Gonçalves da Silva - IST1105271
+# Purpose:
+#     This script draws a heatmap of all the traffic retrieved over the areas AREA_1 ... AREA_6 (see
+#     `historical_traffic_data.py`), aggregating the positions of every flight in a density grid
+#     (`traffic_density.py`) instead of plotting one line per flight_id.
+#
+# Inputs:
+#     - Daily CSV files with longitude, latitude (and altitude / timestamp for the optional layers) in
+#       `input_files`.
+#     - Grid resolution, optional altitude and hour-of-day layers, and the layers to draw.
+#
+# Outputs:
+#     - One partial sum file per input file in `partial_dir` (reused on the next runs).
+#     - "traffic_density.pdf" and "traffic_density.png" with the heatmap on the map of the areas.
+#
+# Additional Comments:
+#     - The partial sums of each day are merged by adding their tiles, so adding a day only bins that day.
+#       Delete `partial_dir` after changing the resolution or the layers.
+#     - The counts are numbers of samples per cell (proportional to the flight time with a constant sampling
+#       period) and are drawn with a logarithmic color scale.
+# ===============================================================================================================
+
+import os
+
+import matplotlib.pyplot as plt
+import matplotlib.patches as mpatches
+import cartopy.crs as ccrs
+
+from basemap_cache import add_basemap
+from traffic_density import TrafficDensity, plot_density
+from airspace_regions import opensky_areas
+
+# Enable LaTeX font rendering
+plt.rcParams.update({
+    "text.usetex": False,
+    "font.family": "serif",
+    "font.size": 12
+})
+
+# Daily files to aggregate
+input_files = [
+    "C:\\Users\\wesle\\OneDrive\\Documentos\\Master\\traffic\\code1\\air_traffic_output_data_2024-01-01_checked.csv",
+    "C:\\Users\\wesle\\OneDrive\\Documentos\\Master\\traffic\\code1\\air_traffic_output_data_2024-01-02_checked.csv",
+]
+
+# Geographical areas of historical_traffic_data.py | (lon_min, lat_min, lon_max, lat_max)
+areas = opensky_areas
+
+# Grid settings
+resolution = 0.1                                    # degrees
+altitude_edges = None                               # e.g. [0, 10000, 25000, 45000] (ft)
+hour_edges = None                                   # e.g. [0, 6, 12, 18, 24] (UTC)
+altitude_layers = None                              # layers drawn (None for all)
+hour_layers = None
+partial_dir = "density_partials"
+
+# Extent covering all the areas
+bounds = (min(area[0] for area in areas.values()), min(area[1] for area in areas.values()),
+          max(area[2] for area in areas.values()), max(area[3] for area in areas.values()))
+
+# Bin each file once and merge the partial sums of all files
+os.makedirs(partial_dir, exist_ok=True)
+density = TrafficDensity(resolution, altitude_edges, hour_edges)
+for input_file in input_files:
+    partial_file = os.path.join(partial_dir, os.path.splitext(os.path.basename(input_file))[0] + "_density.npz")
+    if os.path.exists(partial_file):
+        partial = TrafficDensity.load(partial_file)
+    else:
+        print(f"Binning {input_file}")
+        partial = TrafficDensity(resolution, altitude_edges, hour_edges)
+        partial.add_csv(input_file)
+        partial.save(partial_file)
+    density.merge(partial)
+
+grid, extent = density.to_grid(bounds, altitude_layers, hour_layers)
+
+# Set up the map with Cartopy
+fig = plt.figure(figsize=(15, 10))
+ax = plt.axes(projection=ccrs.PlateCarree())
+map_extent = [bounds[0], bounds[2], bounds[1], bounds[3]]
+add_basemap(ax, map_extent, style="simple")
+
+heatmap = plot_density(ax, grid, extent)
+plt.colorbar(heatmap, ax=ax, shrink=0.7, label="Samples per cell")
+
+# Outline of each area
+for area, (lon_min, lat_min, lon_max, lat_max) in areas.items():
+    ax.add_patch(mpatches.Rectangle((lon_min, lat_min), lon_max - lon_min, lat_max - lat_min, fill=False,
+                                    edgecolor="black", linewidth=0.8, transform=ccrs.PlateCarree(), zorder=2))
+    ax.text((lon_min + lon_max) / 2, (lat_min + lat_max) / 2, area, transform=ccrs.PlateCarree(),
+            ha="center", va="center", fontsize=9, zorder=3)
+ax.set_extent(map_extent, crs=ccrs.PlateCarree())
+
+# Add gridlines using Cartopy's GeoAxes
+gl = ax.gridlines(draw_labels=True, linewidth=0.2, color="gray", alpha=0.5)
+gl.top_labels = False  # Disable labels on the top
+gl.right_labels = False  # Disable labels on the right
+
+plt.title(rf"Traffic Density ({resolution}$^\circ$ cells)")
+plt.savefig("traffic_density.pdf", format="pdf")  # Save as PDF
+plt.savefig("traffic_density.png", format="png", dpi=300)  # Save as PNG with high resolution
+plt.show()
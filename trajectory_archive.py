@@ -0,0 +1,363 @@
+# ===============================================================================================================
+# Author: Wesley Gonçalves da Silva - IST1105271
+# Purpose:
+#     This script archives daily state vector files (raw or cleaned CSV) in a compact binary format, and reads
+#     them back as DataFrames:
+#         - Timestamps are stored as integer milliseconds, delta-encoded.
+#         - Positions and flight parameters are quantized to fixed-point integers (precision below) and
+#           delta-encoded, so consecutive samples give small integers.
+#         - The samples are grouped in one compressed block per flight (byte-shuffled, zlib), with an index of the
+#           blocks at the start of the file, so a single flight is read without decoding the rest of the file.
+#     Encoding and decoding are vectorized over all the rows; only the compression runs per block.
+#
+# Inputs:
+#     - CSV file or DataFrame of state vectors with 'flight_id' and a time column.
+#
+# Outputs:
+#     - "<file>.trz" archive (see `write_archive`), and DataFrames read from it (`read_archive`,
+#       `TrajectoryArchive.read_flight`).
+#
+# Additional Comments:
+#     - Precision of the stored values (`column_precision`, the largest error is half of it):
+#         latitude / longitude: 1e-5 deg (about 1.1 m) | altitude / geoaltitude: 0.1 ft | groundspeed: 0.1 kts
+#         vertical_rate: 1 ft/min | heading / track: 0.01 deg | time columns: 1 ms
+#       Other float columns are stored without loss. Integer, boolean and text columns are stored exactly (text as
+#       codes into the list of categories of the file).
+#     - Missing values are kept (validity bitmask per block for the columns with missing values).
+#     - The rows are returned sorted by flight and time, not in the order of the original file.
+# ===============================================================================================================
+
+import json
+import os
+import struct
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+input_file = "C:\\Users\\wesle\\OneDrive\\Documentos\\Master\\traffic\\code1\\air_traffic_output_data_2024-01-01_checked.csv"
+
+# Fixed-point precision of the quantized columns (units of the column: deg, ft, kts, ft/min)
+column_precision = {
+    "latitude":         1e-5,
+    "longitude":        1e-5,
+    "altitude":         0.1,
+    "geoaltitude":      0.1,
+    "groundspeed":      0.1,
+    "vertical_rate":    1.0,
+    "heading":          0.01,
+    "track":            0.01,
+}
+time_precision = "ms"
+compression_level = 6
+
+_magic = b"TRZ1"
+_header = struct.Struct("<4sQ")                     # magic, length of the metadata
+
+
+def _shuffle(values):
+    """
+    Returns the bytes of an integer array grouped by byte position (all low bytes first), which compresses better.
+    """
+    return np.ascontiguousarray(values.view(np.uint8).reshape(-1, values.itemsize).T).tobytes()
+
+
+def _unshuffle(data, dtype, count):
+    """
+    Inverse of `_shuffle`.
+    """
+    dtype = np.dtype(dtype)
+    return np.frombuffer(data, dtype=np.uint8).reshape(dtype.itemsize, count).T.copy().view(dtype).ravel()
+
+
+def _integer_values(values, description):
+    """
+    Converts a column to int64 values and a validity mask, filling the description of its encoding.
+    """
+    if description["kind"] == "time":
+        times = pd.to_datetime(values, utc=True)
+        valid = times.notna().to_numpy()
+        integers = times.dt.tz_localize(None).to_numpy(dtype=f"datetime64[{time_precision}]").view(np.int64)
+    elif description["kind"] == "category":
+        codes, categories = pd.factorize(values.astype("object"))
+        description["categories"] = [str(category) for category in categories]
+        valid = codes >= 0
+        integers = codes.astype(np.int64)
+    elif description["kind"] == "quantized":
+        floats = values.to_numpy(dtype=float)
+        valid = np.isfinite(floats)
+        integers = np.round(np.where(valid, floats, 0) * description["scale"]).astype(np.int64)
+    elif description["kind"] == "float":
+        floats = values.to_numpy(dtype=float)
+        valid = ~np.isnan(floats)
+        integers = floats.view(np.int64)
+    else:
+        valid = values.notna().to_numpy()
+        integers = values.fillna(0).to_numpy().astype(np.int64)
+
+    # Missing values repeat the previous valid value, keeping the deltas small
+    if not valid.all():
+        positions = np.maximum.accumulate(np.where(valid, np.arange(len(valid)), -1))
+        integers = np.where(positions >= 0, integers[np.maximum(positions, 0)], 0)
+    return integers, valid
+
+
+def _smallest_dtype(values):
+    """
+    Returns the smallest signed integer dtype holding all the values.
+    """
+    if not len(values):
+        return "int8"
+    largest = max(int(values.max()), -int(values.min()) - 1)
+    for dtype in ("int8", "int16", "int32"):
+        if largest <= np.iinfo(dtype).max:
+            return dtype
+    return "int64"
+
+
+def write_archive(df, path, group_column="flight_id", time_column="timestamp", precision=None):
+    """
+    Writes state vectors to an archive file.
+
+    Args:
+        df (pd.DataFrame): State vectors.
+        path (str): Archive file.
+        group_column (str): Column identifying the flights (one block per flight).
+        time_column (str): Time column used to order the samples of each flight.
+        precision (dict): Column -> precision overriding `column_precision`.
+    """
+    precision = dict(column_precision, **(precision or {}))
+    flight_codes, flight_ids = pd.factorize(df[group_column].astype(str), sort=True)
+    times = pd.to_datetime(df[time_column], utc=True).to_numpy(dtype="datetime64[ns]")
+    order = np.lexsort((times, flight_codes))
+    df = df.iloc[order]
+    flight_codes = flight_codes[order]
+    starts = np.flatnonzero(np.concatenate(([True], flight_codes[1:] != flight_codes[:-1]))) if len(df) else \
+        np.array([], dtype=np.int64)
+    lengths = np.diff(np.append(starts, len(df)))
+
+    # Columns as integers, delta-encoded within every flight (the first sample of a flight keeps its value)
+    columns, encoded = [], []
+    for column in df.columns:
+        if column == group_column:
+            continue
+        values = df[column]
+        if pd.api.types.is_datetime64_any_dtype(values) or column == time_column:
+            description = {"kind": "time"}
+        elif pd.api.types.is_bool_dtype(values):
+            description = {"kind": "bool"}
+        elif pd.api.types.is_integer_dtype(values):
+            description = {"kind": "int"}
+        elif pd.api.types.is_float_dtype(values):
+            description = ({"kind": "quantized", "scale": round(1 / precision[column], 9)} if column in precision
+                           else {"kind": "float"})
+        else:
+            description = {"kind": "category"}
+
+        integers, valid = _integer_values(values, description)
+        if description["kind"] != "float":
+            deltas = np.diff(integers, prepend=0)
+            deltas[starts] = integers[starts]
+            integers = deltas.astype(_smallest_dtype(deltas))
+        description.update(name=column, dtype=integers.dtype.name, nullable=bool(not valid.all()))
+        columns.append(description)
+        encoded.append((integers, valid))
+
+    # One compressed block per flight: the values of every column, followed by its validity bits if needed
+    blocks = []
+    for start, length in zip(starts, lengths):
+        parts = []
+        for description, (integers, valid) in zip(columns, encoded):
+            parts.append(_shuffle(integers[start:start + length]))
+            if description["nullable"]:
+                parts.append(np.packbits(valid[start:start + length]).tobytes())
+        blocks.append(zlib.compress(b"".join(parts), compression_level))
+
+    metadata = json.dumps({
+        "group_column": group_column,
+        "time_column": time_column,
+        "columns": columns,
+        "flights": [str(flight_id) for flight_id in flight_ids[flight_codes[starts]]],
+        "rows": lengths.tolist(),
+        "sizes": [len(block) for block in blocks],
+    }).encode("utf-8")
+    with open(path, "wb") as file:
+        file.write(_header.pack(_magic, len(metadata)))
+        file.write(metadata)
+        for block in blocks:
+            file.write(block)
+
+
+def archive_csv(path, output=None, group_column="flight_id", time_column=None, precision=None):
+    """
+    Converts a CSV file of state vectors into an archive.
+
+    Args:
+        path (str): CSV file.
+        output (str): Archive file; defaults to the CSV file name with the ".trz" extension.
+        group_column (str): Column identifying the flights.
+        time_column (str): Time column; "time" if present (checked files), else "timestamp".
+        precision (dict): Column -> precision overriding `column_precision`.
+
+    Returns:
+        str: Archive file.
+    """
+    output = output or f"{path.rsplit('.', 1)[0]}.trz"
+    df = pd.read_csv(path, low_memory=False)
+    time_column = time_column or ("time" if "time" in df.columns else "timestamp")
+    for column in (time_column, "timestamp", "time"):
+        if column in df.columns:
+            df[column] = pd.to_datetime(df[column], utc=True, format="ISO8601")
+    write_archive(df, output, group_column, time_column, precision)
+    return output
+
+
+class TrajectoryArchive:
+    """
+    Reader of an archive written by `write_archive`, with random access to the flights.
+
+    Args:
+        path (str): Archive file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            magic, length = _header.unpack(file.read(_header.size))
+            if magic != _magic:
+                raise ValueError(f"{path} is not a trajectory archive.")
+            self.metadata = json.loads(file.read(length).decode("utf-8"))
+        self.columns = [description["name"] for description in self.metadata["columns"]]
+        self.flight_ids = self.metadata["flights"]
+        self.rows = np.array(self.metadata["rows"], dtype=np.int64)
+        sizes = np.array(self.metadata["sizes"], dtype=np.int64)
+        self.offsets = _header.size + length + np.concatenate(([0], np.cumsum(sizes)))
+        self._positions = {flight_id: position for position, flight_id in enumerate(self.flight_ids)}
+
+    def _parse(self, data, count, parts):
+        """
+        Splits a decompressed block into the integer values and validity masks of its columns.
+        """
+        position = 0
+        for index, description in enumerate(self.metadata["columns"]):
+            size = count * np.dtype(description["dtype"]).itemsize
+            values = _unshuffle(data[position:position + size], description["dtype"], count)
+            position += size
+            valid = None
+            if description["nullable"]:
+                valid_size = (count + 7) // 8
+                valid = np.unpackbits(np.frombuffer(data[position:position + valid_size], dtype=np.uint8),
+                                      count=count).astype(bool)
+                position += valid_size
+            parts[index].append((values, valid))
+
+    def _decode(self, description, values, valid, starts, lengths):
+        """
+        Rebuilds a column from its delta-encoded values.
+        """
+        if description["kind"] != "float":
+            # Cumulative sums restarting at every flight
+            totals = np.cumsum(values.astype(np.int64))
+            values = totals - np.repeat(totals[starts] - values[starts], lengths)
+
+        kind = description["kind"]
+        if kind == "time":
+            result = pd.to_datetime(values.astype(f"datetime64[{time_precision}]").astype("datetime64[ns]")) \
+                .tz_localize("UTC")
+            return result.where(valid, pd.NaT) if valid is not None else result
+        if kind == "category":
+            categories = np.array(description["categories"] + [np.nan], dtype=object)
+            return categories[np.where(valid, values, -1) if valid is not None else values]
+        if kind == "quantized":
+            result = values / description["scale"]
+        elif kind == "float":
+            result = values.view(np.float64)
+        elif kind == "bool":
+            result = values.astype(bool)
+        else:
+            result = values
+        if valid is not None:
+            result = np.where(valid, result, np.nan)
+        return result
+
+    def _read(self, positions, columns=None):
+        """
+        Decodes the blocks of the given flights.
+        """
+        counts = self.rows[positions]
+        parts = [[] for _ in self.metadata["columns"]]
+        with open(self.path, "rb") as file:
+            for position in positions:
+                file.seek(self.offsets[position])
+                data = zlib.decompress(file.read(self.offsets[position + 1] - self.offsets[position]))
+                self._parse(data, self.rows[position], parts)
+
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64)
+        group = np.repeat(np.array(self.flight_ids, dtype=object)[positions], counts)
+        data = {self.metadata["group_column"]: group}
+        for description, column_parts in zip(self.metadata["columns"], parts):
+            if columns is not None and description["name"] not in columns:
+                continue
+            values = np.concatenate([values for values, valid in column_parts]) if column_parts else np.array([], dtype=np.int64)
+            valid = (np.concatenate([valid for values, valid in column_parts])
+                     if description["nullable"] and column_parts else None)
+            data[description["name"]] = self._decode(description, values, valid, starts, counts)
+        return pd.DataFrame(data)
+
+    def read_flight(self, flight_id, columns=None):
+        """
+        Reads a single flight (only its block is read and decompressed).
+
+        Args:
+            flight_id (str): Flight ID.
+            columns (list): Columns to return (all by default).
+
+        Returns:
+            pd.DataFrame: Samples of the flight in time order.
+        """
+        return self._read(np.array([self._positions[flight_id]]), columns)
+
+    def read(self, flight_ids=None, columns=None):
+        """
+        Reads several or all flights.
+
+        Args:
+            flight_ids (list): Flight IDs (all by default).
+            columns (list): Columns to return (all by default).
+
+        Returns:
+            pd.DataFrame: Samples sorted by flight and time.
+        """
+        if flight_ids is None:
+            positions = np.arange(len(self.flight_ids))
+        else:
+            positions = np.array([self._positions[flight_id] for flight_id in flight_ids], dtype=np.int64)
+        return self._read(positions, columns)
+
+
+def read_archive(path, columns=None):
+    """
+    Reads all the state vectors of an archive.
+
+    Args:
+        path (str): Archive file.
+        columns (list): Columns to return (all by default).
+
+    Returns:
+        pd.DataFrame: Samples sorted by flight and time.
+    """
+    return TrajectoryArchive(path).read(columns=columns)
+
+
+if __name__ == "__main__":
+    start = time.time()
+    archive_file = archive_csv(input_file)
+    print(f"Archived {input_file} to {archive_file} in {time.time() - start:.1f} s")
+
+    csv_size, archive_size = os.path.getsize(input_file), os.path.getsize(archive_file)
+    print(f"Size: {csv_size / 1e6:.1f} MB (CSV) -> {archive_size / 1e6:.1f} MB ({csv_size / archive_size:.1f}x smaller)")
+
+    start = time.time()
+    df = read_archive(archive_file)
+    print(f"Decoded {len(df)} samples in {time.time() - start:.2f} s")
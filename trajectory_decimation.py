@@ -0,0 +1,207 @@
+# ===============================================================================================================
+# Author: Wesley Gonçalves da Silva - IST1105271
+# Purpose:
+#     This module reduces the number of vertices of trajectories and time series before they are drawn with
+#     `plt.plot`, so that multi-day overlays of dense (1-5 s) ADS-B data render quickly and produce small PDFs
+#     while looking the same at the output resolution.
+#         - Map tracks: Ramer-Douglas-Peucker (RDP), keeping every vertex that deviates more than a tolerance
+#           from the simplified line.
+#         - Time series: Largest-Triangle-Three-Buckets (LTTB), keeping a fixed number of points per pixel of
+#           the axes width.
+#
+# Inputs:
+#     - The axes where the data will be drawn (limits or map extent already set) and the output DPI, from
+#       which the tolerances are expressed in pixels.
+#     - Longitude/latitude of a track, or x/y values of a time series (x may be datetime).
+#
+# Outputs:
+#     - The decimated arrays, ready to be passed to `plt.plot`.
+#
+# Additional Comments:
+#     - Missing values (NaN) are kept, so that the gaps drawn by matplotlib remain; each continuous run of valid
+#       samples is decimated separately.
+#     - On Cartopy GeoAxes the track is simplified in the projected coordinates of the map, so the tolerance is
+#       the deviation seen in the figure.
+#     - With the default tolerance of half a pixel, the decimated line differs from the full line by less than
+#       the width of a pixel of the saved image.
+# ===============================================================================================================
+
+import numpy as np
+
+# Default resolution of the saved figures and tolerances in pixels
+output_dpi = 300
+track_tolerance_px = 0.5
+points_per_pixel = 2
+
+
+def _finite_runs(valid):
+    """
+    Returns the (start, stop) indices of the continuous runs of True values.
+    """
+    edges = np.diff(np.concatenate(([0], valid.astype(np.int8), [0])))
+    return zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1))
+
+
+def rdp_mask(x, y, tolerance):
+    """
+    Ramer-Douglas-Peucker simplification of a polyline.
+
+    Args:
+        x (np.ndarray): x coordinates (without NaN).
+        y (np.ndarray): y coordinates (without NaN).
+        tolerance (float): Maximum distance between a removed vertex and the simplified line (units of x and y).
+
+    Returns:
+        np.ndarray: Boolean mask of the vertices kept (always includes the first and last ones).
+    """
+    n = len(x)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return keep
+    keep[0] = keep[-1] = True
+
+    # Iterative version of the recursion: segments still to be simplified
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        px, py = x[start + 1:end] - x[start], y[start + 1:end] - y[start]
+        length = np.hypot(dx, dy)
+        if length > 0:
+            distances = np.abs(dx * py - dy * px) / length  # Distance to the line through start and end
+        else:
+            distances = np.hypot(px, py)                    # Closed segment: distance to the start point
+
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            index = start + 1 + farthest
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+
+    return keep
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling of a time series.
+
+    Args:
+        x (np.ndarray): Increasing x values (without NaN).
+        y (np.ndarray): y values (without NaN).
+        n_out (int): Number of points to keep.
+
+    Returns:
+        np.ndarray: Indices of the points kept, in increasing order.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # The first and last points are always kept; the others are split in n_out - 2 buckets
+    bucket_edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+
+    previous = 0
+    for bucket in range(n_out - 2):
+        start, stop = bucket_edges[bucket], bucket_edges[bucket + 1]
+
+        # Average point of the next bucket (the last point for the last bucket)
+        next_start, next_stop = stop, bucket_edges[bucket + 2] if bucket + 2 < len(bucket_edges) else n
+        next_x, next_y = x[next_start:next_stop].mean(), y[next_start:next_stop].mean()
+
+        # Point of the bucket forming the largest triangle with the previous point and the next average
+        areas = np.abs((x[previous] - next_x) * (y[start:stop] - y[previous])
+                       - (x[previous] - x[start:stop]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        indices[bucket + 1] = previous
+
+    return indices
+
+
+def axes_size_px(ax, dpi=None):
+    """
+    Returns the (width, height) of an axes in pixels of the saved figure.
+    """
+    bbox = ax.get_window_extent()
+    scale = (dpi or output_dpi) / ax.figure.dpi
+    return bbox.width * scale, bbox.height * scale
+
+
+def decimate_track(ax, longitude, latitude, tolerance_px=None, dpi=None):
+    """
+    Simplifies a track drawn on a map with RDP, using a tolerance in pixels of the saved figure.
+
+    Args:
+        ax (matplotlib.axes.Axes): Map axes with its extent already set (GeoAxes or plain axes in degrees).
+        longitude (array-like): Longitudes of the track.
+        latitude (array-like): Latitudes of the track.
+        tolerance_px (float): Maximum deviation in pixels; defaults to `track_tolerance_px`.
+        dpi (float): Resolution of the saved figure; defaults to `output_dpi`.
+
+    Returns:
+        tuple: (longitude, latitude) arrays of the vertices kept.
+    """
+    longitude = np.asarray(longitude, dtype=float)
+    latitude = np.asarray(latitude, dtype=float)
+
+    # Coordinates as drawn in the axes (projected on GeoAxes)
+    projection = getattr(ax, "projection", None)
+    if projection is not None:
+        import cartopy.crs as ccrs
+        projected = projection.transform_points(ccrs.PlateCarree(), longitude, latitude)
+        x, y = projected[:, 0], projected[:, 1]
+    else:
+        x, y = longitude, latitude
+
+    # Size of a pixel in data units (the smallest of both directions)
+    width_px, height_px = axes_size_px(ax, dpi)
+    x_min, x_max = ax.get_xlim()
+    y_min, y_max = ax.get_ylim()
+    pixel = min(abs(x_max - x_min) / width_px, abs(y_max - y_min) / height_px)
+    tolerance = (track_tolerance_px if tolerance_px is None else tolerance_px) * pixel
+
+    valid = np.isfinite(x) & np.isfinite(y)
+    keep = ~valid  # NaN are kept to preserve the gaps
+    for start, stop in _finite_runs(valid):
+        keep[start:stop] = rdp_mask(x[start:stop], y[start:stop], tolerance)
+
+    return longitude[keep], latitude[keep]
+
+
+def decimate_series(ax, x, y, n_per_pixel=None, dpi=None):
+    """
+    Downsamples a time series with LTTB to a number of points proportional to the axes width in pixels.
+
+    Args:
+        ax (matplotlib.axes.Axes): Axes where the series will be drawn.
+        x (array-like): Increasing x values (numbers or datetimes).
+        y (array-like): y values.
+        n_per_pixel (float): Points kept per pixel of the axes width; defaults to `points_per_pixel`.
+        dpi (float): Resolution of the saved figure; defaults to `output_dpi`.
+
+    Returns:
+        tuple: (x, y) arrays of the points kept, with the original types.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    x_numeric = x.astype("datetime64[ns]").astype(np.int64).astype(float) if np.issubdtype(x.dtype, np.datetime64) \
+        else x.astype(float)
+
+    width_px, _ = axes_size_px(ax, dpi)
+    n_out = int(width_px * (points_per_pixel if n_per_pixel is None else n_per_pixel))
+    if len(x) <= n_out:
+        return x, y
+
+    valid = np.isfinite(x_numeric) & np.isfinite(y)
+    keep = ~valid  # NaN are kept to preserve the gaps
+    for start, stop in _finite_runs(valid):
+        # Budget of each run proportional to its length
+        run_out = max(int(np.ceil(n_out * (stop - start) / len(x))), 3)
+        keep[start + lttb_indices(x_numeric[start:stop], y[start:stop], run_out)] = True
+
+    return x[keep], y[keep]
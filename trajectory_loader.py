@@ -0,0 +1,287 @@
+# ===============================================================================================================
+# Author: Wesley Gonçalves da Silva - IST1105271
+# Purpose:
+#     This module loads only the state vectors of the flights being analysed (callsign, icao24, flight_id and/or
+#     time window predicates) from the large daily files, instead of reading the whole file and filtering it
+#     afterwards (`df[df["callsign"] == "AMX690"]` in `air_traffic_analysis.py`).
+#         - CSV files: a sidecar index (`<file>.idx`) is built once with, for every block of the file, its byte
+#           range, its time range and the callsigns / icao24 / flight IDs it contains. A query reads and parses
+#           only the blocks that can contain matching rows.
+#         - Parquet files: the predicates are passed as `filters` to `pd.read_parquet`, which skips the row groups
+#           using their statistics.
+#
+# Inputs:
+#     - Path of a CSV or Parquet file of state vectors.
+#     - Predicates: callsign, icao24, flight_id (a value or a list of values), start and stop timestamps, and the
+#       list of columns to return.
+#
+# Outputs:
+#     - DataFrame with only the matching rows and the requested columns.
+#     - `<file>.idx` next to each CSV file (rebuilt automatically when the file changes).
+#
+# Additional Comments:
+#     - The key columns are read as strings, so identifiers such as an all-digit icao24 keep their leading zeros.
+#     - The index is most selective on files sorted by flight (e.g. the processed samples); on files sorted by time
+#       a flight is spread over the blocks of its time span, which the time predicates then narrow down.
+#     - Fields with embedded line breaks are not supported (the blocks are split at line boundaries).
+#     - Parquet files require `pyarrow` (or `fastparquet`), as for any `pd.read_parquet` call.
+#     - Bytes and blocks read / skipped by the CSV queries are counted by `pipeline_telemetry.py`.
+#     - In the compact mode (`compact_dtypes.py`) every block is converted to the compact dtypes as it is read; the
+#       time column is then returned as datetime (UTC) instead of text.
+# ===============================================================================================================
+
+import io
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+import compact_dtypes
+from compact_dtypes import compact_frame, concat_frames
+from pipeline_telemetry import count
+
+# Size of the blocks of the CSV index in bytes
+index_block_size = 8 * 1024 * 1024
+
+# Columns that can be used as predicates, and the time column
+key_columns = ("callsign", "icao24", "flight_id")
+time_column = "timestamp"
+
+# Loaders already opened in this process: path -> TrajectoryLoader
+_loaders = {}
+
+
+def _utc(value):
+    """
+    Returns a timestamp as a UTC pd.Timestamp (naive values are taken as UTC; None stays None).
+    """
+    if value is None:
+        return None
+    value = pd.Timestamp(value)
+    return value.tz_localize("UTC") if value.tz is None else value.tz_convert("UTC")
+
+
+def _as_list(values):
+    """
+    Returns a predicate value as a list of strings (None stays None).
+    """
+    if values is None:
+        return None
+    if isinstance(values, str):
+        return [values]
+    return [str(value) for value in values]
+
+
+class TrajectoryLoader:
+    """
+    Reader of a CSV file of state vectors with a block index for predicate pushdown.
+
+    Args:
+        path (str): CSV file with a header line.
+        block_size (int): Approximate size of the indexed blocks in bytes.
+    """
+
+    def __init__(self, path, block_size=None):
+        self.path = path
+        self.index_path = f"{path}.idx"
+        self.block_size = block_size or index_block_size
+        self.index = None
+
+    def _signature(self):
+        """
+        Returns (size, modification time) identifying the current version of the file.
+        """
+        status = os.stat(self.path)
+        return status.st_size, status.st_mtime_ns
+
+    def _read_block(self, file, start, stop, usecols=None):
+        """
+        Parses the bytes [start, stop) of the file, which start and end at line boundaries.
+        """
+        file.seek(start)
+        data = self.index["header"] + file.read(stop - start)
+        dtype = {column: str for column in self.index["keys"]}
+        return pd.read_csv(io.BytesIO(data), usecols=usecols, dtype=dtype, low_memory=False)
+
+    def build_index(self):
+        """
+        Scans the file once and writes the block index.
+        """
+        with open(self.path, "rb") as file:
+            header = file.readline()
+            columns = pd.read_csv(io.BytesIO(header)).columns.tolist()
+            self.index = {
+                "signature": self._signature(),
+                "header": header,
+                "columns": columns,
+                "keys": [column for column in key_columns if column in columns],
+                "time": time_column if time_column in columns else None,
+                "blocks": [],                                           # (start, stop, time min, time max)
+                "values": {column: {} for column in key_columns if column in columns},  # value -> block numbers
+            }
+            usecols = self.index["keys"] + ([time_column] if self.index["time"] else [])
+
+            size = os.fstat(file.fileno()).st_size
+            start = file.tell()
+            while True:
+                # Block of about block_size bytes, extended to the end of its last line
+                file.seek(start + self.block_size)
+                file.readline()
+                stop = min(file.tell(), size)
+                if stop <= start:
+                    break
+
+                block = self._read_block(file, start, stop, usecols)
+                number = len(self.index["blocks"])
+                time_min = time_max = None
+                if self.index["time"] and len(block):
+                    times = pd.to_datetime(block[time_column], utc=True, errors="coerce", format="ISO8601")
+                    time_min, time_max = times.min(), times.max()
+                self.index["blocks"].append((start, stop, time_min, time_max))
+
+                for column in self.index["keys"]:
+                    values = self.index["values"][column]
+                    for value in block[column].dropna().unique():
+                        values.setdefault(value, []).append(number)
+                start = stop
+
+        with open(self.index_path, "wb") as file:
+            pickle.dump(self.index, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load_index(self):
+        """
+        Loads the block index, building it if it is missing or out of date.
+        """
+        if self.index is not None and self.index["signature"] == self._signature():
+            return
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "rb") as file:
+                self.index = pickle.load(file)
+            if self.index["signature"] == self._signature():
+                return
+        self.build_index()
+
+    def candidate_blocks(self, predicates, start=None, stop=None):
+        """
+        Returns the numbers of the blocks that may contain rows matching all predicates.
+
+        Args:
+            predicates (dict): Key column -> list of values.
+            start (pd.Timestamp): Beginning of the time window (inclusive).
+            stop (pd.Timestamp): End of the time window (inclusive).
+
+        Returns:
+            list: Sorted block numbers.
+        """
+        blocks = set(range(len(self.index["blocks"])))
+        for column, values in predicates.items():
+            if column not in self.index["values"]:
+                raise KeyError(f"Column '{column}' is not in {self.path}.")
+            matching = set()
+            for value in values:
+                matching.update(self.index["values"][column].get(value, ()))
+            blocks &= matching
+
+        if self.index["time"]:
+            # Blocks without valid times are always read
+            time_ranges = {number: self.index["blocks"][number][2:] for number in blocks}
+            blocks = {number for number, (time_min, time_max) in time_ranges.items()
+                      if pd.isna(time_min)
+                      or ((start is None or time_max >= start) and (stop is None or time_min <= stop))}
+        return sorted(blocks)
+
+    def load(self, callsign=None, icao24=None, flight_id=None, start=None, stop=None, columns=None):
+        """
+        Reads the rows matching all the given predicates.
+
+        Args:
+            callsign (str or list): Callsign(s) to keep.
+            icao24 (str or list): Transponder address(es) to keep.
+            flight_id (str or list): Flight ID(s) to keep.
+            start (str or pd.Timestamp): Beginning of the time window (inclusive, UTC if naive).
+            stop (str or pd.Timestamp): End of the time window (inclusive, UTC if naive).
+            columns (list): Columns to return (all by default).
+
+        Returns:
+            pd.DataFrame: Matching rows, in file order.
+        """
+        self.load_index()
+        predicates = {column: _as_list(values) for column, values in
+                      (("callsign", callsign), ("icao24", icao24), ("flight_id", flight_id)) if values is not None}
+        start, stop = _utc(start), _utc(stop)
+
+        # Columns parsed: the requested ones and those needed to evaluate the predicates
+        usecols = None
+        if columns is not None:
+            usecols = list(dict.fromkeys(list(columns) + list(predicates)
+                                         + ([time_column] if (start is not None or stop is not None) else [])))
+
+        blocks = self.candidate_blocks(predicates, start, stop)
+
+        # Merge contiguous blocks into single reads
+        ranges = []
+        for number in blocks:
+            block_start, block_stop = self.index["blocks"][number][:2]
+            if ranges and ranges[-1][1] == block_start:
+                ranges[-1][1] = block_stop
+            else:
+                ranges.append([block_start, block_stop])
+
+        count("loader_blocks_read", len(blocks))
+        count("loader_blocks_skipped", len(self.index["blocks"]) - len(blocks))
+
+        parts = []
+        with open(self.path, "rb") as file:
+            for range_start, range_stop in ranges:
+                part = self._read_block(file, range_start, range_stop, usecols)
+                count("bytes_read", range_stop - range_start)
+
+                # Exact row filtering within the blocks
+                mask = np.ones(len(part), dtype=bool)
+                for column, values in predicates.items():
+                    mask &= part[column].isin(values).to_numpy()
+                if start is not None or stop is not None:
+                    times = pd.to_datetime(part[time_column], utc=True, errors="coerce", format="ISO8601")
+                    if start is not None:
+                        mask &= (times >= start).to_numpy()
+                    if stop is not None:
+                        mask &= (times <= stop).to_numpy()
+                parts.append(compact_frame(part[mask]) if compact_dtypes.compact_mode else part[mask])
+
+        if not parts:
+            empty_columns = self.index["columns"] if columns is None else list(columns)
+            return pd.DataFrame(columns=empty_columns)
+        df = concat_frames(parts)
+        return df if columns is None else df[list(columns)]
+
+
+def load_trajectories(path, callsign=None, icao24=None, flight_id=None, start=None, stop=None, columns=None):
+    """
+    Reads the state vectors matching the given predicates from a CSV or Parquet file.
+
+    Args:
+        path (str): CSV or Parquet file.
+        callsign (str or list): Callsign(s) to keep.
+        icao24 (str or list): Transponder address(es) to keep.
+        flight_id (str or list): Flight ID(s) to keep.
+        start (str or pd.Timestamp): Beginning of the time window (inclusive, UTC if naive).
+        stop (str or pd.Timestamp): End of the time window (inclusive, UTC if naive).
+        columns (list): Columns to return (all by default).
+
+    Returns:
+        pd.DataFrame: Matching rows.
+    """
+    if path.endswith(".parquet"):
+        filters = [(column, "in", _as_list(values)) for column, values in
+                   (("callsign", callsign), ("icao24", icao24), ("flight_id", flight_id)) if values is not None]
+        if start is not None:
+            filters.append((time_column, ">=", _utc(start)))
+        if stop is not None:
+            filters.append((time_column, "<=", _utc(stop)))
+        return pd.read_parquet(path, columns=columns, filters=filters or None)
+
+    loader = _loaders.get(path)
+    if loader is None:
+        loader = _loaders[path] = TrajectoryLoader(path)
+    return loader.load(callsign, icao24, flight_id, start, stop, columns)
@@ -2,7 +2,10 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import cartopy.crs as ccrs
-import cartopy.feature as cfeature
+
+from basemap_cache import add_basemap
+from trajectory_decimation import decimate_track, decimate_series
+from trajectory_loader import load_trajectories
 
 # Enable LaTeX font rendering
 plt.rcParams.update({
@@ -13,7 +16,7 @@ plt.rcParams.update({
 
 # Load the data
 input_file = "C:\\Users\\wesle\\OneDrive\\Documentos\\Master\\traffic\\code1\\traffic\\2024-01-01_2024-01-07_raw_data_AIC129_checked.csv"
-df = pd.read_csv(input_file)
+df = load_trajectories(input_file, columns=['timestamp', 'longitude', 'latitude', 'altitude', 'vertical_rate', 'groundspeed'])
 
 # Ensure the timestamp column is in datetime format
 df['timestamp'] = pd.to_datetime(df['timestamp'])
@@ -24,17 +27,14 @@ df['day'] = df['timestamp'].dt.date
 # Set up the map with Cartopy
 plt.figure(figsize=(15, 10))
 ax = plt.axes(projection=ccrs.PlateCarree())
-ax.set_extent([-15, 50, 30, 65], crs=ccrs.PlateCarree())  # Adjust bounds as necessary
 
-# Add map features for better fidelity
-ax.add_feature(cfeature.LAND, color="lightgray")
-ax.add_feature(cfeature.COASTLINE, linewidth=0.5)
-ax.add_feature(cfeature.BORDERS, linestyle=":")
+# Add map features for better fidelity (rasterized once per extent and reused from the basemap cache)
+add_basemap(ax, [-15, 50, 30, 65], style="simple")  # Adjust bounds as necessary
 
 # Group the data by day and plot each day's flight paths
 grouped = df.groupby('day')
 for day, group in grouped:
-    plt.plot(group['longitude'], group['latitude'], label=f"Day {day}", 
+    plt.plot(*decimate_track(ax, group['longitude'], group['latitude']), label=f"Day {day}", 
              transform=ccrs.PlateCarree(), alpha=1, linewidth=1)
 
 # Add gridlines using Cartopy's GeoAxes
@@ -57,7 +57,7 @@ plt.show()
 plt.figure(figsize=(10, 6))
 for day, group in grouped:
     group['seconds_since_midnight'] = group['timestamp'].dt.hour * 3600 + group['timestamp'].dt.minute * 60 + group['timestamp'].dt.second
-    plt.plot(group['seconds_since_midnight'], group['altitude'], label=f"Day {day}",marker='.')
+    plt.plot(*decimate_series(plt.gca(), group['seconds_since_midnight'], group['altitude']), label=f"Day {day}",marker='.')
 
 # find_peaks scipy
 
@@ -83,7 +83,7 @@ plt.show()
 plt.figure(figsize=(10, 6))
 for day, group in grouped:
     group['seconds_since_midnight'] = group['timestamp'].dt.hour * 3600 + group['timestamp'].dt.minute * 60 + group['timestamp'].dt.second
-    plt.plot(group['seconds_since_midnight'], group['vertical_rate'], label=f"Day {day}")
+    plt.plot(*decimate_series(plt.gca(), group['seconds_since_midnight'], group['vertical_rate']), label=f"Day {day}")
 
 plt.xlabel(r"Time (Seconds since midnight)")
 plt.ylabel(r"Vertical Rate [m/s]")
@@ -105,7 +105,7 @@ plt.show()
 plt.figure(figsize=(10, 6))
 for day, group in grouped:
     group['seconds_since_midnight'] = group['timestamp'].dt.hour * 3600 + group['timestamp'].dt.minute * 60 + group['timestamp'].dt.second
-    plt.plot(group['seconds_since_midnight'], group['vertical_rate'], label=f"Day {day}")
+    plt.plot(*decimate_series(plt.gca(), group['seconds_since_midnight'], group['vertical_rate']), label=f"Day {day}")
 
 plt.xlabel(r"Time (Seconds since midnight)")
 plt.ylabel(r"Vertical Rate [m/s]")
@@ -0,0 +1,337 @@
+# ===============================================================================================================
+# Author: Wesley Gonçalves da Silva - IST1105271
+# Purpose:
+#     This script finds the flights most similar to a given flight among thousands of trajectories (e.g. a month
+#     of checked data), instead of selecting the routes by callsign (`00_flight_selection.py`) or overlaying the
+#     same callsign across days (`trajectory_plot.py`):
+#         1. Every trajectory is resampled to `n_points` points equally spaced along its track (all flights at
+#            once), as 3D Earth-centred coordinates in km plus the weighted altitude, and stored in a single array.
+#         2. The similarity is the dynamic time warping (DTW) distance between the resampled trajectories, with a
+#            Sakoe-Chiba band of `band` points.
+#         3. A query is answered without computing the DTW for every flight:
+#              - coarse spatial index: a KD-tree of the first and last points of the flights returns the flights
+#                whose endpoints are close enough to beat the current k-th best distance (the distance between
+#                the endpoints is a lower bound of the DTW);
+#              - LB_Keogh: the distance of every candidate to the envelope of the query within the band, computed
+#                for all candidates at once, removes the candidates that cannot beat the k-th best distance;
+#              - the exact DTW runs only on the remaining candidates, in increasing order of their lower bound,
+#                vectorized over the candidates and in parallel over processes for large batches.
+#
+# Inputs:
+#     - Checked CSV file with flight_id, time, latitude, longitude and altitude, or a saved index (`index_file`).
+#     - Flight ID of the query and number of neighbours.
+#
+# Outputs:
+#     - "<index_file>.npz": flight IDs and resampled trajectories (built on the first run).
+#     - DataFrame / console printout of the nearest flights and their DTW distances (km), and the number of flights
+#       remaining after each pruning step.
+#
+# Additional Comments:
+#     - The DTW distance is the square root of the sum of the squared distances (km) of the matched points; it
+#       compares the shape and position of the routes, independently of the speed along them.
+#     - Set `altitude_weight = 0` to compare the horizontal routes only.
+#     - The altitude of the checked files is in feet, as returned by `traffic` (`altitude_in_feet`); it is converted
+#       to km like the horizontal coordinates.
+#     - The pruning is exact: the result is the same as computing the DTW of every flight.
+#     - The `if __name__ == "__main__"` guard is required by the process pool on Windows.
+# ===============================================================================================================
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from compact_dtypes import read_csv_compact
+from pipeline_telemetry import count
+
+input_file = "C:\\Users\\wesle\\OneDrive\\Documentos\\Master\\traffic\\code1\\data\\2025\\2025_01_01-2025_01_14\\2025-01-01_2025-01-14_flight_id_filtered_airframe_checked.csv"
+index_file = "C:\\Users\\wesle\\OneDrive\\Documentos\\Master\\traffic\\code1\\data\\2025\\2025_01_01-2025_01_14\\similarity_index"
+query_flight = None                                 # flight ID of the query (first flight of the index if None)
+neighbours = 10
+
+# Representation and search settings
+n_points = 64                                       # points of the resampled trajectories
+band = 6                                            # Sakoe-Chiba band of the DTW (points)
+altitude_weight = 1.0                               # weight of the altitude (km) against the horizontal position
+altitude_in_feet = True                             # altitude column unit: feet (traffic), False for meters
+batch_size = 2048                                   # candidates per DTW batch
+parallel_batch = 8192                               # batches larger than this are split over processes
+max_workers = None                                  # defaults to the number of CPUs
+
+EARTH_RADIUS = 6371.0                               # km
+FT_TO_M = 0.3048
+
+
+def resample_trajectories(df, points=None, group_column="flight_id", time_column="time", weight=None,
+                          altitude_ft=None):
+    """
+    Resamples all trajectories to the same number of points, equally spaced along their tracks.
+
+    Args:
+        df (pd.DataFrame): Positions with the group, time, 'latitude', 'longitude' and 'altitude' columns.
+        points (int): Points per trajectory; defaults to `n_points`.
+        group_column (str): Flight identifier column.
+        time_column (str): Time column (order of the positions).
+        weight (float): Weight of the altitude; defaults to `altitude_weight`.
+        altitude_ft (bool): Altitude in feet; defaults to `altitude_in_feet`.
+
+    Returns:
+        tuple: (np.ndarray of flight IDs, np.ndarray (flights, points, 4) of x, y, z (km) and weighted altitude (km))
+    """
+    points = points or n_points
+    weight = altitude_weight if weight is None else weight
+    altitude_ft = altitude_in_feet if altitude_ft is None else altitude_ft
+
+    df = df.dropna(subset=["latitude", "longitude", "altitude"])
+    codes, flight_ids = pd.factorize(df[group_column], sort=True)
+    times = pd.to_datetime(df[time_column], utc=True, format="ISO8601").to_numpy(dtype="datetime64[ms]").astype(np.int64)
+    order = np.lexsort((times, codes))
+    codes, times = codes[order], times[order]
+
+    latitude = np.radians(df["latitude"].to_numpy(dtype=np.float64)[order])
+    longitude = np.radians(df["longitude"].to_numpy(dtype=np.float64)[order])
+    altitude = df["altitude"].to_numpy(dtype=np.float64)[order] * (FT_TO_M if altitude_ft else 1.0)
+    values = np.column_stack((EARTH_RADIUS * np.cos(latitude) * np.cos(longitude),
+                              EARTH_RADIUS * np.cos(latitude) * np.sin(longitude),
+                              EARTH_RADIUS * np.sin(latitude),
+                              weight * altitude / 1000.0))
+
+    # Distance along the track from the first position of the flight, as a fraction of the flight length
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    step = np.r_[0.0, np.linalg.norm(np.diff(values[:, :3], axis=0), axis=1)]
+    step[starts] = 0.0
+    along = np.cumsum(step)
+    along -= np.repeat(along[starts], np.diff(np.r_[starts, len(codes)]))
+    length = np.repeat(np.maximum.reduceat(along, starts), np.diff(np.r_[starts, len(codes)]))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        fraction = np.where(length > 0, along / length, 0.0)
+
+    # Flights with at least two distinct positions
+    sizes = np.bincount(codes, minlength=len(flight_ids))
+    valid = (sizes >= 2) & (np.bincount(codes, weights=length > 0, minlength=len(flight_ids)) > 0)
+
+    # Interpolation at the target fractions of every flight: one sorted key (flight code + fraction) for all rows
+    key = 2.0 * codes + fraction
+    targets = np.linspace(0.0, 1.0, points)
+    target_codes = np.repeat(np.flatnonzero(valid), points)
+    target_key = 2.0 * target_codes + np.tile(targets, valid.sum())
+    right = np.searchsorted(key, target_key, side="left")
+    flight_start = np.repeat(starts[valid], points)
+    flight_stop = np.repeat(np.r_[starts, len(codes)][1:][valid], points)
+    right = np.clip(right, flight_start + 1, flight_stop - 1)
+    left = right - 1
+    span = key[right] - key[left]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        share = np.where(span > 0, (target_key - key[left]) / span, 0.0)
+    resampled = values[left] + share[:, None] * (values[right] - values[left])
+
+    count("similarity_flights_resampled", int(valid.sum()))
+    return np.asarray(flight_ids)[valid].astype(str), resampled.reshape(-1, points, 4).astype(np.float32)
+
+
+def envelope(query, width=None):
+    """
+    Returns the lower and upper envelopes of a trajectory within the band (per point and coordinate).
+    """
+    width = band if width is None else width
+    padded = np.pad(query, ((width, width), (0, 0)), mode="edge")
+    windows = np.lib.stride_tricks.sliding_window_view(padded, 2 * width + 1, axis=0)
+    return windows.min(axis=2), windows.max(axis=2)
+
+
+def lb_keogh(query, candidates, width=None):
+    """
+    LB_Keogh lower bound of the DTW distance between a query and many candidates.
+
+    Args:
+        query (np.ndarray): (points, coordinates) trajectory.
+        candidates (np.ndarray): (candidates, points, coordinates) trajectories.
+        width (int): Band of the DTW; defaults to `band`.
+
+    Returns:
+        np.ndarray: Lower bound of the DTW distance of every candidate.
+    """
+    lower, upper = envelope(query, width)
+    excess = np.maximum(candidates - upper, 0.0) + np.maximum(lower - candidates, 0.0)
+    return np.sqrt((excess.astype(np.float64) ** 2).sum(axis=(1, 2)))
+
+
+def dtw_distances(query, candidates, width=None):
+    """
+    DTW distances between a query and many candidates, with a Sakoe-Chiba band (vectorized over the candidates).
+
+    Args:
+        query (np.ndarray): (points, coordinates) trajectory.
+        candidates (np.ndarray): (candidates, points, coordinates) trajectories.
+        width (int): Band of the DTW; defaults to `band`.
+
+    Returns:
+        np.ndarray: DTW distance of every candidate.
+    """
+    width = band if width is None else width
+    size, points = candidates.shape[:2]
+    previous = np.full((size, points + 1), np.inf)
+    previous[:, 0] = 0.0
+    for i in range(points):
+        current = np.full((size, points + 1), np.inf)
+        for j in range(max(0, i - width), min(points, i + width + 1)):
+            cost = ((candidates[:, j].astype(np.float64) - query[i]) ** 2).sum(axis=1)
+            current[:, j + 1] = cost + np.minimum(np.minimum(previous[:, j + 1], previous[:, j]), current[:, j])
+        previous = current
+    return np.sqrt(previous[:, points])
+
+
+def _endpoints(features):
+    """
+    Returns the first and last points of the trajectories as one vector (distance = lower bound of the DTW).
+    """
+    return np.concatenate((features[:, 0], features[:, -1]), axis=1).astype(np.float64)
+
+
+class SimilarityIndex:
+    """
+    Resampled trajectories with the spatial index of their endpoints, for nearest-neighbour DTW queries.
+
+    Args:
+        flight_ids (np.ndarray): Flight IDs.
+        features (np.ndarray): (flights, points, coordinates) resampled trajectories (`resample_trajectories`).
+        width (int): Band of the DTW; defaults to `band`.
+    """
+
+    def __init__(self, flight_ids, features, width=None):
+        self.flight_ids = np.asarray(flight_ids).astype(str)
+        self.features = features
+        self.width = band if width is None else width
+        self.positions = pd.Series(np.arange(len(self.flight_ids)), index=self.flight_ids)
+        self.tree = cKDTree(_endpoints(features))
+        self.last_stats = {}
+
+    @classmethod
+    def from_frame(cls, df, group_column="flight_id", time_column="time", points=None, weight=None, width=None):
+        """
+        Builds the index of the trajectories of a DataFrame.
+        """
+        return cls(*resample_trajectories(df, points, group_column, time_column, weight), width)
+
+    def save(self, path):
+        """
+        Saves the resampled trajectories ("<path>.npz").
+        """
+        np.savez(path, flight_ids=self.flight_ids, features=self.features, width=self.width)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads an index saved by `save`.
+        """
+        with np.load(path if path.endswith(".npz") else f"{path}.npz") as data:
+            return cls(data["flight_ids"], data["features"], int(data["width"]))
+
+    def _distances(self, query, positions, executor, workers):
+        """
+        Exact DTW distances of the given flights (split over the processes for large batches).
+        """
+        if executor is None or len(positions) <= parallel_batch:
+            return dtw_distances(query, self.features[positions], self.width)
+        chunks = np.array_split(positions, workers)
+        futures = [executor.submit(dtw_distances, query, self.features[chunk], self.width) for chunk in chunks]
+        return np.concatenate([future.result() for future in futures])
+
+    def query(self, query, k=None, workers=None, exclude=None):
+        """
+        Returns the k flights nearest to a query trajectory.
+
+        Args:
+            query (str or np.ndarray): Flight ID of the index, or (points, coordinates) resampled trajectory.
+            k (int): Number of neighbours; defaults to `neighbours`.
+            workers (int): Number of processes for the DTW of large batches; 1 runs in the calling process.
+            exclude (list): Flight IDs not to return (the query flight is always excluded).
+
+        Returns:
+            pd.DataFrame: flight_id, distance (DTW, km) and lower bound of the neighbours, nearest first.
+        """
+        k = k or neighbours
+        excluded = set(exclude or [])
+        if isinstance(query, str):
+            excluded.add(query)
+            query = self.features[self.positions[query]]
+        query = np.asarray(query, dtype=np.float64)
+        excluded_positions = self.positions.reindex(list(excluded)).dropna().astype(int).to_numpy()
+        wanted = min(k, len(self.flight_ids) - len(excluded_positions))
+        if wanted <= 0:
+            return pd.DataFrame(columns=["flight_id", "distance", "lower_bound"])
+        query_end = np.concatenate((query[0], query[-1]))
+
+        # Upper bound of the k-th distance: exact DTW of the flights with the nearest endpoints
+        _, seeds = self.tree.query(query_end, k=min(wanted + len(excluded_positions), len(self.flight_ids)))
+        seeds = np.setdiff1d(np.atleast_1d(seeds), excluded_positions)
+        best = dict(zip(seeds, dtw_distances(query, self.features[seeds], self.width)))
+        threshold = np.sort(list(best.values()))[wanted - 1] if len(best) >= wanted else np.inf
+
+        # Coarse spatial index: endpoints within the threshold
+        if np.isfinite(threshold):
+            candidates = np.array(self.tree.query_ball_point(query_end, threshold), dtype=np.int64)
+        else:
+            candidates = np.arange(len(self.flight_ids))
+        candidates = np.setdiff1d(candidates, np.r_[seeds, excluded_positions])
+        spatial = len(candidates)
+
+        # LB_Keogh (with the endpoint bound) for all candidates at once
+        bounds = np.maximum(lb_keogh(query, self.features[candidates], self.width),
+                            np.linalg.norm(_endpoints(self.features[candidates]) - query_end, axis=1))
+        keep = bounds < threshold
+        candidates, bounds = candidates[keep], bounds[keep]
+        order = np.argsort(bounds, kind="stable")
+        candidates, bounds = candidates[order], bounds[order]
+        survivors = len(candidates)
+
+        # Exact DTW in increasing order of the lower bound, stopping when no candidate can beat the threshold
+        computed = len(seeds)
+        workers = workers or max_workers or os.cpu_count()
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 and survivors > parallel_batch else None
+        try:
+            start = 0
+            while start < len(candidates) and bounds[start] < threshold:
+                size = parallel_batch * workers if executor is not None else batch_size
+                stop = min(start + size, int(np.searchsorted(bounds, threshold, side="left")))
+                batch = candidates[start:stop]
+                best.update(zip(batch, self._distances(query, batch, executor, workers)))
+                computed += len(batch)
+                threshold = np.sort(list(best.values()))[wanted - 1]
+                start = stop
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        self.last_stats = {"flights": len(self.flight_ids), "spatial_candidates": spatial,
+                           "lb_survivors": survivors, "dtw_computed": computed}
+        for name, value in self.last_stats.items():
+            count(f"similarity_{name}", value)
+
+        nearest = sorted(best.items(), key=lambda item: item[1])[:wanted]
+        positions = np.array([position for position, _ in nearest], dtype=np.int64)
+        return pd.DataFrame({
+            "flight_id":    self.flight_ids[positions],
+            "distance":     [distance for _, distance in nearest],
+            "lower_bound":  np.maximum(lb_keogh(query, self.features[positions], self.width),
+                                       np.linalg.norm(_endpoints(self.features[positions]) - query_end, axis=1)),
+        })
+
+
+if __name__ == "__main__":
+    if os.path.exists(f"{index_file}.npz"):
+        index = SimilarityIndex.load(index_file)
+    else:
+        df = read_csv_compact(input_file, usecols=["flight_id", "time", "latitude", "longitude", "altitude"])
+        print(f"Processing file: {input_file} ({len(df)} positions)")
+        index = SimilarityIndex.from_frame(df)
+        index.save(index_file)
+        print(f"Similarity index of {len(index.flight_ids)} flights saved to {index_file}.npz")
+
+    flight = query_flight or index.flight_ids[0]
+    result = index.query(flight, neighbours, max_workers)
+    print(f"Flights most similar to {flight}:")
+    print(result.to_string(index=False))
+    print(index.last_stats)
@@ -0,0 +1,170 @@
+# ===============================================================================================================
+# Author: Wesley Gonçalves da Silva - IST1105271
+# Purpose:
+#     This script answers ad-hoc questions on the traffic data with SQL (e.g. "flights of these airframes above
+#     FL300 on these days"), instead of writing a new filtering script such as `00_airframe_selection.py`.
+#     The data is kept as Parquet files partitioned by day, and an embedded DuckDB database (in-process, no server)
+#     exposes them as tables:
+#         - state_vectors: raw state vectors (`historical_traffic_data.py` / `air_traffic_pre_processing.py`).
+#         - trajectories: cleaned trajectories (`_checked.csv` of `air_traffic_safety_checks.py`).
+#       The altitudes of both tables are in ft and the vertical rates in ft/min, as returned by `traffic`.
+#         - crossings, conflicts, stays: derived events (`boundary_crossings.py`, `conflict_detection.py`,
+#           `sector_occupancy.py`).
+#     Every table has a `date` column from its partitions: conditions on `date` skip the files of the other days,
+#     and conditions on the other columns skip row groups using the Parquet statistics. Scans run on all cores.
+#
+# Inputs:
+#     - Daily CSV files or DataFrames to add to the tables (`partition_csv`, `write_partitioned`).
+#     - SQL query (`query`), run on the tables found under `data_root`.
+#
+# Outputs:
+#     - Partitioned tables: "<data_root>/<table directory>/date=YYYY-MM-DD/<part>.parquet".
+#     - DataFrame with the result of the query.
+#
+# Additional Comments:
+#     - Requires `duckdb` and `pyarrow` (Parquet files written by pandas).
+#     - The files are sorted by flight_id and time, so conditions on a flight or an airframe read few row groups.
+#     - Re-adding a day with the same part name replaces its file; several sources of the same day can be added
+#       with different part names.
+#     - Trajectory archives (`trajectory_archive.py`) can be queried as tables with `register_archive`.
+# ===============================================================================================================
+
+import os
+
+import duckdb
+import pandas as pd
+
+from trajectory_archive import read_archive
+
+data_root = "C:\\Users\\wesle\\OneDrive\\Documentos\\Master\\traffic\\code1\\data\\lake"
+
+# Table name -> (directory under data_root, time column giving the partition date)
+tables = {
+    "state_vectors":    ("raw", "timestamp"),
+    "trajectories":     ("checked", "time"),
+    "crossings":        (os.path.join("events", "crossings"), "time"),
+    "conflicts":        (os.path.join("events", "conflicts"), "start"),
+    "stays":            (os.path.join("events", "stays"), "entry"),
+}
+
+# Rows per Parquet row group (unit of the statistics used to skip data)
+row_group_size = 128 * 1024
+
+# Example question: flights of these airframes above FL300 on these days
+example_query = """
+SELECT date, icao24, callsign, flight_id, min(time) AS first_time, max(time) AS last_time,
+       max(altitude) AS max_altitude, count(*) AS samples
+FROM trajectories
+WHERE date BETWEEN DATE '2025-01-01' AND DATE '2025-01-03'
+  AND icao24 IN ('46b8a9', '46b8ad', '3444c3')
+  AND altitude > 30000
+GROUP BY ALL
+ORDER BY date, icao24, first_time
+"""
+
+
+def write_partitioned(df, table, root=None, part="part-0"):
+    """
+    Adds rows to a partitioned table (one Parquet file per day).
+
+    Args:
+        df (pd.DataFrame): Rows to add.
+        table (str): Table name (key of `tables`).
+        root (str): Data directory; defaults to `data_root`.
+        part (str): Name of the file of each day (an existing file with this name is replaced).
+
+    Returns:
+        list: Files written.
+    """
+    directory, time_column = tables[table]
+    directory = os.path.join(root or data_root, directory)
+    df = df.copy()
+    df[time_column] = pd.to_datetime(df[time_column], utc=True, format="ISO8601")
+    sort_columns = [column for column in ("flight_id", "flight_id_a", time_column) if column in df.columns]
+
+    files = []
+    for date, day in df.groupby(df[time_column].dt.strftime("%Y-%m-%d"), sort=True):
+        partition = os.path.join(directory, f"date={date}")
+        os.makedirs(partition, exist_ok=True)
+        file = os.path.join(partition, f"{part}.parquet")
+        day.sort_values(by=sort_columns, kind="stable").to_parquet(file, index=False, row_group_size=row_group_size)
+        files.append(file)
+    return files
+
+
+def partition_csv(path, table, root=None, part=None):
+    """
+    Adds a CSV file to a partitioned table.
+
+    Args:
+        path (str): CSV file.
+        table (str): Table name (key of `tables`).
+        root (str): Data directory; defaults to `data_root`.
+        part (str): Name of the daily files; defaults to the CSV file name.
+
+    Returns:
+        list: Files written.
+    """
+    part = part or os.path.splitext(os.path.basename(path))[0]
+    return write_partitioned(pd.read_csv(path, low_memory=False), table, root, part)
+
+
+def connect(root=None, threads=None):
+    """
+    Opens an in-memory DuckDB database with a view per partitioned table found under the data directory.
+
+    Args:
+        root (str): Data directory; defaults to `data_root`.
+        threads (int): Number of threads of the scans (all cores by default).
+
+    Returns:
+        duckdb.DuckDBPyConnection: Connection with the tables.
+    """
+    connection = duckdb.connect()
+    if threads:
+        connection.execute(f"SET threads = {int(threads)}")
+    for table, (directory, time_column) in tables.items():
+        directory = os.path.join(root or data_root, directory)
+        if not os.path.isdir(directory):
+            continue
+        pattern = os.path.join(directory, "*", "*.parquet").replace("\\", "/").replace("'", "''")
+        connection.execute(f"CREATE VIEW {table} AS SELECT * FROM read_parquet('{pattern}', "
+                           "hive_partitioning = true, hive_types = {'date': DATE}, union_by_name = true)")
+    return connection
+
+
+def register_archive(connection, table, path, columns=None):
+    """
+    Adds a trajectory archive (`trajectory_archive.py`) to a connection as a table.
+
+    Args:
+        connection (duckdb.DuckDBPyConnection): Connection from `connect`.
+        table (str): Table name.
+        path (str): Archive file.
+        columns (list): Columns to decode (all by default).
+    """
+    connection.register(table, read_archive(path, columns))
+
+
+def query(sql, root=None, parameters=None):
+    """
+    Runs a SQL query on the partitioned tables.
+
+    Args:
+        sql (str): Query.
+        root (str): Data directory; defaults to `data_root`.
+        parameters (list or dict): Values of the query parameters (? or $name).
+
+    Returns:
+        pd.DataFrame: Result of the query.
+    """
+    connection = connect(root)
+    try:
+        return connection.execute(sql, parameters).df()
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    result = query(example_query)
+    print(result.to_string())
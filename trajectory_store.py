@@ -0,0 +1,208 @@
+# ===============================================================================================================
+# Author: Wesley Gonçalves da Silva - IST1105271
+# Purpose:
+#     This module stores cleaned trajectories (the `_checked.csv` output of `air_traffic_safety_checks.py`) as one
+#     binary array per column, sorted by flight_id and time, with a flight_id -> (offset, length) index. Opening a
+#     store memory-maps the arrays: a flight is a slice of every array (no copy, no parsing), and iterating over
+#     all flights needs no groupby.
+#
+# Inputs:
+#     - DataFrame (or CSV file) of state vectors with 'flight_id' and a time column.
+#
+# Outputs:
+#     - Store directory with:
+#         - "<column>.npy": values of each column in flight / time order (text columns as int32 category codes).
+#         - "flights.npy" and "offsets.npy": flight IDs and start offsets of their rows (plus the total length).
+#         - "store.json": columns, kinds and categories.
+#
+# Additional Comments:
+#     - Time columns are stored as datetime64[ns] UTC values; `TrajectoryStore.frame` returns them as UTC
+#       timestamps.
+#     - Text columns (callsign, icao24, region...) are stored as codes into the list of categories of store.json
+#       (-1 for missing values).
+#     - `TrajectoryStore.flight` returns read-only views of the memory-mapped arrays; copy them before modifying.
+# ===============================================================================================================
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Name of the metadata file of a store
+store_metadata = "store.json"
+
+
+def write_store(df, directory, group_column="flight_id", time_column="time"):
+    """
+    Writes a DataFrame of state vectors as a trajectory store.
+
+    Args:
+        df (pd.DataFrame): State vectors.
+        directory (str): Store directory (created or overwritten).
+        group_column (str): Column identifying the flights.
+        time_column (str): Time column used to order the samples of each flight.
+    """
+    os.makedirs(directory, exist_ok=True)
+    times = pd.to_datetime(df[time_column], utc=True)
+    flight_ids = df[group_column].astype(str).to_numpy()
+    order = np.lexsort((times.to_numpy(dtype="datetime64[ns]"), flight_ids))
+    flight_ids = flight_ids[order]
+
+    # Flight index: first row of every flight and the total length
+    starts = np.flatnonzero(np.concatenate(([True], flight_ids[1:] != flight_ids[:-1]))) if len(order) else np.array([], dtype=np.int64)
+    np.save(os.path.join(directory, "flights.npy"), flight_ids[starts].astype(str))
+    np.save(os.path.join(directory, "offsets.npy"), np.append(starts, len(order)).astype(np.int64))
+
+    columns = {}
+    for column in df.columns:
+        if column == group_column:
+            continue
+        values = df[column]
+        if pd.api.types.is_datetime64_any_dtype(values) or column == time_column:
+            array = pd.to_datetime(values, utc=True).dt.tz_localize(None).to_numpy(dtype="datetime64[ns]")
+            columns[column] = {"kind": "time"}
+        elif pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+            array = values.to_numpy()
+            columns[column] = {"kind": "numeric"}
+        else:
+            codes, categories = pd.factorize(values.astype("object"))
+            array = codes.astype(np.int32)
+            columns[column] = {"kind": "category", "categories": [str(category) for category in categories]}
+        np.save(os.path.join(directory, f"{column}.npy"), np.ascontiguousarray(array[order]))
+
+    metadata = {"group_column": group_column, "time_column": time_column, "rows": int(len(order)),
+                "columns": columns}
+    with open(os.path.join(directory, store_metadata), "w", encoding="utf-8") as file:
+        json.dump(metadata, file, indent=1)
+
+
+def write_store_csv(path, directory=None, group_column="flight_id", time_column="time"):
+    """
+    Converts a CSV file of state vectors into a trajectory store.
+
+    Args:
+        path (str): CSV file (e.g. the `_checked.csv` output of `air_traffic_safety_checks.py`).
+        directory (str): Store directory; defaults to the file name with "_store" instead of the extension.
+        group_column (str): Column identifying the flights.
+        time_column (str): Time column.
+
+    Returns:
+        str: Store directory.
+    """
+    directory = directory or f"{os.path.splitext(path)[0]}_store"
+    df = pd.read_csv(path, low_memory=False)
+    for column in (time_column, "timestamp"):
+        if column in df.columns:
+            df[column] = pd.to_datetime(df[column], utc=True, format="ISO8601")
+    write_store(df, directory, group_column, time_column)
+    return directory
+
+
+class TrajectoryStore:
+    """
+    Memory-mapped trajectory store written by `write_store`.
+
+    Args:
+        directory (str): Store directory.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, store_metadata), encoding="utf-8") as file:
+            self.metadata = json.load(file)
+        self.columns = list(self.metadata["columns"])
+        self.flight_ids = np.load(os.path.join(directory, "flights.npy"))
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"))
+        self.lengths = np.diff(self.offsets)
+        self._positions = {flight_id: position for position, flight_id in enumerate(self.flight_ids.tolist())}
+        self._arrays = {}
+
+    def __len__(self):
+        return len(self.flight_ids)
+
+    def __contains__(self, flight_id):
+        return flight_id in self._positions
+
+    def column(self, name):
+        """
+        Returns the memory-mapped array of a column (all flights, in store order).
+        """
+        if name not in self._arrays:
+            if name not in self.metadata["columns"]:
+                raise KeyError(f"Column '{name}' is not in the store {self.directory}.")
+            self._arrays[name] = np.load(os.path.join(self.directory, f"{name}.npy"), mmap_mode="r")
+        return self._arrays[name]
+
+    def rows(self, flight_id):
+        """
+        Returns the slice of the rows of a flight.
+        """
+        position = self._positions[flight_id]
+        return slice(self.offsets[position], self.offsets[position + 1])
+
+    def flight(self, flight_id, columns=None):
+        """
+        Returns the arrays of a flight without copying them.
+
+        Args:
+            flight_id (str): Flight ID.
+            columns (list): Columns to return (all by default).
+
+        Returns:
+            dict: Column -> read-only array view (category codes for text columns).
+        """
+        rows = self.rows(flight_id)
+        return {column: self.column(column)[rows] for column in (columns or self.columns)}
+
+    def flights(self, columns=None):
+        """
+        Iterates over all flights in flight_id order.
+
+        Args:
+            columns (list): Columns to return (all by default).
+
+        Yields:
+            tuple: (flight_id, dict of column -> array view).
+        """
+        arrays = {column: self.column(column) for column in (columns or self.columns)}
+        for position, flight_id in enumerate(self.flight_ids.tolist()):
+            start, stop = self.offsets[position], self.offsets[position + 1]
+            yield flight_id, {column: array[start:stop] for column, array in arrays.items()}
+
+    def _decode(self, column, values):
+        """
+        Converts stored values to the values of a DataFrame column.
+        """
+        description = self.metadata["columns"][column]
+        if description["kind"] == "time":
+            return pd.to_datetime(values).tz_localize("UTC")
+        if description["kind"] == "category":
+            return pd.Categorical.from_codes(np.asarray(values), categories=description["categories"])
+        return np.array(values)
+
+    def frame(self, flight_ids=None, columns=None):
+        """
+        Returns flights as a DataFrame (copied from the store).
+
+        Args:
+            flight_ids (str or list): Flight ID(s); all flights by default.
+            columns (list): Columns to return (all by default).
+
+        Returns:
+            pd.DataFrame: Rows of the flights with the group column first.
+        """
+        columns = columns or self.columns
+        if flight_ids is None:
+            rows = np.arange(self.offsets[-1])
+            groups = np.repeat(self.flight_ids, self.lengths)
+        else:
+            flight_ids = [flight_ids] if isinstance(flight_ids, str) else list(flight_ids)
+            slices = [self.rows(flight_id) for flight_id in flight_ids]
+            rows = np.concatenate([np.arange(part.start, part.stop) for part in slices] or [np.array([], dtype=np.int64)])
+            groups = np.repeat(flight_ids, [part.stop - part.start for part in slices])
+
+        data = {self.metadata["group_column"]: groups}
+        for column in columns:
+            data[column] = self._decode(column, self.column(column)[rows])
+        return pd.DataFrame(data)